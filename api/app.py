@@ -3,27 +3,37 @@
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 from datetime import datetime, timedelta
 import warnings
-warnings.filterwarnings('ignore')
-
-# ML Libraries
-from sklearn.ensemble import RandomForestRegressor, IsolationForest, GradientBoostingRegressor
-from sklearn.preprocessing import StandardScaler, MinMaxScaler
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score, classification_report
-from sklearn.cluster import KMeans
-import joblib
 import json
-from typing import Dict, List, Tuple, Optional
+import pickle
+import hashlib
+import copy
+from typing import Dict, List, Tuple, Optional, TYPE_CHECKING
 import logging
-from dataclasses import dataclass
+import os
+import shutil
+import tempfile
+import threading
+import time
+import itertools
+import heapq
+import weakref
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+from collections import OrderedDict, deque
+from dataclasses import dataclass, replace, asdict
 from abc import ABC, abstractmethod
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# ML, plotting and persistence libraries are imported where they are used, so
+# importing this module (e.g. to serve a trained model) stays cheap. Process
+# setup (logging, warning filters) is left to the entry points.
+if TYPE_CHECKING:
+    from sklearn.ensemble import RandomForestRegressor, IsolationForest, GradientBoostingRegressor
+
+# Modules that must not be loaded by `import app` (see check_import_budget)
+LAZY_IMPORTS = ('matplotlib', 'seaborn', 'sklearn', 'scipy', 'joblib')
 
 # =============================================================================
 # DATA GENERATION & SIMULATION MODULE
@@ -36,7 +46,8 @@ class PlantDataSimulator:
     """
     
     def __init__(self, random_seed: int = 42):
-        np.random.seed(random_seed)
+        # Private generator: seeding one simulator must not reseed the global RNG
+        self.rng = np.random.RandomState(random_seed)
         self.logger = logging.getLogger(__name__)
         
         # Plant operational parameters
@@ -68,10 +79,10 @@ class PlantDataSimulator:
         )
         
         # Base normal distributions
-        kiln_temp = np.random.normal(1000, 50, n_samples)
-        system_pressure = np.random.normal(3.2, 0.3, n_samples)
-        material_moisture = np.random.normal(12, 2, n_samples)
-        material_flow = np.random.normal(100, 10, n_samples)
+        kiln_temp = self.rng.normal(1000, 50, n_samples)
+        system_pressure = self.rng.normal(3.2, 0.3, n_samples)
+        material_moisture = self.rng.normal(12, 2, n_samples)
+        material_flow = self.rng.normal(100, 10, n_samples)
         
         # Add realistic correlations and patterns
         # Temperature affects pressure (physics-based relationship)
@@ -89,32 +100,32 @@ class PlantDataSimulator:
         
         # Inject realistic anomalies
         n_anomalies = int(n_samples * anomaly_rate)
-        anomaly_indices = np.random.choice(n_samples, n_anomalies, replace=False)
+        anomaly_indices = self.rng.choice(n_samples, n_anomalies, replace=False)
         
         # Temperature spikes
         temp_anomalies = anomaly_indices[:n_anomalies//3]
-        kiln_temp[temp_anomalies] += np.random.normal(200, 50, len(temp_anomalies))
+        kiln_temp[temp_anomalies] += self.rng.normal(200, 50, len(temp_anomalies))
         
         # Pressure drops
         pressure_anomalies = anomaly_indices[n_anomalies//3:2*n_anomalies//3]
-        system_pressure[pressure_anomalies] *= np.random.uniform(0.3, 0.7, len(pressure_anomalies))
+        system_pressure[pressure_anomalies] *= self.rng.uniform(0.3, 0.7, len(pressure_anomalies))
         
         # Flow rate issues
         flow_anomalies = anomaly_indices[2*n_anomalies//3:]
-        material_flow[flow_anomalies] *= np.random.uniform(0.2, 0.8, len(flow_anomalies))
+        material_flow[flow_anomalies] *= self.rng.uniform(0.2, 0.8, len(flow_anomalies))
         
         # Additional sensor parameters
-        oxygen_level = np.random.normal(3.5, 0.5, n_samples)
-        co_level = np.random.normal(150, 25, n_samples)
-        nox_level = np.random.normal(800, 100, n_samples)
+        oxygen_level = self.rng.normal(3.5, 0.5, n_samples)
+        co_level = self.rng.normal(150, 25, n_samples)
+        nox_level = self.rng.normal(800, 100, n_samples)
         
         # Vibration data for equipment health
-        mill_vibration = np.random.normal(8, 2, n_samples)
-        kiln_vibration = np.random.normal(5, 1, n_samples)
+        mill_vibration = self.rng.normal(8, 2, n_samples)
+        kiln_vibration = self.rng.normal(5, 1, n_samples)
         
         # Energy consumption
         energy_consumption = (kiln_temp * 0.08 + material_flow * 0.5 + 
-                            np.random.normal(0, 5, n_samples))
+                            self.rng.normal(0, 5, n_samples))
         
         sensor_data = pd.DataFrame({
             'timestamp': timestamps,
@@ -147,10 +158,10 @@ class PlantDataSimulator:
         )
         
         # Raw material compositions with realistic variations
-        limestone = np.random.normal(80, 3, n_samples)
-        clay = np.random.normal(14, 2, n_samples)
-        iron_ore = np.random.normal(4, 1, n_samples)
-        gypsum = np.random.normal(4, 0.5, n_samples)
+        limestone = self.rng.normal(80, 3, n_samples)
+        clay = self.rng.normal(14, 2, n_samples)
+        iron_ore = self.rng.normal(4, 1, n_samples)
+        gypsum = self.rng.normal(4, 0.5, n_samples)
         
         # Normalize to 100% (realistic constraint)
         total = limestone + clay + iron_ore + gypsum
@@ -166,13 +177,13 @@ class PlantDataSimulator:
         fe2o3 = iron_ore * 0.85 + clay * 0.08
         
         # Logistics data
-        truck_arrivals = np.random.poisson(3, n_samples)  # Average 3 trucks per time period
-        inventory_levels = np.random.normal(500, 100, n_samples)  # Tons
-        supply_chain_delay = np.random.exponential(2, n_samples)  # Hours
+        truck_arrivals = self.rng.poisson(3, n_samples)  # Average 3 trucks per time period
+        inventory_levels = self.rng.normal(500, 100, n_samples)  # Tons
+        supply_chain_delay = self.rng.exponential(2, n_samples)  # Hours
         
         # Quality indicators for raw materials
-        limestone_quality = np.random.normal(85, 5, n_samples)  # Quality score 0-100
-        clay_quality = np.random.normal(78, 8, n_samples)
+        limestone_quality = self.rng.normal(85, 5, n_samples)  # Quality score 0-100
+        clay_quality = self.rng.normal(78, 8, n_samples)
         
         raw_material_data = pd.DataFrame({
             'timestamp': timestamps,
@@ -204,22 +215,22 @@ class PlantDataSimulator:
         )
         
         # Base quality parameters
-        fineness = np.random.normal(self.target_fineness, 25, n_samples)
-        setting_time = np.random.normal(self.target_setting_time, 15, n_samples)
+        fineness = self.rng.normal(self.target_fineness, 25, n_samples)
+        setting_time = self.rng.normal(self.target_setting_time, 15, n_samples)
         
         # Compressive strength with realistic age-based relationship
-        strength_3d = np.random.normal(self.target_compressive_strength_3d, 3, n_samples)
-        strength_28d = strength_3d * 2.5 + np.random.normal(5, 2, n_samples)
+        strength_3d = self.rng.normal(self.target_compressive_strength_3d, 3, n_samples)
+        strength_28d = strength_3d * 2.5 + self.rng.normal(5, 2, n_samples)
         
         # Physical properties
-        density = np.random.normal(3150, 50, n_samples)  # kg/m³
-        specific_surface = fineness + np.random.normal(0, 10, n_samples)
+        density = self.rng.normal(3150, 50, n_samples)  # kg/m³
+        specific_surface = fineness + self.rng.normal(0, 10, n_samples)
         
         # Chemical composition of final cement
-        c3s = np.random.normal(55, 5, n_samples)  # Tricalcium silicate
-        c2s = np.random.normal(20, 3, n_samples)  # Dicalcium silicate
-        c3a = np.random.normal(8, 2, n_samples)   # Tricalcium aluminate
-        c4af = np.random.normal(12, 2, n_samples) # Tetracalcium aluminoferrite
+        c3s = self.rng.normal(55, 5, n_samples)  # Tricalcium silicate
+        c2s = self.rng.normal(20, 3, n_samples)  # Dicalcium silicate
+        c3a = self.rng.normal(8, 2, n_samples)   # Tricalcium aluminate
+        c4af = self.rng.normal(12, 2, n_samples) # Tetracalcium aluminoferrite
         
         # Normalize to realistic total
         total_compounds = c3s + c2s + c3a + c4af
@@ -264,6 +275,967 @@ class PlantDataSimulator:
         self.logger.info(f"Generated {n_samples} cement quality data points")
         return cement_quality_data
 
+# =============================================================================
+# STREAMING AS-OF JOIN ENGINE
+# =============================================================================
+
+class SortedRingBuffer:
+    """
+    Bounded, timestamp-ordered buffer of numeric records. In-order appends are
+    O(1) amortized, lookups are O(log n) binary searches, and only the most
+    recent `capacity` records are retained.
+    """
+
+    def __init__(self, columns: List[str], capacity: int = 8192):
+        self.columns = list(columns)
+        self.capacity = capacity
+        # Twice the capacity so that in-order appends only compact occasionally
+        self._times = np.empty(2 * capacity, dtype=np.int64)
+        self._values = np.empty((2 * capacity, len(self.columns)), dtype=np.float64)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    @property
+    def times(self) -> np.ndarray:
+        return self._times[self._start:self._end]
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values[self._start:self._end]
+
+    def copy(self) -> 'SortedRingBuffer':
+        clone = SortedRingBuffer.__new__(SortedRingBuffer)
+        clone.__dict__.update(self.__dict__)
+        clone._times = self._times.copy()
+        clone._values = self._values.copy()
+        return clone
+    
+    def _compact(self):
+        """Move the retained window to the front of the backing arrays"""
+        keep = min(len(self), self.capacity - 1)
+        src = slice(self._end - keep, self._end)
+        self._times[:keep] = self._times[src]
+        self._values[:keep] = self._values[src]
+        self._start, self._end = 0, keep
+
+    def append(self, timestamp: int, values: np.ndarray):
+        """Insert one record, keeping the buffer sorted by timestamp"""
+        if len(self) >= self.capacity:
+            if timestamp < self._times[self._start]:
+                return  # Older than everything retained
+            self._start += 1
+        if self._end == len(self._times):
+            self._compact()
+
+        if len(self) == 0 or timestamp >= self._times[self._end - 1]:
+            pos = self._end
+        else:
+            # Late record: shift the newer tail right by one slot
+            pos = self._start + int(np.searchsorted(self.times, timestamp, side='right'))
+            self._times[pos + 1:self._end + 1] = self._times[pos:self._end].copy()
+            self._values[pos + 1:self._end + 1] = self._values[pos:self._end].copy()
+
+        self._times[pos] = timestamp
+        self._values[pos] = values
+        self._end += 1
+
+    def extend(self, timestamps: np.ndarray, values: np.ndarray):
+        """Bulk-load records, e.g. history at startup"""
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, values = timestamps[order], values[order]
+        if len(self) == 0 or timestamps[0] >= self._times[self._end - 1]:
+            # Fast path: whole block is newer than the buffer contents
+            timestamps, values = timestamps[-self.capacity:], values[-self.capacity:]
+            merged_t = np.concatenate([self.times, timestamps])[-self.capacity:]
+            merged_v = np.concatenate([self.values, values])[-self.capacity:]
+            n = len(merged_t)
+            self._times[:n] = merged_t
+            self._values[:n] = merged_v
+            self._start, self._end = 0, n
+        else:
+            for ts, row in zip(timestamps, values):
+                self.append(int(ts), row)
+
+    def lookup(self, timestamp: int, direction: str = 'nearest',
+               tolerance: Optional[int] = None) -> int:
+        """Return the absolute index of the matching record, or -1 when none qualifies"""
+        times = self.times
+        if len(times) == 0:
+            return -1
+
+        # Same tie-breaking as pd.merge_asof: backward takes the last equal key
+        bwd = int(np.searchsorted(times, timestamp, side='right')) - 1
+        fwd = int(np.searchsorted(times, timestamp, side='left'))
+        bwd_dist = timestamp - times[bwd] if bwd >= 0 else None
+        fwd_dist = times[fwd] - timestamp if fwd < len(times) else None
+
+        if direction == 'backward':
+            idx, dist = bwd, bwd_dist
+        elif direction == 'forward':
+            idx, dist = fwd, fwd_dist
+        elif bwd_dist is None or (fwd_dist is not None and fwd_dist < bwd_dist):
+            idx, dist = fwd, fwd_dist
+        else:
+            idx, dist = bwd, bwd_dist
+
+        if dist is None or (tolerance is not None and dist > tolerance):
+            return -1
+        return self._start + idx
+
+
+class IncrementalAsOfJoiner:
+    """
+    Incremental as-of join of quality samples against sensor and material
+    history. Equivalent to the two pd.merge_asof calls in
+    CementQualityController.prepare_quality_features, but each new sample is
+    joined with a binary search instead of sorting and merging full frames.
+
+    Quality samples are joined on their own (sampling) timestamp, so lab
+    results that arrive late still match the process state at sampling time
+    as long as that state is still retained in the buffers.
+    """
+
+    def __init__(self, sensor_columns: List[str], material_columns: List[str],
+                 capacity: int = 8192, tolerance: Optional[str] = None,
+                 direction: str = 'nearest', history_size: int = 11):
+        self.sensor_buffer = SortedRingBuffer(sensor_columns, capacity)
+        self.material_buffer = SortedRingBuffer(material_columns, capacity)
+        self.direction = direction
+        self.tolerance = pd.Timedelta(tolerance).value if tolerance is not None else None
+
+        # Trailing joined rows, kept so rolling features have their window context
+        self.history_size = history_size
+        self._history = pd.DataFrame()
+
+    @classmethod
+    def from_frames(cls, sensor_data: pd.DataFrame, material_data: pd.DataFrame,
+                    **kwargs) -> 'IncrementalAsOfJoiner':
+        """Create a joiner primed with existing sensor and material history"""
+        sensor_columns = [c for c in sensor_data.columns if c != 'timestamp']
+        material_columns = [c for c in material_data.columns if c != 'timestamp']
+        joiner = cls(sensor_columns, material_columns, **kwargs)
+        joiner.add_sensor_frame(sensor_data)
+        joiner.add_material_frame(material_data)
+        return joiner
+
+    def copy(self) -> 'IncrementalAsOfJoiner':
+        """Independent copy, used for copy-on-write updates of published state"""
+        clone = IncrementalAsOfJoiner.__new__(IncrementalAsOfJoiner)
+        clone.__dict__.update(self.__dict__)
+        clone.sensor_buffer = self.sensor_buffer.copy()
+        clone.material_buffer = self.material_buffer.copy()
+        return clone
+    
+    @staticmethod
+    def _to_ns(timestamp) -> int:
+        return pd.Timestamp(timestamp).value
+
+    @staticmethod
+    def _frame_arrays(frame: pd.DataFrame, columns: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        times = frame['timestamp'].values.astype('datetime64[ns]').astype(np.int64)
+        values = frame[columns].to_numpy(dtype=np.float64)
+        return times, values
+
+    def add_sensor_reading(self, reading: Dict):
+        values = np.array([reading.get(c, np.nan) for c in self.sensor_buffer.columns], dtype=np.float64)
+        self.sensor_buffer.append(self._to_ns(reading['timestamp']), values)
+
+    def add_material_reading(self, reading: Dict):
+        values = np.array([reading.get(c, np.nan) for c in self.material_buffer.columns], dtype=np.float64)
+        self.material_buffer.append(self._to_ns(reading['timestamp']), values)
+
+    def add_sensor_frame(self, sensor_data: pd.DataFrame):
+        self.sensor_buffer.extend(*self._frame_arrays(sensor_data, self.sensor_buffer.columns))
+
+    def add_material_frame(self, material_data: pd.DataFrame):
+        self.material_buffer.extend(*self._frame_arrays(material_data, self.material_buffer.columns))
+
+    def join(self, timestamp) -> Dict:
+        """Join a single timestamp against both buffers (NaN where nothing matches)"""
+        ts = self._to_ns(timestamp)
+        row = {}
+        for buffer in (self.sensor_buffer, self.material_buffer):
+            idx = buffer.lookup(ts, self.direction, self.tolerance)
+            values = buffer._values[idx] if idx >= 0 else np.full(len(buffer.columns), np.nan)
+            row.update(zip(buffer.columns, values))
+        return row
+
+    def join_quality_samples(self, quality_samples: pd.DataFrame,
+                             record: bool = True) -> pd.DataFrame:
+        """
+        Emit joined rows for newly arrived quality samples.
+
+        With record=False the rows are joined but not added to the rolling
+        history, which is what probes for the current process state want.
+        """
+        samples = quality_samples.sort_values('timestamp').reset_index(drop=True)
+        joined = pd.DataFrame([self.join(ts) for ts in samples['timestamp']],
+                              columns=self.sensor_buffer.columns + self.material_buffer.columns)
+        joined = pd.concat([samples, joined], axis=1)
+
+        if record and self.history_size > 0:
+            self._history = pd.concat([self._history, joined], ignore_index=True).iloc[-self.history_size:]
+        return joined
+
+    def recent_rows(self) -> pd.DataFrame:
+        """Most recent recorded joined rows, oldest first"""
+        return self._history
+
+# =============================================================================
+# ROLLING-WINDOW KERNELS
+# =============================================================================
+
+def _check_window(window: int, min_periods: Optional[int]) -> int:
+    """Validate a trailing window; returns the effective min_periods (pandas default: window)"""
+    if int(window) != window or window < 1:
+        raise ValueError(f"window must be a positive integer, got {window}")
+    min_periods = window if min_periods is None else min_periods
+    if not 0 <= min_periods <= window:
+        raise ValueError(f"min_periods {min_periods} must be between 0 and window {window}")
+    return min_periods
+
+
+def _equal_run_lengths(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Per row: how many of the most recent observations (NaNs skipped) share the latest value"""
+    observed = values[valid]
+    if len(observed) == 0:
+        return np.zeros(len(values), dtype=np.int64)
+    breaks = np.concatenate([[True], observed[1:] != observed[:-1]])
+    index = np.arange(len(observed))
+    run = index - np.maximum.accumulate(np.where(breaks, index, 0)) + 1
+    seen = np.cumsum(valid)
+    return np.where(seen > 0, run[np.maximum(seen - 1, 0)], 0)
+
+
+def rolling_moments(values: np.ndarray, window: int, min_periods: Optional[int] = None,
+                    ddof: int = 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Trailing-window sum, mean and variance of a float array, matching pandas
+    `rolling(window, min_periods)` including NaN skipping. The array is cut
+    into blocks of `window` rows, each centered on its own mean; every window
+    is a block suffix plus the next block's prefix, so partial sums stay local
+    and a level shift anywhere in a long history costs no precision elsewhere.
+    Windows of identical observations give exactly zero variance, as in pandas.
+    """
+    
+    min_periods = _check_window(window, min_periods)
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return np.empty(0), np.empty(0), np.empty(0)
+    
+    # Pad the last block with NaN when there are gaps anyway, else with the last value
+    valid = ~np.isnan(values)
+    gaps = not valid.all()
+    width = min(window, n)
+    padding = np.full(-n % width, np.nan if gaps else values[-1])
+    blocks = np.concatenate([values, padding]).reshape(-1, width)
+    if gaps:
+        observed = ~np.isnan(blocks)
+        cum_count = np.cumsum(observed, axis=1, dtype=np.float64)
+        center = np.where(observed, blocks, 0.0).sum(axis=1, keepdims=True) / np.maximum(cum_count[:, -1:], 1)
+        dev = np.where(observed, blocks - center, 0.0)
+        count = cum_count.ravel()[:n].copy()
+    else:
+        center = blocks.mean(axis=1, keepdims=True)
+        dev = blocks - center
+        count = np.minimum(np.arange(1.0, n + 1), window)
+    
+    # Block prefixes cover windows that start at a block boundary (or row 0)
+    cum_total = np.cumsum(dev, axis=1)
+    cum_square = np.cumsum(dev * dev, axis=1)
+    total = cum_total.ravel()[:n].copy()
+    square = cum_square.ravel()[:n].copy()
+    ref = np.repeat(center.ravel(), width)[:n]
+    
+    # Later windows add the rest of the previous block (block total minus its
+    # prefix up to the row before the window), shifted to this block's center
+    if window < n:
+        m = n - window
+        rest_total = (cum_total[:, -1:] - cum_total).ravel()[:m]
+        rest_square = (cum_square[:, -1:] - cum_square).ravel()[:m]
+        if gaps:
+            rest_count = (cum_count[:, -1:] - cum_count).ravel()[:m]
+        else:
+            rest_count = np.tile(np.arange(width - 1.0, -1.0, -1.0), len(blocks))[:m]
+        shift = ref[:m] - ref[window:]
+        square[window:] += rest_square + shift * (2 * rest_total + rest_count * shift)
+        total[window:] += rest_total + rest_count * shift
+        if gaps:
+            count[window:] += rest_count
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        var = np.maximum((square - total * mean) / (count - ddof), 0.0)
+    mean += ref
+    
+    # Windows whose observations are all equal: exact mean and zero variance
+    observed_values = values[valid] if gaps else values
+    if np.any(observed_values[1:] == observed_values[:-1]):
+        constant = (_equal_run_lengths(values, valid) >= count) & (count > 0)
+    else:
+        constant = count == 1
+    if constant.any():
+        latest = values[np.maximum.accumulate(np.where(valid, np.arange(n), 0))] if gaps else values
+        mean[constant] = latest[constant]
+        var[constant] = 0.0
+    
+    total += count * ref
+    for result, least in ((total, min_periods), (mean, max(min_periods, 1)), (var, max(min_periods, ddof + 1))):
+        result[count < least] = np.nan
+    return total, mean, var
+
+
+def _rolling_extreme(values: np.ndarray, window: int, min_periods: Optional[int], ufunc) -> np.ndarray:
+    """
+    Trailing-window min or max (ufunc np.fmin / np.fmax) in O(n) with the
+    van Herk/Gil-Werman block scheme: every window spans at most two blocks
+    of `window` rows, so it is the extreme of one block suffix and one prefix.
+    """
+    
+    min_periods = _check_window(window, min_periods)
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return values.copy()
+    
+    width = min(window, n)
+    blocks = np.concatenate([values, np.full(-n % width, np.nan)]).reshape(-1, width)
+    prefix = ufunc.accumulate(blocks, axis=1).ravel()[:n]
+    suffix = ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()[:n]
+    
+    result = prefix.copy()
+    if window <= n:
+        result[window - 1:] = ufunc(suffix[:n - window + 1], prefix[window - 1:])
+    
+    cum_count = np.concatenate([[0], np.cumsum(~np.isnan(values))])
+    count = cum_count[1:] - cum_count[np.maximum(np.arange(1, n + 1) - window, 0)]
+    return np.where(count >= max(min_periods, 1), result, np.nan)
+
+
+def rolling_sum(values: np.ndarray, window: int, min_periods: Optional[int] = None) -> np.ndarray:
+    return rolling_moments(values, window, min_periods)[0]
+
+def rolling_mean(values: np.ndarray, window: int, min_periods: Optional[int] = None) -> np.ndarray:
+    return rolling_moments(values, window, min_periods)[1]
+
+def rolling_var(values: np.ndarray, window: int, min_periods: Optional[int] = None, ddof: int = 1) -> np.ndarray:
+    return rolling_moments(values, window, min_periods, ddof)[2]
+
+def rolling_std(values: np.ndarray, window: int, min_periods: Optional[int] = None, ddof: int = 1) -> np.ndarray:
+    return np.sqrt(rolling_moments(values, window, min_periods, ddof)[2])
+
+def rolling_min(values: np.ndarray, window: int, min_periods: Optional[int] = None) -> np.ndarray:
+    return _rolling_extreme(values, window, min_periods, np.fmin)
+
+def rolling_max(values: np.ndarray, window: int, min_periods: Optional[int] = None) -> np.ndarray:
+    return _rolling_extreme(values, window, min_periods, np.fmax)
+
+
+class RollingWindow:
+    """
+    Incremental trailing-window kernels from saved state: `append` returns the
+    sum/mean/var/std/min/max of each new value's window, identical to a batch
+    call over the whole history. State is the last `window` values, running
+    centered sums (resynchronized once per window to stop drift) and
+    monotonic deques for min and max, so single appends are amortized O(1).
+    Batches longer than the window are computed with the batch kernels.
+    """
+    
+    stats = ('sum', 'mean', 'var', 'std', 'min', 'max')
+    
+    def __init__(self, window: int, min_periods: Optional[int] = None, ddof: int = 1):
+        self.min_periods = _check_window(window, min_periods)
+        self.window = window
+        self.ddof = ddof
+        self._values = deque(maxlen=window)
+        self._reset()
+    
+    def _reset(self):
+        self._position = 0
+        self._count = 0
+        self._ref = None
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._run = 0
+        self._last = np.nan
+        self._since_resync = 0
+        # (position, value), values increasing (min) / decreasing (max) from the left
+        self._min = deque()
+        self._max = deque()
+    
+    def append(self, values) -> Dict[str, np.ndarray]:
+        """Append values (scalar or array) and return each one's window statistics"""
+        
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        if len(values) > self.window:
+            history = np.concatenate([np.array(self._values), values])
+            tail = len(history) - len(values)
+            total, mean, var = rolling_moments(history, self.window, self.min_periods, self.ddof)
+            result = {
+                'sum': total[tail:], 'mean': mean[tail:], 'var': var[tail:], 'std': np.sqrt(var[tail:]),
+                'min': rolling_min(history, self.window, self.min_periods)[tail:],
+                'max': rolling_max(history, self.window, self.min_periods)[tail:]
+            }
+            # Rebuild the state from the new trailing window
+            recent = values[-self.window:]
+            self._values.clear()
+            self._reset()
+            for value in recent:
+                self._push(value)
+            return result
+        
+        rows = [self._push(value) for value in values]
+        return {stat: np.array([row[k] for row in rows]) for k, stat in enumerate(self.stats)}
+    
+    def _push(self, value: float) -> Tuple[float, ...]:
+        position = self._position
+        self._position += 1
+        
+        if len(self._values) == self.window:
+            old = self._values[0]
+            if not np.isnan(old):
+                self._count -= 1
+                self._sum -= old - self._ref
+                self._sumsq -= (old - self._ref) ** 2
+        self._values.append(value)
+        
+        if not np.isnan(value):
+            if self._ref is None:
+                self._ref = value
+            self._count += 1
+            self._sum += value - self._ref
+            self._sumsq += (value - self._ref) ** 2
+            self._run = self._run + 1 if value == self._last else 1
+            self._last = value
+            while self._min and self._min[-1][1] >= value:
+                self._min.pop()
+            self._min.append((position, value))
+            while self._max and self._max[-1][1] <= value:
+                self._max.pop()
+            self._max.append((position, value))
+        
+        for extremes in (self._min, self._max):
+            while extremes and extremes[0][0] <= position - self.window:
+                extremes.popleft()
+        
+        self._since_resync += 1
+        if self._since_resync >= self.window:
+            observed = np.array([v for v in self._values if not np.isnan(v)]) - (self._ref or 0.0)
+            self._sum, self._sumsq = float(observed.sum()), float((observed * observed).sum())
+            self._since_resync = 0
+        
+        return self._result()
+    
+    def _result(self) -> Tuple[float, ...]:
+        count = self._count
+        if count < self.min_periods:
+            return (np.nan,) * 6
+        if count == 0:
+            return (0.0,) + (np.nan,) * 5
+        
+        if self._run >= count:
+            mean, var = self._last, 0.0
+        else:
+            mean = self._ref + self._sum / count
+            var = max((self._sumsq - self._sum * self._sum / count) / (count - self.ddof), 0.0) \
+                if count > self.ddof else np.nan
+        if count <= self.ddof:
+            var = np.nan
+        return (self._sum + count * self._ref, mean, var, np.sqrt(var), self._min[0][1], self._max[0][1])
+
+# =============================================================================
+# SHARED FEATURE STORE
+# =============================================================================
+
+def _rolling_mean(df, source, window):
+    return pd.Series(rolling_mean(df[source].to_numpy(dtype=np.float64), window, min_periods=1),
+                     index=df.index, name=source)
+
+def _rolling_std(df, source, window):
+    return pd.Series(rolling_std(df[source].to_numpy(dtype=np.float64), window, min_periods=1),
+                     index=df.index, name=source)
+
+def _offset_ratio(df, numerator, denominator):
+    return df[numerator] / (df[denominator] + 1)
+
+def _inventory_urgency(df, source):
+    return np.clip((1000 - df[source]) / 1000, 0, 1)
+
+def _supply_efficiency(df, source):
+    return 1 / (1 + df[source] / 10)
+
+def _demand_supply_ratio(df, flow, trucks):
+    return df[flow] / (df[trucks] * 25 + 1)  # Assume 25 tons per truck
+
+def _raw_material_balance(df):
+    return (
+        df['limestone_percent'] * 0.4 +
+        df['clay_percent'] * 0.3 +
+        df['iron_ore_percent'] * 0.2 +
+        df['gypsum_percent'] * 0.1
+    )
+
+FEATURE_TRANSFORMS = {
+    'hour': lambda df: df['timestamp'].dt.hour,
+    'day_of_week': lambda df: df['timestamp'].dt.dayofweek,
+    'month': lambda df: df['timestamp'].dt.month,
+    'rolling_mean': _rolling_mean,
+    'rolling_std': _rolling_std,
+    'offset_ratio': _offset_ratio,
+    'inventory_urgency': _inventory_urgency,
+    'supply_efficiency': _supply_efficiency,
+    'demand_supply_ratio': _demand_supply_ratio,
+    'raw_material_balance': _raw_material_balance,
+}
+
+# Named derived features: (transform, *arguments). The spec tuple is part of
+# the cache key, so changing a definition never serves stale values.
+FEATURE_SPECS = {
+    # Calendar features
+    'hour': ('hour',),
+    'day_of_week': ('day_of_week',),
+    'month': ('month',),
+    
+    # Logistics features
+    'flow_rate_ma_24h': ('rolling_mean', 'material_flow_rate', 24*12),  # 24h at 5min intervals
+    'flow_rate_std_24h': ('rolling_std', 'material_flow_rate', 24*12),
+    'inventory_urgency': ('inventory_urgency', 'inventory_level'),
+    'supply_efficiency': ('supply_efficiency', 'supply_chain_delay'),
+    'demand_supply_ratio': ('demand_supply_ratio', 'material_flow_rate', 'truck_arrivals'),
+    
+    # Quality features
+    'temp_pressure_ratio': ('offset_ratio', 'kiln_temperature', 'system_pressure'),
+    'energy_efficiency': ('offset_ratio', 'material_flow_rate', 'energy_consumption'),
+    'cao_sio2_ratio': ('offset_ratio', 'cao_content', 'sio2_content'),
+    'al2o3_fe2o3_ratio': ('offset_ratio', 'al2o3_content', 'fe2o3_content'),
+    'raw_material_balance': ('raw_material_balance',),
+    'temp_stability': ('rolling_std', 'kiln_temperature', 12),
+    'flow_stability': ('rolling_std', 'material_flow_rate', 12),
+}
+
+def compute_feature(frame: pd.DataFrame, name: str) -> pd.Series:
+    """Compute one named feature from FEATURE_SPECS on a joined frame (uncached)"""
+    transform, *args = FEATURE_SPECS[name]
+    return FEATURE_TRANSFORMS[transform](frame, *args)
+
+
+class FeatureStore:
+    """
+    Cache of as-of merged frames and named derived features shared by the
+    logistics and quality pipelines.
+
+    Entries are keyed by the version of every source frame plus the feature
+    spec, so each merge and rolling computation runs once per data version no
+    matter how many pipelines or real-time ticks request it.
+    """
+    
+    def __init__(self, max_entries: int = 256):
+        self.logger = logging.getLogger(__name__)
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    # Frames registered by publish_frame, by id. pandas carries attrs over to
+    # copies and derived frames, so attrs alone do not prove a frame unmodified.
+    _published = weakref.WeakValueDictionary()
+    _published_lock = threading.Lock()
+    
+    @classmethod
+    def publish_frame(cls, frame: pd.DataFrame, version: int):
+        """Mark a frame that will never be modified as data version `version`"""
+        frame.attrs['version'] = version
+        with cls._published_lock:
+            cls._published[id(frame)] = frame
+    
+    @classmethod
+    def frame_version(cls, frame: pd.DataFrame) -> Tuple:
+        """
+        Version token for a source frame. Frames registered by publish_frame
+        (load_data/ingest) are immutable, and their version, shape and boundary
+        rows are enough to tell apart tails and appended data. Any other frame
+        (user-supplied, or derived from a published one and so carrying its
+        attrs) is hashed in full, so frames that only differ in interior rows
+        never share cached features.
+        """
+        with cls._published_lock:
+            published = cls._published.get(id(frame)) is frame
+        version = frame.attrs.get('version') if published else None
+        if len(frame) == 0:
+            return (version, 0, tuple(frame.columns))
+        hashed = frame.iloc[[0, -1]] if version is not None else frame
+        return (
+            version,
+            len(frame),
+            tuple(frame.columns),
+            int(pd.util.hash_pandas_object(hashed, index=True).sum())
+        )
+    
+    def _cached(self, key: Tuple, compute):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+        
+        value = compute()
+        
+        with self._lock:
+            self._cache[key] = value
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return value
+    
+    @staticmethod
+    def _merge_nearest(left: pd.DataFrame, right: pd.DataFrame) -> pd.DataFrame:
+        return pd.merge_asof(
+            left.sort_values('timestamp'),
+            right.sort_values('timestamp'),
+            on='timestamp',
+            direction='nearest'
+        )
+    
+    def _base_frame(self, kind: str, frames: Tuple[pd.DataFrame, ...]) -> Tuple[Tuple, pd.DataFrame]:
+        base_key = (kind,) + tuple(self.frame_version(f) for f in frames)
+        
+        def merge():
+            merged = frames[0]
+            for right in frames[1:]:
+                merged = self._merge_nearest(merged, right)
+            return merged
+        
+        return base_key, self._cached(('base',) + base_key, merge)
+    
+    def _assemble(self, base_key: Tuple, base: pd.DataFrame, features: List[str]) -> pd.DataFrame:
+        columns = {
+            name: self._cached(('feature', base_key, name, FEATURE_SPECS[name]),
+                               lambda name=name: compute_feature(base, name))
+            for name in features
+        }
+        # New frame per request built from the cached columns without copying
+        # them: callers may add or replace columns, but not modify values in place
+        return pd.DataFrame({**{name: base[name] for name in base.columns}, **columns}, copy=False)
+    
+    def logistics_frame(self, sensor_data: pd.DataFrame, material_data: pd.DataFrame,
+                        features: List[str]) -> pd.DataFrame:
+        """Sensor data as-of joined with material data, plus the requested features"""
+        base_key, base = self._base_frame('logistics', (sensor_data, material_data))
+        return self._assemble(base_key, base, features)
+    
+    def quality_frame(self, sensor_data: pd.DataFrame, material_data: pd.DataFrame,
+                      quality_data: pd.DataFrame, features: List[str]) -> pd.DataFrame:
+        """Quality samples as-of joined with sensor and material data, plus the requested features"""
+        base_key, base = self._base_frame('quality', (quality_data, sensor_data, material_data))
+        return self._assemble(base_key, base, features)
+    
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+# =============================================================================
+# MATERIALIZED TIME-BUCKET ROLLUPS
+# =============================================================================
+
+class TimeBucketRollup:
+    """
+    Materialized aggregates of a time-stamped frame per time bucket
+    (`resolution`, e.g. '1h' or '1D'): row count, and per numeric column the
+    count, sum, sum of squares, min and max; per categorical column a value
+    histogram. Batches are folded in with vectorized group reductions. Range
+    queries combine whole buckets through prefix sums, so their cost depends
+    on the number of buckets, never on the raw rows they cover. Storage grows
+    geometrically and prefix sums are only recomputed from the first changed
+    bucket, so appending recent readings stays cheap at fine resolutions.
+    """
+    
+    # How two partial aggregates of the same bucket combine (histograms add)
+    combine_ops = {'rows': np.add, 'count': np.add, 'sum': np.add, 'sumsq': np.add,
+                   'min': np.fmin, 'max': np.fmax, 'first': np.minimum, 'last': np.maximum}
+    additive_stats = ('rows', 'count', 'sum', 'sumsq')
+    
+    def __init__(self, resolution: str, columns: List[str], categorical: Tuple[str, ...] = (),
+                 time_column: str = 'timestamp'):
+        self.resolution = pd.Timedelta(resolution)
+        self.columns = list(columns)
+        self.categorical = list(categorical)
+        self.time_column = time_column
+        
+        n_cols = len(self.columns)
+        self._size = 0
+        self._keys = np.empty(0, dtype=np.int64)
+        self._stats = {
+            'rows': np.empty(0),
+            'count': np.empty((0, n_cols)),
+            'sum': np.empty((0, n_cols)),
+            'sumsq': np.empty((0, n_cols)),
+            'min': np.empty((0, n_cols)),
+            'max': np.empty((0, n_cols)),
+            'first': np.empty(0, dtype=np.int64),
+            'last': np.empty(0, dtype=np.int64)
+        }
+        self._categories = {col: [] for col in self.categorical}
+        for col in self.categorical:
+            self._stats['hist', col] = np.empty((0, 0))
+        
+        # Prefix sums of the additive statistics, valid up to bucket _valid_prefix
+        self._prefix = {name: np.zeros((1,) + self._stats[name].shape[1:])
+                        for name in self._stats if name in self.additive_stats or isinstance(name, tuple)}
+        self._valid_prefix = 0
+        
+        # Sums are kept relative to a reference value to limit cancellation in the variance
+        self._ref = None
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def update(self, frame: pd.DataFrame):
+        """Fold a batch of rows (any order, any buckets) into the rollup"""
+        
+        if frame is None or len(frame) == 0:
+            return
+        
+        times = frame[self.time_column].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        values = frame[self.columns].to_numpy(dtype=np.float64)
+        
+        with self._lock:
+            if self._ref is None:
+                self._ref = np.nan_to_num(np.nanmean(values, axis=0))
+            centered = values - self._ref
+            valid = ~np.isnan(centered)
+            filled = np.where(valid, centered, 0.0)
+            
+            # Group the batch by bucket: sort once, reduce contiguous runs
+            step = self.resolution.value
+            keys = times // step * step
+            order = np.argsort(keys, kind='stable')
+            keys = keys[order]
+            starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+            
+            def reduce(ufunc, array):
+                return ufunc.reduceat(array[order], starts, axis=0)
+            
+            batch = {
+                'rows': np.diff(np.append(starts, len(keys))).astype(np.float64),
+                'count': reduce(np.add, valid.astype(np.float64)),
+                'sum': reduce(np.add, filled),
+                'sumsq': reduce(np.add, filled * filled),
+                'min': reduce(np.fmin, centered),
+                'max': reduce(np.fmax, centered),
+                'first': reduce(np.minimum, times),
+                'last': reduce(np.maximum, times)
+            }
+            group = np.repeat(np.arange(len(starts)), batch['rows'].astype(np.int64))
+            for col in self.categorical:
+                categories = self._categories[col]
+                lookup = {value: k for k, value in enumerate(categories)}
+                codes = np.empty(len(keys), dtype=np.int64)
+                for i, value in enumerate(frame[col].to_numpy()[order].tolist()):
+                    if value not in lookup:
+                        lookup[value] = len(categories)
+                        categories.append(value)
+                    codes[i] = lookup[value]
+                self._widen_histogram(col, len(categories))
+                hist = np.zeros((len(starts), len(categories)))
+                np.add.at(hist, (group, codes), 1)
+                batch['hist', col] = hist
+            
+            self._merge(keys[starts], batch)
+    
+    def _widen_histogram(self, col: str, width: int):
+        """Add zero columns for newly seen categories (their prefix sums stay valid)"""
+        for store in (self._stats, self._prefix):
+            array = store['hist', col]
+            if array.shape[1] < width:
+                store['hist', col] = np.hstack([array, np.zeros((len(array), width - array.shape[1]))])
+    
+    def _reserve(self, extra: int):
+        """Grow bucket storage geometrically to fit `extra` more buckets"""
+        needed = self._size + extra
+        if needed <= len(self._keys):
+            return
+        capacity = max(needed, 2 * len(self._keys), 64)
+        
+        def grow(array, rows):
+            grown = np.zeros((rows,) + array.shape[1:], dtype=array.dtype)
+            grown[:len(array)] = array
+            return grown
+        
+        self._keys = grow(self._keys, capacity)
+        self._stats = {name: grow(array, capacity) for name, array in self._stats.items()}
+        self._prefix = {name: grow(array, capacity + 1) for name, array in self._prefix.items()}
+    
+    def _merge(self, batch_keys: np.ndarray, batch: Dict):
+        """Combine per-bucket batch aggregates with the stored buckets"""
+        
+        n = self._size
+        keys = self._keys[:n]
+        position = np.searchsorted(keys, batch_keys)
+        found = position < n
+        found[found] = keys[position[found]] == batch_keys[found]
+        
+        # Buckets already materialized: combine in place
+        at = position[found]
+        for name, stored in self._stats.items():
+            combine = self.combine_ops.get(name, np.add)
+            stored[at] = combine(stored[at], batch[name][found])
+        dirty = int(at.min()) if len(at) else n
+        
+        # New buckets: append, and restore key order if any land before the end
+        new = ~found
+        if new.any():
+            first_new = batch_keys[new][0]
+            self._reserve(int(new.sum()))
+            size = n + int(new.sum())
+            self._keys[n:size] = batch_keys[new]
+            for name, stored in self._stats.items():
+                stored[n:size] = batch[name][new]
+            self._size = size
+            
+            if n and first_new < self._keys[n - 1]:
+                order = np.argsort(self._keys[:size], kind='stable')
+                self._keys[:size] = self._keys[:size][order]
+                for stored in self._stats.values():
+                    stored[:size] = stored[:size][order]
+                dirty = min(dirty, int(np.searchsorted(self._keys[:size], first_new)))
+            dirty = min(dirty, n)
+        
+        self._valid_prefix = min(self._valid_prefix, dirty)
+    
+    def _prefix_sums(self) -> Dict:
+        """Prefix sums of the additive statistics, extended from the first changed bucket"""
+        start, n = self._valid_prefix, self._size
+        if start < n:
+            for name, prefix in self._prefix.items():
+                prefix[start + 1:n + 1] = prefix[start] + np.cumsum(self._stats[name][start:n], axis=0)
+            self._valid_prefix = n
+        return self._prefix
+    
+    def _range(self, start, end) -> Tuple[int, int]:
+        """Bucket index range [lo, hi) overlapping [start, end]"""
+        keys = self._keys[:self._size]
+        step = self.resolution.value
+        lo = 0 if start is None else int(np.searchsorted(keys, pd.Timestamp(start).value // step * step))
+        hi = len(keys) if end is None else int(np.searchsorted(keys, pd.Timestamp(end).value, side='right'))
+        return lo, max(lo, hi)
+    
+    def bucket_count(self, start=None, end=None) -> int:
+        """Number of non-empty buckets overlapping [start, end]"""
+        with self._lock:
+            lo, hi = self._range(start, end)
+            return hi - lo
+    
+    def query(self, start=None, end=None) -> Dict:
+        """
+        Aggregates over all buckets that overlap [start, end] (whole buckets;
+        None means unbounded): rows, time span, per-column count/mean/std/
+        min/max and categorical histograms.
+        """
+        
+        with self._lock:
+            lo, hi = self._range(start, end)
+            if hi <= lo:
+                return {'rows': 0, 'buckets': 0, 'first_timestamp': None, 'last_timestamp': None,
+                        'columns': {}, 'histograms': {col: {} for col in self.categorical}}
+            
+            prefix = self._prefix_sums()
+            count = prefix['count'][hi] - prefix['count'][lo]
+            total = prefix['sum'][hi] - prefix['sum'][lo]
+            total_sq = prefix['sumsq'][hi] - prefix['sumsq'][lo]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = total / count
+                var = np.maximum((total_sq - total * mean) / (count - 1), 0.0)
+            low = np.fmin.reduce(self._stats['min'][lo:hi], axis=0) + self._ref
+            high = np.fmax.reduce(self._stats['max'][lo:hi], axis=0) + self._ref
+            
+            return {
+                'rows': int(prefix['rows'][hi] - prefix['rows'][lo]),
+                'buckets': hi - lo,
+                'first_timestamp': pd.Timestamp(self._stats['first'][lo:hi].min()),
+                'last_timestamp': pd.Timestamp(self._stats['last'][lo:hi].max()),
+                'columns': {
+                    col: {
+                        'count': int(count[j]),
+                        'mean': float(mean[j] + self._ref[j]) if count[j] else np.nan,
+                        'std': float(np.sqrt(var[j])) if count[j] > 1 else np.nan,
+                        'min': float(low[j]),
+                        'max': float(high[j])
+                    }
+                    for j, col in enumerate(self.columns)
+                },
+                'histograms': {
+                    col: {
+                        value: int(n)
+                        for value, n in zip(self._categories[col],
+                                            prefix['hist', col][hi] - prefix['hist', col][lo])
+                        if n
+                    }
+                    for col in self.categorical
+                }
+            }
+    
+    def series(self, column: str, start=None, end=None) -> pd.DataFrame:
+        """Per-bucket count/mean/min/max of one column over [start, end], keyed by bucket start"""
+        
+        with self._lock:
+            lo, hi = self._range(start, end)
+            if hi <= lo:
+                return pd.DataFrame(columns=['timestamp', 'count', 'mean', 'min', 'max'])
+            
+            j = self.columns.index(column)
+            count = self._stats['count'][lo:hi, j]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = self._stats['sum'][lo:hi, j] / count + self._ref[j]
+            return pd.DataFrame({
+                'timestamp': pd.to_datetime(self._keys[lo:hi]),
+                'count': count.astype(np.int64),
+                'mean': mean,
+                'min': self._stats['min'][lo:hi, j] + self._ref[j],
+                'max': self._stats['max'][lo:hi, j] + self._ref[j]
+            })
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling: indices of `n_out` points of
+    y(x) (first and last always kept) that preserve its visual shape. Each
+    bucket keeps the point forming the largest triangle with the previously
+    kept point and the mean of the next bucket.
+    """
+    
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        raise ValueError("LTTB needs at least 3 output points")
+    
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    
+    # n_out - 2 inner buckets over points 1..n-2; bucket b is [edges[b], edges[b + 1])
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    next_lo = edges[1:]
+    next_hi = np.append(edges[2:], n)
+    cum_x = np.concatenate([[0.0], np.cumsum(x)])
+    cum_y = np.concatenate([[0.0], np.cumsum(y)])
+    avg_x = (cum_x[next_hi] - cum_x[next_lo]) / (next_hi - next_lo)
+    avg_y = (cum_y[next_hi] - cum_y[next_lo]) / (next_hi - next_lo)
+    
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        area = np.abs((x[a] - avg_x[b]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[b] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[b + 1] = a
+    return selected
+
 # =============================================================================
 # 1. RAW MATERIAL HANDLING LOGISTICS OPTIMIZATION
 # =============================================================================
@@ -274,62 +1246,52 @@ class LogisticsOptimizer:
     and predictive modeling for raw material handling automation.
     """
     
+    # Derived columns requested from the feature store
+    derived_features = [
+        'hour', 'day_of_week', 'month',
+        'flow_rate_ma_24h', 'flow_rate_std_24h',
+        'inventory_urgency', 'supply_efficiency', 'demand_supply_ratio'
+    ]
+    
+    # Features for demand prediction
+    demand_feature_columns = [
+        'hour', 'day_of_week', 'month',
+        'kiln_temperature', 'system_pressure',
+        'flow_rate_ma_24h', 'flow_rate_std_24h',
+        'inventory_level', 'supply_chain_delay'
+    ]
+    
+    # Production hyperparameters of the demand model, and the grid searched when tuning
+    demand_model_params = {'n_estimators': 200, 'max_depth': 6, 'learning_rate': 0.1, 'random_state': 42}
+    demand_search_space = {
+        'n_estimators': [100, 200, 300],
+        'max_depth': [3, 4, 6],
+        'learning_rate': [0.05, 0.1]
+    }
+    
     def __init__(self):
+        from sklearn.preprocessing import StandardScaler
+        
         self.logger = logging.getLogger(__name__)
         self.scaler = StandardScaler()
+        self.demand_params = dict(self.demand_model_params)
         self.demand_predictor = None
         self.route_optimizer = None
         self.resource_allocator = None
         self.is_trained = False
         
     def prepare_logistics_features(self, sensor_data: pd.DataFrame, 
-                                 material_data: pd.DataFrame) -> pd.DataFrame:
+                                 material_data: pd.DataFrame,
+                                 feature_store: Optional[FeatureStore] = None) -> pd.DataFrame:
         """Prepare feature engineering for logistics optimization"""
         
-        # Merge datasets on timestamp
-        logistics_df = pd.merge_asof(
-            sensor_data.sort_values('timestamp'),
-            material_data.sort_values('timestamp'),
-            on='timestamp',
-            direction='nearest'
-        )
-        
-        # Feature engineering
-        logistics_df['hour'] = logistics_df['timestamp'].dt.hour
-        logistics_df['day_of_week'] = logistics_df['timestamp'].dt.dayofweek
-        logistics_df['month'] = logistics_df['timestamp'].dt.month
-        
-        # Rolling statistics for demand prediction
-        logistics_df['flow_rate_ma_24h'] = logistics_df['material_flow_rate'].rolling(
-            window=24*12, min_periods=1).mean()  # 24h moving average (5min intervals)
-        logistics_df['flow_rate_std_24h'] = logistics_df['material_flow_rate'].rolling(
-            window=24*12, min_periods=1).std()
-        
-        # Inventory urgency score
-        logistics_df['inventory_urgency'] = (1000 - logistics_df['inventory_level']) / 1000
-        logistics_df['inventory_urgency'] = np.clip(logistics_df['inventory_urgency'], 0, 1)
-        
-        # Supply chain efficiency score
-        logistics_df['supply_efficiency'] = 1 / (1 + logistics_df['supply_chain_delay'] / 10)
-        
-        # Demand-supply balance
-        logistics_df['demand_supply_ratio'] = (
-            logistics_df['material_flow_rate'] / 
-            (logistics_df['truck_arrivals'] * 25 + 1)  # Assume 25 tons per truck
-        )
-        
-        return logistics_df
+        # A private store still shares the merge across features; pass the
+        # system-wide store to reuse work across pipelines and calls
+        feature_store = feature_store or FeatureStore()
+        return feature_store.logistics_frame(sensor_data, material_data, self.derived_features)
     
-    def train_demand_predictor(self, logistics_df: pd.DataFrame):
-        """Train predictive model for raw material demand forecasting"""
-        
-        # Features for demand prediction
-        feature_columns = [
-            'hour', 'day_of_week', 'month',
-            'kiln_temperature', 'system_pressure',
-            'flow_rate_ma_24h', 'flow_rate_std_24h',
-            'inventory_level', 'supply_chain_delay'
-        ]
+    def demand_matrix(self, logistics_df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """Time-ordered, unscaled feature matrix and target for demand prediction"""
         
         # Target: future material flow rate (1 hour ahead)
         logistics_df['future_flow_rate'] = logistics_df['material_flow_rate'].shift(-12)  # 1 hour ahead
@@ -337,8 +1299,15 @@ class LogisticsOptimizer:
         # Remove rows with missing targets
         train_data = logistics_df.dropna()
         
-        X = train_data[feature_columns]
-        y = train_data['future_flow_rate']
+        X = train_data[self.demand_feature_columns].to_numpy(dtype=np.float64)
+        y = train_data['future_flow_rate'].to_numpy(dtype=np.float64)
+        return X, y
+    
+    def build_demand_training_set(self, logistics_df: pd.DataFrame) -> Dict:
+        """Build scaled train/test matrices for the demand predictor (fits the scaler)"""
+        from sklearn.model_selection import train_test_split
+        
+        X, y = self.demand_matrix(logistics_df)
         
         # Split data
         X_train, X_test, y_train, y_test = train_test_split(
@@ -346,34 +1315,53 @@ class LogisticsOptimizer:
         )
         
         # Scale features
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        X_test_scaled = self.scaler.transform(X_test)
-        
-        # Train ensemble model for robust predictions
-        self.demand_predictor = GradientBoostingRegressor(
-            n_estimators=200,
-            max_depth=6,
-            learning_rate=0.1,
-            random_state=42
-        )
+        return {
+            'X_train': self.scaler.fit_transform(X_train),
+            'X_test': self.scaler.transform(X_test),
+            'y_train': y_train,
+            'y_test': y_test
+        }
+    
+    def make_demand_model(self) -> 'GradientBoostingRegressor':
+        """Unfitted demand model with the current hyperparameters"""
+        from sklearn.ensemble import GradientBoostingRegressor
+        return GradientBoostingRegressor(**self.demand_params)
+    
+    def finish_demand_training(self, model: 'GradientBoostingRegressor', training_set: Dict) -> Dict:
+        """Install a fitted demand model and evaluate it on the hold-out split"""
+        from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
         
-        self.demand_predictor.fit(X_train_scaled, y_train)
+        self.demand_predictor = model
         
         # Evaluate model
-        y_pred = self.demand_predictor.predict(X_test_scaled)
+        y_test = training_set['y_test']
+        y_pred = self.demand_predictor.predict(training_set['X_test'])
         mse = mean_squared_error(y_test, y_pred)
         mae = mean_absolute_error(y_test, y_pred)
         r2 = r2_score(y_test, y_pred)
         
         self.logger.info(f"Demand Predictor - MSE: {mse:.2f}, MAE: {mae:.2f}, R²: {r2:.3f}")
+        self.is_trained = True
         
         return {
             'mse': mse,
             'mae': mae,
             'r2': r2,
-            'feature_importance': dict(zip(feature_columns, self.demand_predictor.feature_importances_))
+            'feature_importance': dict(zip(self.demand_feature_columns,
+                                           self.demand_predictor.feature_importances_))
         }
     
+    def train_demand_predictor(self, logistics_df: pd.DataFrame):
+        """Train predictive model for raw material demand forecasting"""
+        
+        training_set = self.build_demand_training_set(logistics_df)
+        
+        # Train ensemble model for robust predictions
+        model = self.make_demand_model()
+        model.fit(training_set['X_train'], training_set['y_train'])
+        
+        return self.finish_demand_training(model, training_set)
+    
     def optimize_truck_scheduling(self, logistics_df: pd.DataFrame, 
                                 prediction_horizon: int = 48) -> Dict:
         """
@@ -387,14 +1375,6 @@ class LogisticsOptimizer:
         # Get current state
         current_state = logistics_df.iloc[-1]
         
-        # Predict future demand
-        feature_columns = [
-            'hour', 'day_of_week', 'month',
-            'kiln_temperature', 'system_pressure',
-            'flow_rate_ma_24h', 'flow_rate_std_24h',
-            'inventory_level', 'supply_chain_delay'
-        ]
-        
         # Generate future time steps
         future_states = []
         current_time = current_state['timestamp']
@@ -411,7 +1391,7 @@ class LogisticsOptimizer:
         future_df = pd.DataFrame(future_states)
         
         # Predict demand for each future time step
-        X_future = future_df[feature_columns]
+        X_future = future_df[self.demand_feature_columns].to_numpy(dtype=np.float64)
         X_future_scaled = self.scaler.transform(X_future)
         predicted_demand = self.demand_predictor.predict(X_future_scaled)
         
@@ -511,129 +1491,169 @@ class CementQualityController:
     using machine learning and process control algorithms.
     """
     
-    def __init__(self):
+    # Derived columns requested from the feature store
+    derived_features = [
+        'temp_pressure_ratio', 'energy_efficiency',
+        'cao_sio2_ratio', 'al2o3_fe2o3_ratio', 'raw_material_balance',
+        'hour', 'day_of_week',
+        'temp_stability', 'flow_stability'
+    ]
+    
+    # Features for quality prediction
+    quality_features = [
+        'kiln_temperature', 'system_pressure', 'material_moisture',
+        'material_flow_rate', 'oxygen_level', 'energy_consumption',
+        'limestone_percent', 'clay_percent', 'iron_ore_percent', 'gypsum_percent',
+        'cao_content', 'sio2_content', 'al2o3_content', 'fe2o3_content',
+        'temp_pressure_ratio', 'energy_efficiency', 'cao_sio2_ratio',
+        'al2o3_fe2o3_ratio', 'raw_material_balance',
+        'temp_stability', 'flow_stability'
+    ]
+    
+    # Prediction target -> source column
+    target_columns = {
+        'fineness': 'fineness',
+        'setting_time': 'setting_time',
+        'strength': 'compressive_strength_28d'
+    }
+    
+    # Production hyperparameters of each target's forest, and the grid searched when tuning
+    quality_model_params = {'n_estimators': 150, 'max_depth': 10, 'random_state': 42}
+    quality_search_space = {
+        'n_estimators': [50, 100, 150],
+        'max_depth': [6, 10, None],
+        'min_samples_leaf': [1, 5]
+    }
+    
+    # Compact joint model distilled from the per-target forests, for edge serving
+    surrogate_model_params = {'n_estimators': 12, 'max_depth': 8, 'random_state': 42, 'n_jobs': 1}
+    
+    # quality_predictor key of the single multi-output forest
+    joint_model_key = 'joint'
+    
+    # Setpoints the optimizer may move: column -> (max move per correction, hard low, hard high)
+    actuator_limits = {
+        'kiln_temperature': (50.0, 800.0, 1200.0),
+        'material_flow_rate': (10.0, 80.0, 120.0),
+        'gypsum_percent': (1.0, 3.0, 5.0),
+        'limestone_percent': (3.0, 75.0, 85.0)
+    }
+    
+    # Row-wise derived features that follow the setpoints (rolling ones keep their current value)
+    setpoint_dependent_features = ['temp_pressure_ratio', 'energy_efficiency', 'raw_material_balance']
+    
+    def __init__(self, multi_output: bool = False):
         self.logger = logging.getLogger(__name__)
+        # One forest predicting all targets instead of one forest per target
+        self.multi_output = multi_output
+        self.quality_params = {target: dict(self.quality_model_params) for target in self.target_columns}
+        self.quality_params[self.joint_model_key] = dict(self.quality_model_params)
         self.quality_predictor = None
+        self.surrogate = None
+        self.use_surrogate = False
+        self.distillation_report = None
         self.correction_model = None
+        
+        from sklearn.preprocessing import StandardScaler
         self.scaler_quality = StandardScaler()
         self.scaler_process = StandardScaler()
         self.is_trained = False
         
     def prepare_quality_features(self, sensor_data: pd.DataFrame,
                                 material_data: pd.DataFrame,
-                                quality_data: pd.DataFrame) -> pd.DataFrame:
+                                quality_data: pd.DataFrame,
+                                feature_store: Optional[FeatureStore] = None) -> pd.DataFrame:
         """Comprehensive feature engineering for quality prediction"""
         
-        # Merge all datasets
-        quality_df = pd.merge_asof(
-            quality_data.sort_values('timestamp'),
-            sensor_data.sort_values('timestamp'),
-            on='timestamp',
-            direction='nearest'
-        )
-        
-        quality_df = pd.merge_asof(
-            quality_df.sort_values('timestamp'),
-            material_data.sort_values('timestamp'),
-            on='timestamp',
-            direction='nearest'
-        )
-        
-        # Process-related features
-        quality_df['temp_pressure_ratio'] = quality_df['kiln_temperature'] / (quality_df['system_pressure'] + 1)
-        quality_df['energy_efficiency'] = quality_df['material_flow_rate'] / (quality_df['energy_consumption'] + 1)
-        
-        # Chemical composition ratios (important for cement quality)
-        quality_df['cao_sio2_ratio'] = quality_df['cao_content'] / (quality_df['sio2_content'] + 1)
-        quality_df['al2o3_fe2o3_ratio'] = quality_df['al2o3_content'] / (quality_df['fe2o3_content'] + 1)
-        
-        # Material balance features
-        quality_df['raw_material_balance'] = (
-            quality_df['limestone_percent'] * 0.4 +
-            quality_df['clay_percent'] * 0.3 +
-            quality_df['iron_ore_percent'] * 0.2 +
-            quality_df['gypsum_percent'] * 0.1
-        )
-        
-        # Time-based features
-        quality_df['hour'] = quality_df['timestamp'].dt.hour
-        quality_df['day_of_week'] = quality_df['timestamp'].dt.dayofweek
-        
-        # Rolling statistics for process stability
-        quality_df['temp_stability'] = quality_df['kiln_temperature'].rolling(
-            window=12, min_periods=1).std()
-        quality_df['flow_stability'] = quality_df['material_flow_rate'].rolling(
-            window=12, min_periods=1).std()
-        
+        feature_store = feature_store or FeatureStore()
+        return feature_store.quality_frame(sensor_data, material_data, quality_data, self.derived_features)
+    
+    def prepare_live_quality_features(self, joiner: IncrementalAsOfJoiner,
+                                      quality_samples: pd.DataFrame,
+                                      record: bool = True,
+                                      fallback: Optional[pd.Series] = None) -> pd.DataFrame:
+        """
+        Streaming counterpart of prepare_quality_features: joins only the new
+        quality samples through the incremental joiner and derives features
+        using the joiner's recent rows as rolling-window context. Inputs with
+        no reading within the join tolerance are NaN, or taken from `fallback`
+        (e.g. the latest readings) when given.
+        """
+        context = joiner.recent_rows()
+        joined = joiner.join_quality_samples(quality_samples, record=record)
+        if fallback is not None:
+            joined = joined.fillna({col: fallback[col] for col in joined.columns
+                                    if col != 'timestamp' and col in fallback.index})
+        quality_df = pd.concat([context, joined], ignore_index=True)
+        quality_df = self._add_quality_derived_features(quality_df)
+        return quality_df.iloc[len(context):].reset_index(drop=True)
+    
+    def _add_quality_derived_features(self, quality_df: pd.DataFrame) -> pd.DataFrame:
+        """Derive process, chemistry and stability features on a joined frame"""
+        for name in self.derived_features:
+            quality_df[name] = compute_feature(quality_df, name)
         return quality_df
     
-    def train_quality_models(self, quality_df: pd.DataFrame):
-        """Train models for quality prediction and process correction"""
-        
-        # Features for quality prediction
-        quality_features = [
-            'kiln_temperature', 'system_pressure', 'material_moisture',
-            'material_flow_rate', 'oxygen_level', 'energy_consumption',
-            'limestone_percent', 'clay_percent', 'iron_ore_percent', 'gypsum_percent',
-            'cao_content', 'sio2_content', 'al2o3_content', 'fe2o3_content',
-            'temp_pressure_ratio', 'energy_efficiency', 'cao_sio2_ratio',
-            'al2o3_fe2o3_ratio', 'raw_material_balance',
-            'temp_stability', 'flow_stability'
-        ]
+    def quality_matrix(self, quality_df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """Time-ordered, unscaled feature matrix and one target column per quality target"""
         
         # Remove rows with missing values
-        train_data = quality_df[quality_features + [
-            'fineness', 'setting_time', 'compressive_strength_28d', 'quality_grade'
-        ]].dropna()
-        
-        X = train_data[quality_features]
+        train_data = quality_df[self.quality_features + list(self.target_columns.values()) +
+                                ['quality_grade']].dropna()
         
-        # Multiple targets for comprehensive quality prediction
-        y_fineness = train_data['fineness']
-        y_setting_time = train_data['setting_time']
-        y_strength = train_data['compressive_strength_28d']
-        y_grade = train_data['quality_grade']
-        
-        # Split data
-        X_train, X_test, y_fin_train, y_fin_test = train_test_split(
-            X, y_fineness, test_size=0.2, random_state=42
-        )
+        X = train_data[self.quality_features].to_numpy(dtype=np.float64)
+        Y = train_data[list(self.target_columns.values())].to_numpy(dtype=np.float64)
+        return X, Y
+    
+    def build_quality_training_set(self, quality_df: pd.DataFrame) -> Dict:
+        """Build scaled train/test matrices shared by all quality targets (fits the scaler)"""
         
-        _, _, y_set_train, y_set_test = train_test_split(
-            X, y_setting_time, test_size=0.2, random_state=42
-        )
-        
-        _, _, y_str_train, y_str_test = train_test_split(
-            X, y_strength, test_size=0.2, random_state=42
-        )
+        # Multiple targets for comprehensive quality prediction, split once
+        X, Y = self.quality_matrix(quality_df)
+        X_train, X_test, Y_train, Y_test = self._split_quality(X, Y)
         
         # Scale features
-        X_train_scaled = self.scaler_quality.fit_transform(X_train)
-        X_test_scaled = self.scaler_quality.transform(X_test)
-        
-        # Train multi-output quality predictor
-        self.quality_predictor = {
-            'fineness': RandomForestRegressor(n_estimators=150, max_depth=10, random_state=42),
-            'setting_time': RandomForestRegressor(n_estimators=150, max_depth=10, random_state=42),
-            'strength': RandomForestRegressor(n_estimators=150, max_depth=10, random_state=42)
+        return {
+            'X_train': self.scaler_quality.fit_transform(X_train),
+            'X_test': self.scaler_quality.transform(X_test),
+            'y_train': {t: Y_train[:, k] for k, t in enumerate(self.target_columns)},
+            'y_test': {t: Y_test[:, k] for k, t in enumerate(self.target_columns)},
+            'Y_train': Y_train
+        }
+    
+    @staticmethod
+    def _split_quality(X: np.ndarray, Y: np.ndarray) -> List[np.ndarray]:
+        """The train/test split used for training and for evaluating distilled models"""
+        from sklearn.model_selection import train_test_split
+        return train_test_split(X, Y, test_size=0.2, random_state=42)
+    
+    def make_quality_models(self, n_jobs: Optional[int] = -1) -> Dict[str, 'RandomForestRegressor']:
+        """Unfitted forests (per target, or one joint) with the current hyperparameters"""
+        from sklearn.ensemble import RandomForestRegressor
+        keys = [self.joint_model_key] if self.multi_output else list(self.target_columns)
+        return {
+            key: RandomForestRegressor(**self.quality_params[key], n_jobs=n_jobs)
+            for key in keys
         }
+    
+    def training_targets(self, key: str, training_set: Dict) -> np.ndarray:
+        """Training labels of one quality model: a target column, or all of them for the joint forest"""
+        if key == self.joint_model_key:
+            return training_set['Y_train']
+        return training_set['y_train'][key]
+    
+    def finish_quality_training(self, models: Dict, training_set: Dict) -> Dict:
+        """Install fitted quality models and evaluate each target on the hold-out split"""
+        from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
         
-        # Train individual models
-        results = {}
+        self.quality_predictor = models
         
-        for target, model in self.quality_predictor.items():
-            if target == 'fineness':
-                model.fit(X_train_scaled, y_fin_train)
-                y_pred = model.predict(X_test_scaled)
-                y_true = y_fin_test
-            elif target == 'setting_time':
-                model.fit(X_train_scaled, y_set_train)
-                y_pred = model.predict(X_test_scaled)
-                y_true = y_set_test
-            elif target == 'strength':
-                model.fit(X_train_scaled, y_str_train)
-                y_pred = model.predict(X_test_scaled)
-                y_true = y_str_test
+        # Per-target metrics are the same whichever way the forests are laid out
+        predictions = self._forest_predictions(training_set['X_test'])
+        results = {}
+        for k, target in enumerate(self.target_columns):
+            y_pred = predictions[:, k]
+            y_true = training_set['y_test'][target]
             
             # Evaluate model
             mse = mean_squared_error(y_true, y_pred)
@@ -645,55 +1665,274 @@ class CementQualityController:
             self.logger.info(f"{target.title()} Predictor - MSE: {mse:.2f}, MAE: {mae:.2f}, R²: {r2:.3f}")
         
         # Store feature names for later use
-        self.quality_feature_names = quality_features
+        self.quality_feature_names = self.quality_features
         self.is_trained = True
         
         return results
     
+    def train_quality_models(self, quality_df: pd.DataFrame):
+        """Train models for quality prediction and process correction"""
+        
+        training_set = self.build_quality_training_set(quality_df)
+        
+        # Train individual models (or the joint one)
+        models = self.make_quality_models()
+        for key, model in models.items():
+            model.fit(training_set['X_train'], self.training_targets(key, training_set))
+        
+        return self.finish_quality_training(models, training_set)
+    
+    def _forest_predictions(self, features_scaled: np.ndarray) -> np.ndarray:
+        """Forest predictions as one column per target"""
+        joint = self.quality_predictor.get(self.joint_model_key)
+        if joint is not None:
+            # Each tree is traversed once for all targets
+            return joint.predict(features_scaled).reshape(len(features_scaled), -1)
+        return np.column_stack([self.quality_predictor[target].predict(features_scaled)
+                                for target in self.target_columns])
+    
+    def distill_surrogate(self, quality_df: pd.DataFrame, X_augment: Optional[np.ndarray] = None,
+                          tolerance: float = 0.05, noise: float = 0.1, copies: int = 2) -> Dict:
+        """
+        Fit one small multi-output forest to the per-target forests' predictions
+        on the training rows, jittered copies of them and optional extra process
+        states (X_augment, unscaled). The surrogate is used for serving when its
+        hold-out MAE is within `tolerance` (relative) of the forests' on every target.
+        """
+        from sklearn.ensemble import RandomForestRegressor
+        from sklearn.metrics import mean_absolute_error, r2_score
+        
+        if not self.is_trained:
+            raise ValueError("Models must be trained before distillation")
+        
+        X, Y = self.quality_matrix(quality_df)
+        X_train, X_test, _, Y_test = self._split_quality(X, Y)
+        X_train = self.scaler_quality.transform(X_train)
+        X_test = self.scaler_quality.transform(X_test)
+        
+        # Teacher labels on real, jittered and simulated states
+        rng = np.random.RandomState(42)
+        parts = [X_train] + [X_train + rng.normal(0, noise, X_train.shape) for _ in range(copies)]
+        if X_augment is not None and len(X_augment):
+            parts.append(self.scaler_quality.transform(X_augment))
+        X_distill = np.vstack(parts)
+        surrogate = RandomForestRegressor(**self.surrogate_model_params)
+        surrogate.fit(X_distill, self._forest_predictions(X_distill))
+        
+        # Accuracy against ground truth, side by side
+        teacher_pred = self._forest_predictions(X_test)
+        surrogate_pred = surrogate.predict(X_test)
+        targets = {}
+        for k, target in enumerate(self.target_columns):
+            teacher_mae = mean_absolute_error(Y_test[:, k], teacher_pred[:, k])
+            surrogate_mae = mean_absolute_error(Y_test[:, k], surrogate_pred[:, k])
+            teacher_r2 = r2_score(Y_test[:, k], teacher_pred[:, k])
+            surrogate_r2 = r2_score(Y_test[:, k], surrogate_pred[:, k])
+            targets[target] = {
+                'teacher_mae': teacher_mae,
+                'surrogate_mae': surrogate_mae,
+                'mae_delta': surrogate_mae - teacher_mae,
+                'teacher_r2': teacher_r2,
+                'surrogate_r2': surrogate_r2,
+                'r2_delta': surrogate_r2 - teacher_r2,
+                'fidelity_mae': mean_absolute_error(teacher_pred[:, k], surrogate_pred[:, k])
+            }
+        within_tolerance = all(m['surrogate_mae'] <= m['teacher_mae'] * (1 + tolerance)
+                               for m in targets.values())
+        
+        # Size and single-row latency gains
+        teacher_bytes = sum(len(pickle.dumps(model)) for model in self.quality_predictor.values())
+        surrogate_bytes = len(pickle.dumps(surrogate))
+        row = X_test[:1]
+        teacher_ms = predict_latency_ms(self._forest_predictions, row)
+        surrogate_ms = predict_latency_ms(surrogate.predict, row)
+        
+        self.surrogate = surrogate
+        self.use_surrogate = within_tolerance
+        self.distillation_report = {
+            'targets': targets,
+            'tolerance': tolerance,
+            'within_tolerance': within_tolerance,
+            'serving_model': 'surrogate' if within_tolerance else 'forests',
+            'distillation_rows': len(X_distill),
+            'teacher_bytes': teacher_bytes,
+            'surrogate_bytes': surrogate_bytes,
+            'size_ratio': surrogate_bytes / teacher_bytes,
+            'teacher_latency_ms': teacher_ms,
+            'surrogate_latency_ms': surrogate_ms,
+            'speedup': teacher_ms / surrogate_ms if surrogate_ms > 0 else float('inf')
+        }
+        
+        self.logger.info(f"Quality surrogate: {surrogate_bytes / teacher_bytes:.1%} of forest size, "
+                         f"{teacher_ms:.2f} -> {surrogate_ms:.2f} ms per row, "
+                         f"serving {self.distillation_report['serving_model']}")
+        
+        return self.distillation_report
+    
     def predict_quality(self, current_state: pd.Series) -> Dict:
         """Predict cement quality based on current process state"""
         
         if not self.is_trained:
             raise ValueError("Models must be trained before prediction")
         
-        # Prepare features
-        features = []
-        for feature_name in self.quality_feature_names:
-            if feature_name in current_state:
-                features.append(current_state[feature_name])
-            else:
-                # Handle missing features with reasonable defaults
-                features.append(0.0)
+        return self.predict_quality_batch(current_state.to_frame().T)[0]
+    
+    def quality_score_arrays(self, states: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """Columnar predictions and quality scores for many process states in one model call"""
+        
+        if not self.is_trained:
+            raise ValueError("Models must be trained before prediction")
         
-        features = np.array(features).reshape(1, -1)
+        # Prepare features, handling missing features with reasonable defaults
+        features = np.column_stack([
+            pd.to_numeric(states[name], errors='coerce').to_numpy(dtype=np.float64)
+            if name in states else np.zeros(len(states))
+            for name in self.quality_feature_names
+        ])
         features_scaled = self.scaler_quality.transform(features)
         
-        # Make predictions
-        predictions = {}
-        for target, model in self.quality_predictor.items():
-            pred = model.predict(features_scaled)[0]
-            predictions[target] = pred
+        # Make predictions (one joint call when the distilled surrogate serves)
+        if self.use_surrogate and self.surrogate is not None:
+            joint = self.surrogate.predict(features_scaled).reshape(len(features_scaled), -1)
+        else:
+            joint = self._forest_predictions(features_scaled)
+        predictions = {target: joint[:, k] for k, target in enumerate(self.target_columns)}
         
         # Calculate overall quality score
-        fineness_score = self._calculate_quality_score(predictions['fineness'], 350, 25)
-        setting_score = self._calculate_quality_score(predictions['setting_time'], 165, 15)
-        strength_score = self._calculate_quality_score(predictions['strength'], 53, 5)
-        
-        overall_score = (fineness_score + setting_score + strength_score) / 3
+        fineness_score = self._quality_scores(predictions['fineness'], 350, 25)
+        setting_score = self._quality_scores(predictions['setting_time'], 165, 15)
+        strength_score = self._quality_scores(predictions['strength'], 53, 5)
         
         return {
             'predicted_fineness': predictions['fineness'],
             'predicted_setting_time': predictions['setting_time'],
             'predicted_strength': predictions['strength'],
-            'quality_scores': {
-                'fineness_score': fineness_score,
-                'setting_score': setting_score,
-                'strength_score': strength_score,
-                'overall_score': overall_score
+            'fineness_score': fineness_score,
+            'setting_score': setting_score,
+            'strength_score': strength_score,
+            'overall_score': (fineness_score + setting_score + strength_score) / 3
+        }
+    
+    def predict_quality_batch(self, states: pd.DataFrame) -> List[Dict]:
+        """Predict cement quality for many process states with one model call per target"""
+        
+        scores = self.quality_score_arrays(states)
+        return [
+            {
+                'predicted_fineness': scores['predicted_fineness'][i],
+                'predicted_setting_time': scores['predicted_setting_time'][i],
+                'predicted_strength': scores['predicted_strength'][i],
+                'quality_scores': {
+                    'fineness_score': scores['fineness_score'][i],
+                    'setting_score': scores['setting_score'][i],
+                    'strength_score': scores['strength_score'][i],
+                    'overall_score': scores['overall_score'][i]
+                },
+                'quality_grade': self._determine_quality_grade(scores['overall_score'][i])
+            }
+            for i in range(len(states))
+        ]
+    
+    def optimize_setpoints(self, current_state: pd.Series, n_candidates: int = 4096,
+                           method: str = 'random', move_penalty: float = 0.0,
+                           limits: Optional[Dict] = None, seed: int = 0) -> Dict:
+        """
+        What-if search for setpoint adjustments. Candidates are sampled
+        (randomly, or on a grid) within the actuator limits around the current
+        state, derived features that depend on the setpoints are recomputed,
+        and all candidates are scored in one batched model call. The winner
+        has the best predicted overall_score; a positive move_penalty instead
+        subtracts that much per full step moved ('max_score' is still the best
+        unpenalized score).
+        """
+        
+        start_time = time.perf_counter()
+        controls, candidates, states = self.setpoint_candidates(current_state, n_candidates, method, limits, seed)
+        current = candidates[0]
+        step = np.array([(limits or self.actuator_limits)[col][0] for col in controls])
+        
+        scores = self.quality_score_arrays(states)
+        moved = (np.abs(candidates - current) / step).sum(axis=1)
+        best = int(np.argmax(scores['overall_score'] - move_penalty * moved))
+        
+        return {
+            'current_score': float(scores['overall_score'][0]),
+            'best_score': float(scores['overall_score'][best]),
+            'max_score': float(scores['overall_score'].max()),
+            'improvement': float(scores['overall_score'][best] - scores['overall_score'][0]),
+            'adjustments': {
+                col: {
+                    'current': float(current[j]),
+                    'target': float(candidates[best, j]),
+                    'adjustment': float(candidates[best, j] - current[j])
+                }
+                for j, col in enumerate(controls)
             },
-            'quality_grade': self._determine_quality_grade(overall_score)
+            'predicted': {
+                'fineness': float(scores['predicted_fineness'][best]),
+                'setting_time': float(scores['predicted_setting_time'][best]),
+                'strength': float(scores['predicted_strength'][best]),
+                'quality_grade': self._determine_quality_grade(scores['overall_score'][best])
+            },
+            'candidates_evaluated': len(candidates),
+            'elapsed_ms': 1000 * (time.perf_counter() - start_time)
         }
     
+    def setpoint_candidates(self, current_state: pd.Series, n_candidates: int = 4096,
+                            method: str = 'random', limits: Optional[Dict] = None,
+                            seed: int = 0) -> Tuple[List[str], np.ndarray, pd.DataFrame]:
+        """
+        Candidate setpoints within the actuator limits around the current state
+        (row 0 is "change nothing") and the matching candidate process states,
+        with setpoint-dependent features recomputed. No candidate moves a
+        setpoint by more than its max step; a setpoint outside its hard range
+        moves at most one step toward it.
+        """
+        
+        limits = limits or self.actuator_limits
+        controls = [col for col in limits if col in current_state]
+        current = np.array([float(current_state[col]) for col in controls])
+        step = np.array([limits[col][0] for col in controls])
+        hard_low = np.array([limits[col][1] for col in controls], dtype=np.float64)
+        hard_high = np.array([limits[col][2] for col in controls], dtype=np.float64)
+        
+        # One step around the current value, intersected with the hard range
+        low = np.maximum(current - step, hard_low)
+        high = np.minimum(current + step, hard_high)
+        unreachable = low > high
+        toward = np.clip(np.clip(current, hard_low, hard_high), current - step, current + step)
+        low = np.where(unreachable, np.minimum(current, toward), low)
+        high = np.where(unreachable, np.maximum(current, toward), high)
+        
+        if method == 'grid':
+            levels = max(2, int(round(n_candidates ** (1 / len(controls)))))
+            axes = [np.linspace(lo, hi, levels) for lo, hi in zip(low, high)]
+            samples = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, len(controls))
+        elif method == 'random':
+            rng = np.random.RandomState(seed)
+            samples = low + rng.random_sample((n_candidates, len(controls))) * (high - low)
+        else:
+            raise ValueError(f"Unknown search method: {method}")
+        
+        # Row 0 is "change nothing"
+        candidates = np.vstack([current, samples])
+        
+        # Candidate states: the current state everywhere except the setpoints
+        numeric = pd.to_numeric(current_state, errors='coerce').dropna()
+        states = pd.DataFrame({col: np.full(len(candidates), value, dtype=np.float64)
+                               for col, value in numeric.items()})
+        for j, col in enumerate(controls):
+            states[col] = candidates[:, j]
+        for name in self.setpoint_dependent_features:
+            states[name] = compute_feature(states, name)
+        
+        return controls, candidates, states
+    
+    @staticmethod
+    def _quality_scores(predicted: np.ndarray, target_value: float, tolerance: float) -> np.ndarray:
+        """Vectorized _calculate_quality_score"""
+        return np.clip(100 - (np.abs(predicted - target_value) / tolerance) * 50, 0, 100)
+    
     def _calculate_quality_score(self, predicted_value: float, target_value: float, tolerance: float) -> float:
         """Calculate quality score (0-100) based on deviation from target"""
         deviation = abs(predicted_value - target_value)
@@ -712,9 +1951,11 @@ class CementQualityController:
             return 4  # Poor
     
     def generate_correction_actions(self, quality_prediction: Dict, 
-                                  current_state: pd.Series) -> Dict:
+                                  current_state: pd.Series,
+                                  energy_optimizer: Optional['EnergyOptimizer'] = None) -> Dict:
         """
-        Generate autonomous correction actions based on quality predictions
+        Generate autonomous correction actions based on quality predictions.
+        With a trained energy_optimizer, the energy impact is predicted by its model.
         """
         
         corrections = {
@@ -736,6 +1977,7 @@ class CementQualityController:
                 corrections['process_adjustments']['kiln_temperature'] = {
                     'current': current_state.get('kiln_temperature', 1000),
                     'adjustment': f"+{temp_increase:.1f}°C",
+                    'delta': temp_increase,
                     'reason': 'Increase fineness'
                 }
             
@@ -744,6 +1986,7 @@ class CementQualityController:
                 corrections['process_adjustments']['kiln_temperature'] = {
                     'current': current_state.get('kiln_temperature', 1000),
                     'adjustment': f"-{temp_decrease:.1f}°C",
+                    'delta': -temp_decrease,
                     'reason': 'Reduce over-grinding'
                 }
             
@@ -779,20 +2022,32 @@ class CementQualityController:
                 corrections['process_adjustments']['material_flow_rate'] = {
                     'current': current_state.get('material_flow_rate', 100),
                     'adjustment': f"{flow_adjustment:.1f} tons/hr",
+                    'delta': flow_adjustment,
                     'reason': 'Improve process stability'
                 }
         
         # Estimate impact of corrections
         corrections['estimated_impact'] = {
             'quality_improvement': min(30, max(5, 100 - overall_score)),
-            'energy_impact': self._estimate_energy_impact(corrections['process_adjustments']),
+            'energy_impact': self._estimate_energy_impact(corrections['process_adjustments'],
+                                                          current_state, energy_optimizer),
             'cost_impact': self._estimate_cost_impact(corrections)
         }
         
         return corrections
     
-    def _estimate_energy_impact(self, process_adjustments: Dict) -> str:
+    def _estimate_energy_impact(self, process_adjustments: Dict,
+                                current_state: Optional[pd.Series] = None,
+                                energy_optimizer: Optional['EnergyOptimizer'] = None) -> str:
         """Estimate energy consumption impact of process adjustments"""
+        if energy_optimizer is not None and energy_optimizer.is_trained and current_state is not None:
+            change = energy_optimizer.energy_change_percent(
+                current_state, {col: adj['delta'] for col, adj in process_adjustments.items() if 'delta' in adj}
+            )
+            if abs(change) < 0.5:
+                return "Minimal impact"
+            return f"{'Increase' if change > 0 else 'Decrease'} {abs(change):.1f}%"
+        
         if 'kiln_temperature' in process_adjustments:
             temp_change = process_adjustments['kiln_temperature']['adjustment']
             if '+' in temp_change:
@@ -815,19 +2070,396 @@ class CementQualityController:
 # 3. REAL-TIME ANOMALY & FAULT DETECTION SYSTEM
 # =============================================================================
 
+@dataclass(frozen=True)
+class FeatureDefinition:
+    """Declarative definition of one model input feature"""
+    name: str
+    source: str
+    transform: str = 'identity'  # identity, rolling_mean, rolling_std, deviation, diff, product, is_weekend
+    window: int = 0
+    other: Optional[str] = None  # Second operand for pairwise transforms
+
+
+ANOMALY_SENSOR_COLUMNS = [
+    'kiln_temperature', 'system_pressure', 'material_moisture',
+    'material_flow_rate', 'oxygen_level', 'co_level', 'nox_level',
+    'mill_vibration', 'kiln_vibration', 'energy_consumption'
+]
+
+# Source sensor -> (deviation % threshold, (cause, action) above it, (cause, action) at or below it)
+ANOMALY_RESPONSES = {
+    'kiln_temperature': (15, ("Kiln burner malfunction or fuel supply issue", "Check burner operation and fuel quality"),
+                         ("Normal temperature variation", "Monitor temperature trend")),
+    'system_pressure': (20, ("Blockage in system or fan malfunction", "Inspect system for blockages, check fan operation"),
+                        ("Minor pressure fluctuation", "Continue monitoring")),
+    'material_flow_rate': (25, ("Feeder malfunction or material blockage", "Inspect material feeders and conveyor systems"),
+                           ("Normal flow variation", "Monitor flow stability")),
+    'mill_vibration': (30, ("Equipment bearing wear or misalignment", "Schedule immediate maintenance inspection"),
+                       ("Minor vibration increase", "Monitor vibration trend")),
+    'kiln_vibration': (30, ("Equipment bearing wear or misalignment", "Schedule immediate maintenance inspection"),
+                       ("Minor vibration increase", "Monitor vibration trend")),
+}
+
+def anomaly_responses(sensors: np.ndarray, deviation: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized cause/action lookup in ANOMALY_RESPONSES for arrays of source
+    sensors and deviation percentages (same shape). Sensors without an entry
+    get a generic monitoring response.
+    """
+    sensors = np.asarray(sensors, dtype=object)
+    names, inverse = np.unique(sensors, return_inverse=True)
+    inverse = inverse.reshape(sensors.shape)
+    
+    table = [ANOMALY_RESPONSES.get(name, (np.inf, None, (f"Unusual {name.replace('_', ' ')} reading",
+                                                         f"Monitor {name.replace('_', ' ')} trend")))
+             for name in names]
+    threshold = np.array([entry[0] for entry in table], dtype=np.float64)[inverse]
+    severe = np.asarray(deviation, dtype=np.float64) > threshold
+    
+    def column(k):
+        above = np.array([(entry[1] or entry[2])[k] for entry in table], dtype=object)[inverse]
+        below = np.array([entry[2][k] for entry in table], dtype=object)[inverse]
+        return np.where(severe, above, below)
+    
+    return column(0), column(1)
+
+def default_anomaly_feature_spec(short_window: int = 6) -> List[FeatureDefinition]:
+    """Feature spec shared by anomaly detector training and serving"""
+    
+    spec = [FeatureDefinition(col, col) for col in ANOMALY_SENSOR_COLUMNS]
+    
+    # Rolling statistics (short-term patterns)
+    for col in ANOMALY_SENSOR_COLUMNS:
+        spec += [
+            FeatureDefinition(f'{col}_ma_short', col, 'rolling_mean', short_window),
+            FeatureDefinition(f'{col}_std_short', col, 'rolling_std', short_window),
+            FeatureDefinition(f'{col}_deviation', col, 'deviation', short_window),
+        ]
+    
+    # Cross-correlation features
+    spec += [
+        FeatureDefinition('temp_pressure_correlation', 'kiln_temperature', 'product', other='system_pressure'),
+        FeatureDefinition('flow_energy_correlation', 'material_flow_rate', 'product', other='energy_consumption'),
+    ]
+    
+    # Rate of change features
+    spec += [FeatureDefinition(f'{col}_rate_of_change', col, 'diff', 1) for col in ANOMALY_SENSOR_COLUMNS]
+    
+    # Time-based features
+    spec.append(FeatureDefinition('is_weekend', 'timestamp', 'is_weekend'))
+    
+    return spec
+
+
+class CompiledFeaturePipeline:
+    """
+    Compiles a feature spec into a single vectorized pass that writes only the
+    requested features into a preallocated float32 matrix. Shared
+    intermediates (e.g. the rolling mean used by both `_ma_short` and
+    `_deviation`) are computed once per call.
+    """
+    
+    def __init__(self, spec: List[FeatureDefinition]):
+        self.spec = tuple(spec)
+        self.feature_names = [f.name for f in self.spec]
+        self.source_columns = sorted({f.source for f in self.spec} |
+                                     {f.other for f in self.spec if f.other})
+    
+    @property
+    def lookback(self) -> int:
+        """Preceding rows any output row depends on (widest window or lag)"""
+        return max([0] + [f.window for f in self.spec])
+    
+    def transform(self, frame: pd.DataFrame) -> np.ndarray:
+        """Compute the feature matrix (n_rows x n_features, float32) for a frame"""
+        
+        n = len(frame)
+        out = np.empty((n, len(self.spec)), dtype=np.float32)
+        sources = {}
+        windows = {}
+        
+        def source(col):
+            if col not in sources:
+                sources[col] = frame[col].to_numpy(dtype=np.float64)
+            return sources[col]
+        
+        def window_stats(col, window):
+            if (col, window) not in windows:
+                _, mean, var = rolling_moments(source(col), window, min_periods=1)
+                windows[(col, window)] = (mean, np.sqrt(var))
+            return windows[(col, window)]
+        
+        for j, feature in enumerate(self.spec):
+            t = feature.transform
+            if t == 'identity':
+                out[:, j] = source(feature.source)
+            elif t == 'rolling_mean':
+                out[:, j] = window_stats(feature.source, feature.window)[0]
+            elif t == 'rolling_std':
+                out[:, j] = window_stats(feature.source, feature.window)[1]
+            elif t == 'deviation':
+                mean, std = window_stats(feature.source, feature.window)
+                out[:, j] = (source(feature.source) - mean) / (std + 0.001)
+            elif t == 'diff':
+                values = source(feature.source)
+                out[:feature.window, j] = np.nan
+                out[feature.window:, j] = values[feature.window:] - values[:-feature.window]
+            elif t == 'product':
+                out[:, j] = source(feature.source) * source(feature.other)
+            elif t == 'is_weekend':
+                out[:, j] = frame[feature.source].dt.dayofweek.to_numpy() >= 5
+            else:
+                raise ValueError(f"Unknown feature transform: {t}")
+        
+        # Same missing-value policy as before: forward fill, then zero
+        out[~np.isfinite(out)] = np.nan
+        missing = np.isnan(out)
+        if missing.any():
+            idx = np.where(missing, 0, np.arange(n)[:, None])
+            np.maximum.accumulate(idx, axis=0, out=idx)
+            out = out[idx, np.arange(out.shape[1])]
+            out[np.isnan(out)] = 0.0
+        return out
+
+class RunningMoments:
+    """
+    Per-feature running count, mean and variance (Welford, merged batch-wise
+    with Chan's update). With `decay`, the weight of everything seen so far
+    is multiplied by decay**n for every n new rows, so old data fades out.
+    """
+    
+    def __init__(self, n_features: int, decay: Optional[float] = None):
+        self.decay = decay
+        self.count = 0.0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+    
+    def update(self, X: np.ndarray):
+        X = np.asarray(X, dtype=np.float64)
+        if len(X) == 0:
+            return
+        if self.decay is not None:
+            weight = self.decay ** len(X)
+            self.count *= weight
+            self.m2 *= weight
+        self._merge(float(len(X)), X.mean(axis=0), ((X - X.mean(axis=0)) ** 2).sum(axis=0))
+    
+    def _merge(self, count: float, mean: np.ndarray, m2: np.ndarray):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / total
+        self.count = total
+    
+    def merged(self, other: 'RunningMoments') -> 'RunningMoments':
+        """Moments of the union of two streams"""
+        result = RunningMoments(len(self.mean), self.decay)
+        for moments in (self, other):
+            if moments.count > 0:
+                result._merge(moments.count, moments.mean, moments.m2)
+        return result
+    
+    @property
+    def std(self) -> np.ndarray:
+        """Sample standard deviation (NaN until two rows are seen)"""
+        if self.count <= 1:
+            return np.full(len(self.mean), np.nan)
+        return np.sqrt(np.maximum(self.m2 / (self.count - 1), 0.0))
+
+
+class QuantileSketch:
+    """
+    KLL-style streaming quantile sketch for many features at once. Every
+    feature column receives the same number of items, so all columns share
+    one level layout and a compaction sorts and halves them together. Items
+    on level h stand for 2**h readings; memory stays O(k) rows.
+    """
+    
+    def __init__(self, n_features: int, k: int = 200, seed: int = 0):
+        self.k = k
+        self.n_features = n_features
+        self.count = 0
+        self.levels = [np.empty((0, n_features))]
+        self._rng = np.random.RandomState(seed)
+    
+    def _capacity(self, level: int) -> int:
+        # Lower levels get geometrically smaller buffers
+        depth = len(self.levels) - 1 - level
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+    
+    def update(self, X: np.ndarray):
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self.n_features)
+        self.count += len(X)
+        self.levels[0] = np.vstack([self.levels[0], X])
+        self._compress()
+    
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty((0, self.n_features)))
+                items = np.sort(self.levels[level], axis=0)
+                paired = len(items) // 2 * 2
+                # Promote every other item (random phase); an odd one out stays behind
+                promoted = items[self._rng.randint(2):paired:2]
+                self.levels[level + 1] = np.vstack([self.levels[level + 1], promoted])
+                self.levels[level] = items[paired:]
+            level += 1
+    
+    def merged(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        """Sketch of the union of two streams"""
+        result = QuantileSketch(self.n_features, self.k)
+        depth = max(len(self.levels), len(other.levels))
+        result.levels = [
+            np.vstack([s.levels[h] for s in (self, other) if h < len(s.levels)])
+            for h in range(depth)
+        ]
+        result.count = self.count + other.count
+        result._compress()
+        return result
+    
+    def quantiles(self, qs) -> np.ndarray:
+        """Approximate quantiles, shape (len(qs), n_features)"""
+        items = np.vstack(self.levels)
+        if len(items) == 0:
+            return np.full((len(qs), self.n_features), np.nan)
+        weights = np.concatenate([np.full(len(items_h), 2.0 ** h) for h, items_h in enumerate(self.levels)])
+        
+        order = np.argsort(items, axis=0)
+        ranked = np.take_along_axis(items, order, axis=0)
+        cumulative = np.cumsum(weights[order], axis=0)
+        columns = np.arange(self.n_features)
+        return np.vstack([
+            ranked[np.minimum((cumulative < q * cumulative[-1]).sum(axis=0), len(items) - 1), columns]
+            for q in qs
+        ])
+
+
+class NormalRangeTracker:
+    """
+    Online normal ranges and drift flags for the anomaly features. Starts
+    from the training snapshot of normal data; readings confirmed as normal
+    then update running moments (mean ± 3·std bounds) and a quantile sketch
+    of the most recent readings. The moments forget old data with a half-life
+    of `half_life` readings (default 2016, one week of 5-minute readings), so
+    bounds follow seasonal drift; None weights all history equally. Drift
+    compares recent readings with the training snapshot in training-std units.
+    """
+    
+    drift_quantiles = (0.05, 0.25, 0.5, 0.75, 0.95)
+    
+    def __init__(self, feature_names: List[str], normal_data: np.ndarray,
+                 half_life: Optional[float] = 2016, window: int = 10000,
+                 drift_threshold: float = 1.0, sketch_k: int = 200):
+        X = np.asarray(normal_data, dtype=np.float64)
+        self.feature_names = list(feature_names)
+        self.window = window
+        self.drift_threshold = drift_threshold
+        self.sketch_k = sketch_k
+        
+        # Training snapshot the drift check compares against
+        self.baseline_mean = X.mean(axis=0)
+        self.baseline_std = X.std(axis=0, ddof=1)
+        self.baseline_quantiles = np.quantile(X, self.drift_quantiles, axis=0)
+        
+        self.half_life = half_life
+        self.moments = RunningMoments(X.shape[1], 0.5 ** (1 / half_life) if half_life is not None else None)
+        self.moments.update(X)
+        if self.moments.decay is not None:
+            # Weigh the training snapshot like a steady stream of decayed readings,
+            # so it fades with the same half-life instead of by its raw size
+            scale = min(1.0, 1 / (1 - self.moments.decay) / max(self.moments.count, 1.0))
+            self.moments.count *= scale
+            self.moments.m2 *= scale
+        self.rows_seen = 0
+        
+        # Recent readings: the current window plus the last complete one
+        self._recent = self._new_window()
+        self._previous = self._new_window()
+    
+    def _new_window(self) -> Tuple[RunningMoments, QuantileSketch]:
+        return RunningMoments(len(self.feature_names)), QuantileSketch(len(self.feature_names), self.sketch_k)
+    
+    def update(self, X: np.ndarray):
+        """Fold readings confirmed as normal into the running statistics"""
+        X = np.asarray(X, dtype=np.float64)
+        if len(X) == 0:
+            return
+        self.moments.update(X)
+        self._recent[0].update(X)
+        self._recent[1].update(X)
+        self.rows_seen += len(X)
+        if self._recent[0].count >= self.window:
+            self._previous, self._recent = self._recent, self._new_window()
+    
+    def normal_ranges(self) -> Dict[str, Dict]:
+        """Current bounds in the layout of AnomalyDetectionSystem.normal_ranges"""
+        mean, std = self.moments.mean, self.moments.std
+        return {
+            col: {
+                'mean': mean[j],
+                'std': std[j],
+                'lower_bound': mean[j] - 3 * std[j],
+                'upper_bound': mean[j] + 3 * std[j]
+            }
+            for j, col in enumerate(self.feature_names)
+        }
+    
+    def drift(self) -> Dict:
+        """Features whose recent distribution moved away from the training snapshot"""
+        moments = self._previous[0].merged(self._recent[0])
+        if moments.count == 0:
+            return {'drifted': False, 'rows': 0, 'drifted_features': [], 'features': {}}
+        sketch = self._previous[1].merged(self._recent[1])
+        
+        scale = self.baseline_std + 0.001
+        mean_shift = (moments.mean - self.baseline_mean) / scale
+        quantile_shift = (np.abs(sketch.quantiles(self.drift_quantiles) - self.baseline_quantiles)
+                          / scale).max(axis=0)
+        flagged = (np.abs(mean_shift) > self.drift_threshold) | (quantile_shift > self.drift_threshold)
+        
+        drifted = [self.feature_names[j] for j in np.flatnonzero(flagged)]
+        return {
+            'drifted': bool(flagged.any()),
+            'rows': int(moments.count),
+            'drifted_features': drifted,
+            'features': {
+                self.feature_names[j]: {'mean_shift': float(mean_shift[j]),
+                                        'quantile_shift': float(quantile_shift[j])}
+                for j in np.flatnonzero(flagged)
+            }
+        }
+
 class AnomalyDetectionSystem:
     """
     Advanced anomaly detection system using ensemble methods for
     real-time fault detection and automated alerting.
     """
     
+    # Rows scored per chunk in score_feature_matrix
+    score_chunk_size = 65536
+    
+    # Anomalous samples closer than this belong to the same incident
+    incident_gap = '15min'
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.isolation_forest = None
         self.statistical_detector = None
+        
+        from sklearn.preprocessing import StandardScaler
         self.scaler_anomaly = StandardScaler()
         self.normal_ranges = {}
+        self.range_tracker = None
         self.is_trained = False
+        self.set_feature_spec(default_anomaly_feature_spec())
+    
+    def set_feature_spec(self, spec: List[FeatureDefinition]):
+        """Set the declarative feature spec used for both training and detection"""
+        self.feature_spec = list(spec)
+        self.feature_pipeline = CompiledFeaturePipeline(self.feature_spec)
+        self.feature_names = self.feature_pipeline.feature_names
         
     def prepare_anomaly_features(self, sensor_data: pd.DataFrame) -> pd.DataFrame:
         """Feature engineering specifically for anomaly detection"""
@@ -843,10 +2475,9 @@ class AnomalyDetectionSystem:
         
         # Rolling statistics (short-term patterns)
         for col in sensor_columns:
-            anomaly_df[f'{col}_ma_short'] = anomaly_df[col].rolling(
-                window=6, min_periods=1).mean()
-            anomaly_df[f'{col}_std_short'] = anomaly_df[col].rolling(
-                window=6, min_periods=1).std()
+            _, mean, var = rolling_moments(anomaly_df[col].to_numpy(dtype=np.float64), 6, min_periods=1)
+            anomaly_df[f'{col}_ma_short'] = mean
+            anomaly_df[f'{col}_std_short'] = np.sqrt(var)
             anomaly_df[f'{col}_deviation'] = (
                 anomaly_df[col] - anomaly_df[f'{col}_ma_short']
             ) / (anomaly_df[f'{col}_std_short'] + 0.001)
@@ -870,43 +2501,58 @@ class AnomalyDetectionSystem:
         
         return anomaly_df
     
-    def train_anomaly_detectors(self, sensor_data: pd.DataFrame):
-        """Train ensemble of anomaly detection models"""
-        
-        anomaly_df = self.prepare_anomaly_features(sensor_data)
+    def build_anomaly_training_set(self, sensor_data: pd.DataFrame) -> Dict:
+        """Build the scaled normal-only training matrix (fits the scaler)"""
         
-        # Select features for anomaly detection
-        feature_columns = [col for col in anomaly_df.columns if col not in 
-                          ['timestamp', 'is_anomaly']]
-        
-        # Remove non-numeric columns and handle infinite values
-        numeric_features = []
-        for col in feature_columns:
-            if anomaly_df[col].dtype in ['float64', 'int64']:
-                if not anomaly_df[col].isin([np.inf, -np.inf]).any():
-                    numeric_features.append(col)
-        
-        X = anomaly_df[numeric_features].fillna(method='ffill').fillna(0)
+        # Compute exactly the spec'd features, nothing else
+        X = pd.DataFrame(self.feature_pipeline.transform(sensor_data),
+                         columns=self.feature_names, index=sensor_data.index)
+        is_anomaly = sensor_data['is_anomaly'].to_numpy()
         
         # Use only normal data for training (unsupervised learning)
-        normal_data = X[anomaly_df['is_anomaly'] == 0]
+        normal_data = X[is_anomaly == 0]
         
         # Scale features
-        X_normal_scaled = self.scaler_anomaly.fit_transform(normal_data)
-        
-        # Train Isolation Forest
-        self.isolation_forest = IsolationForest(
+        return {
+            'X_train': self.scaler_anomaly.fit_transform(normal_data),
+            'normal_data': normal_data,
+            'test_data': X[is_anomaly == 1]  # Known anomalies
+        }
+    
+    def make_isolation_forest(self, n_jobs: Optional[int] = -1) -> 'IsolationForest':
+        """Unfitted Isolation Forest with the production hyperparameters"""
+        from sklearn.ensemble import IsolationForest
+        return IsolationForest(
             contamination=0.1,  # Expected contamination rate
             random_state=42,
-            n_estimators=200
+            n_estimators=200,
+            n_jobs=n_jobs
         )
-        self.isolation_forest.fit(X_normal_scaled)
+    
+    def train_anomaly_detectors(self, sensor_data: pd.DataFrame):
+        """Train ensemble of anomaly detection models"""
+        
+        training_set = self.build_anomaly_training_set(sensor_data)
+        
+        # Train Isolation Forest
+        model = self.make_isolation_forest()
+        model.fit(training_set['X_train'])
+        
+        return self.finish_anomaly_training(model, training_set)
+    
+    def finish_anomaly_training(self, model: 'IsolationForest', training_set: Dict) -> Dict:
+        """Install a fitted Isolation Forest, derive normal ranges and evaluate detection"""
+        
+        self.isolation_forest = model
+        normal_data = training_set['normal_data']
         
         # Train statistical anomaly detector (based on normal ranges)
         self.normal_ranges = {}
-        for col in numeric_features:
-            mean_val = normal_data[col].mean()
-            std_val = normal_data[col].std()
+        normal_means = normal_data.astype(np.float64).mean()
+        normal_stds = normal_data.astype(np.float64).std()
+        for col in self.feature_names:
+            mean_val = normal_means[col]
+            std_val = normal_stds[col]
             self.normal_ranges[col] = {
                 'mean': mean_val,
                 'std': std_val,
@@ -914,14 +2560,16 @@ class AnomalyDetectionSystem:
                 'upper_bound': mean_val + 3 * std_val
             }
         
+        # Online tracker continues from the same normal data
+        self.range_tracker = NormalRangeTracker(self.feature_names, normal_data.to_numpy())
+        
         # Evaluate on test data
-        test_data = X[anomaly_df['is_anomaly'] == 1]  # Known anomalies
+        test_data = training_set['test_data']
         if len(test_data) > 0:
             X_test_scaled = self.scaler_anomaly.transform(test_data)
             
             # Isolation Forest predictions
-            if_predictions = self.isolation_forest.predict(X_test_scaled)
-            if_anomalies = (if_predictions == -1).sum()
+            if_anomalies = self.isolation_forest_scores(X_test_scaled)[1].sum()
             
             # Statistical detector predictions
             stat_anomalies = self._detect_statistical_anomalies(test_data)
@@ -932,218 +2580,989 @@ class AnomalyDetectionSystem:
             self.logger.info(f"Isolation Forest detection rate: {detection_rate_if:.2%}")
             self.logger.info(f"Statistical detector detection rate: {detection_rate_stat:.2%}")
         
-        self.feature_names = numeric_features
         self.is_trained = True
         
         return {
             'isolation_forest_trained': True,
             'statistical_detector_trained': True,
             'normal_ranges_calculated': len(self.normal_ranges),
-            'feature_count': len(numeric_features)
+            'feature_count': len(self.feature_names)
         }
     
-    def detect_anomalies(self, current_data: pd.DataFrame) -> Dict:
-        """Real-time anomaly detection on current sensor data"""
+    def detect_anomalies(self, current_data: pd.DataFrame, explain_top_k: Optional[int] = None) -> Dict:
+        """
+        Real-time anomaly detection on current sensor data. With explain_top_k,
+        the result also holds a columnar ranking of the top contributing
+        features of every flagged row (see explain_anomalies).
+        """
         
         if not self.is_trained:
             raise ValueError("Anomaly detectors must be trained before detection")
         
-        anomaly_df = self.prepare_anomaly_features(current_data)
+        # Prepare features (same compiled spec as training)
+        X = pd.DataFrame(self.feature_pipeline.transform(current_data),
+                         columns=self.feature_names, index=current_data.index)
+        scores = self.score_feature_matrix(X.to_numpy())
+        final_predictions = scores['is_anomaly'].tolist()
+        confidence_scores = scores['confidence'].tolist()
         
-        # Prepare features
-        X = anomaly_df[self.feature_names].fillna(method='ffill').fillna(0)
-        X_scaled = self.scaler_anomaly.transform(X)
+        # Detailed analysis for detected anomalies, all flagged rows at once
+        flagged = np.flatnonzero(scores['is_anomaly'])
+        anomaly_details = self._anomaly_details_batch(current_data, flagged, scores['confidence'][flagged])
         
-        # Isolation Forest detection
-        if_predictions = self.isolation_forest.predict(X_scaled)
-        if_scores = self.isolation_forest.score_samples(X_scaled)
+        results = {
+            'anomalies_detected': sum(final_predictions),
+            'anomaly_indices': flagged.tolist(),
+            'confidence_scores': confidence_scores,
+            'anomaly_details': anomaly_details,
+            'incidents': [incident.to_dict() for incident in aggregate_incidents(anomaly_details, self.incident_gap)],
+            'severity_levels': self._classify_severity(confidence_scores, final_predictions)
+        }
+        if explain_top_k:
+            results['explanations'] = self.explain_anomalies(
+                X.to_numpy(), flagged, top_k=explain_top_k,
+                timestamps=current_data['timestamp'].to_numpy()
+            )
+        return results
+    
+    def update_normal_ranges(self, X: np.ndarray, confirmed_normal: Optional[np.ndarray] = None) -> Dict:
+        """
+        Update the statistical bounds from new feature rows without retraining.
+        Only rows confirmed as normal are used; by default those the ensemble
+        scores as normal. Returns the rows used and the current drift report.
+        """
         
-        # Statistical detection
-        stat_anomalies = []
-        stat_scores = []
+        if self.range_tracker is None:
+            raise ValueError("Anomaly detectors must be trained before updating normal ranges")
         
-        for idx, row in X.iterrows():
-            anomaly_count = 0
-            total_score = 0
-            
-            for col in self.feature_names:
-                if col in self.normal_ranges:
-                    value = row[col]
-                    bounds = self.normal_ranges[col]
-                    
-                    if value < bounds['lower_bound'] or value > bounds['upper_bound']:
-                        anomaly_count += 1
-                    
-                    # Calculate normalized deviation score
-                    deviation = abs(value - bounds['mean']) / (bounds['std'] + 0.001)
-                    total_score += deviation
-            
-            # Consider anomaly if more than 20% of features are out of bounds
-            is_anomaly = (anomaly_count / len(self.feature_names)) > 0.2
-            stat_anomalies.append(is_anomaly)
-            stat_scores.append(total_score / len(self.feature_names))
+        X = np.asarray(X)
+        if confirmed_normal is None:
+            confirmed_normal = ~self.score_feature_matrix(X)['is_anomaly']
+        self.range_tracker.update(X[confirmed_normal])
         
-        # Combine predictions (ensemble approach)
-        final_predictions = []
-        confidence_scores = []
+        # Swap in a new dict so concurrent scoring sees old or new bounds, never a mix
+        self.normal_ranges = self.range_tracker.normal_ranges()
         
-        for i in range(len(current_data)):
-            if_anomaly = if_predictions[i] == -1
-            stat_anomaly = stat_anomalies[i]
-            
-            # Ensemble decision: anomaly if either detector triggers
-            is_anomaly = if_anomaly or stat_anomaly
+        return {'rows_used': int(np.sum(confirmed_normal)), 'drift': self.range_tracker.drift()}
+    
+    def range_tracking_copy(self) -> 'AnomalyDetectionSystem':
+        """
+        Copy that shares the trained models but has its own range tracker, so
+        update_normal_ranges on it leaves this (published) detector untouched
+        """
+        clone = copy.copy(self)
+        clone.range_tracker = copy.deepcopy(self.range_tracker)
+        return clone
+    
+    def model_fingerprint(self) -> str:
+        """Digest of everything scoring depends on: forest, scaler, normal ranges and features"""
+        state = (self.isolation_forest, self.scaler_anomaly,
+                 sorted(self.normal_ranges.items()), list(self.feature_names))
+        return hashlib.sha256(pickle.dumps(state, protocol=4)).hexdigest()
+    
+    def drift_report(self) -> Dict:
+        """Distribution drift of recent normal readings against the training snapshot"""
+        if self.range_tracker is None:
+            return {'drifted': False, 'rows': 0, 'drifted_features': [], 'features': {}}
+        return self.range_tracker.drift()
+    
+    def isolation_forest_scores(self, X_scaled: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Isolation Forest scores and anomaly labels from a single traversal of
+        the trees: IsolationForest.predict() is score_samples() < offset_, so
+        the labels follow from the scores without scoring twice.
+        """
+        if_scores = self.isolation_forest.score_samples(X_scaled)
+        return if_scores, if_scores < self.isolation_forest.offset_
+    
+    def score_feature_matrix(self, X: np.ndarray, chunk_size: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Score a precomputed feature matrix (rows may come from different plants
+        or time ranges) with both detectors, fully vectorized. Rows are scored
+        in chunks of `chunk_size` so memory stays bounded on large backfills.
+        """
+        
+        chunk_size = chunk_size or self.score_chunk_size
+        X = np.asarray(X)
+        if_scores = np.empty(len(X))
+        if_anomalies = np.empty(len(X), dtype=bool)
+        stat_scores = np.empty(len(X))
+        stat_anomalies = np.empty(len(X), dtype=bool)
+        for start in range(0, len(X), chunk_size):
+            rows = slice(start, start + chunk_size)
+            X_scaled = self.scaler_anomaly.transform(pd.DataFrame(X[rows], columns=self.feature_names))
             
-            # Confidence score (higher = more confident it's an anomaly)
-            confidence = (abs(if_scores[i]) + stat_scores[i]) / 2
+            # Isolation Forest detection
+            if_scores[rows], if_anomalies[rows] = self.isolation_forest_scores(X_scaled)
             
-            final_predictions.append(is_anomaly)
-            confidence_scores.append(confidence)
-        
-        # Detailed analysis for detected anomalies
-        anomaly_details = []
-        for i, (is_anomaly, confidence) in enumerate(zip(final_predictions, confidence_scores)):
-            if is_anomaly:
-                details = self._analyze_anomaly_details(
-                    current_data.iloc[i], X.iloc[i], confidence
-                )
-                anomaly_details.append(details)
+            # Statistical detection against the learned normal ranges
+            stat_anomalies[rows], stat_scores[rows] = self._score_statistical(X[rows])
         
+        # Ensemble decision: anomaly if either detector triggers;
+        # confidence is higher the more certain it is an anomaly
         return {
-            'anomalies_detected': sum(final_predictions),
-            'anomaly_indices': [i for i, pred in enumerate(final_predictions) if pred],
-            'confidence_scores': confidence_scores,
-            'anomaly_details': anomaly_details,
-            'severity_levels': self._classify_severity(confidence_scores, final_predictions)
+            'is_anomaly': if_anomalies | stat_anomalies,
+            'confidence': (np.abs(if_scores) + stat_scores) / 2,
+            'if_scores': if_scores,
+            'stat_scores': stat_scores
         }
     
+    def _normal_range_arrays(self) -> Tuple[np.ndarray, ...]:
+        """Normal ranges as arrays aligned with feature_names (NaN where unknown)"""
+        normal_ranges = self.normal_ranges
+        ranges = [normal_ranges.get(col) for col in self.feature_names]
+        known = np.array([r is not None for r in ranges])
+        def column(key):
+            return np.array([r[key] if r is not None else np.nan for r in ranges], dtype=np.float64)
+        return known, column('mean'), column('std'), column('lower_bound'), column('upper_bound')
+    
+    def _score_statistical(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-row out-of-range flag and mean normalized deviation"""
+        known, mean, std, lower, upper = self._normal_range_arrays()
+        Xk = np.asarray(X, dtype=np.float64)[:, known]
+        
+        out_of_bounds = ((Xk < lower[known]) | (Xk > upper[known])).sum(axis=1)
+        deviation = (np.abs(Xk - mean[known]) / (std[known] + 0.001)).sum(axis=1)
+        
+        # Consider anomaly if more than 20% of features are out of bounds
+        n_features = len(self.feature_names)
+        return out_of_bounds / n_features > 0.2, deviation / n_features
+    
     def _detect_statistical_anomalies(self, data: pd.DataFrame) -> int:
         """Helper method for statistical anomaly detection"""
-        anomaly_count = 0
-        for _, row in data.iterrows():
-            feature_anomalies = 0
-            for col in self.feature_names:
-                if col in self.normal_ranges and col in data.columns:
-                    value = row[col]
-                    bounds = self.normal_ranges[col]
-                    if value < bounds['lower_bound'] or value > bounds['upper_bound']:
-                        feature_anomalies += 1
-            
-            if (feature_anomalies / len(self.feature_names)) > 0.2:
-                anomaly_count += 1
+        stat_anomalies, _ = self._score_statistical(data[self.feature_names].to_numpy())
+        return int(stat_anomalies.sum())
+    
+    def explain_anomalies(self, X: np.ndarray, rows: np.ndarray, top_k: int = 3,
+                          timestamps: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """
+        Rank the features that drive each flagged row. Z-scores against the
+        normal ranges are computed for all rows and features in one matrix
+        operation; each row's share of total |z| is its contribution. Returns
+        one record per (row, rank) with the source sensor's cause and action.
+        """
+        
+        rows = np.asarray(rows, dtype=int)
+        X = np.asarray(X, dtype=np.float64)[rows]
+        known, mean, std, _, _ = self._normal_range_arrays()
+        
+        z = np.where(known, (X - mean) / (std + 0.001), 0.0)
+        magnitude = np.abs(np.nan_to_num(z))
+        total = magnitude.sum(axis=1, keepdims=True)
+        
+        # Top-k features per row, strongest first
+        k = min(top_k, X.shape[1])
+        top = np.argpartition(-magnitude, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(top, np.argsort(-np.take_along_axis(magnitude, top, axis=1), axis=1), axis=1)
+        
+        # Causes follow the deviation of the raw sensor a feature derives from
+        sources = np.array([f.source for f in self.feature_spec], dtype=object)
+        identity = {f.source: j for j, f in enumerate(self.feature_spec) if f.transform == 'identity'}
+        source_column = np.array([identity.get(f.source, j) for j, f in enumerate(self.feature_spec)])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            deviation = np.abs(X - mean) / np.abs(mean) * 100
+        source_deviation = np.take_along_axis(deviation, source_column[top], axis=1)
+        causes, actions = anomaly_responses(sources[top], source_deviation)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            contribution = np.take_along_axis(magnitude, top, axis=1) / total
+        
+        explanation = pd.DataFrame({
+            'row': np.repeat(rows, k),
+            'rank': np.tile(np.arange(1, k + 1), len(rows)),
+            'feature': np.array(self.feature_names, dtype=object)[top].ravel(),
+            'sensor': sources[top].ravel(),
+            'value': np.take_along_axis(X, top, axis=1).ravel(),
+            'z_score': np.take_along_axis(z, top, axis=1).ravel(),
+            'contribution': contribution.ravel(),
+            'deviation_percent': source_deviation.ravel(),
+            'potential_cause': causes.ravel(),
+            'recommended_action': actions.ravel()
+        })
+        if timestamps is not None:
+            explanation.insert(1, 'timestamp', np.asarray(timestamps)[np.repeat(rows, k)])
+        return explanation
+    
+    # Sensors checked against their bounds in anomaly_details
+    detail_sensors = ['kiln_temperature', 'system_pressure', 'material_flow_rate',
+                      'mill_vibration', 'kiln_vibration']
+    
+    def _anomaly_details_batch(self, sensor_data: pd.DataFrame, rows: np.ndarray,
+                               confidence: np.ndarray) -> List[Dict]:
+        """Vectorized _analyze_anomaly_details for many flagged rows of one frame"""
         
-        return anomaly_count
+        if len(rows) == 0:
+            return []
+        
+        sensors = [col for col in self.detail_sensors if col in self.normal_ranges and col in sensor_data]
+        values = sensor_data[sensors].to_numpy(dtype=np.float64)[rows]
+        mean, lower, upper = (np.array([self.normal_ranges[col][key] for col in sensors])
+                              for key in ('mean', 'lower_bound', 'upper_bound'))
+        
+        # Check which sensors are anomalous
+        out_of_range = (values < lower) | (values > upper)
+        deviation = np.abs(values - mean) / mean * 100
+        causes, actions = anomaly_responses(np.broadcast_to(np.array(sensors, dtype=object), values.shape),
+                                            deviation)
+        severity = self.severity_levels(confidence)
+        timestamps = sensor_data['timestamp'].to_numpy()[rows] if 'timestamp' in sensor_data else [None] * len(rows)
+        
+        details = []
+        for i in range(len(rows)):
+            hit = np.flatnonzero(out_of_range[i])
+            details.append({
+                'timestamp': pd.Timestamp(timestamps[i]) if timestamps[i] is not None else None,
+                'confidence': float(confidence[i]),
+                'affected_sensors': [
+                    {
+                        'sensor': sensors[j],
+                        'current_value': values[i, j],
+                        'expected_range': f"{lower[j]:.1f} - {upper[j]:.1f}",
+                        'deviation_percent': deviation[i, j]
+                    }
+                    for j in hit
+                ],
+                'severity': str(severity[i]),
+                'potential_causes': causes[i, hit].tolist(),
+                'recommended_actions': actions[i, hit].tolist()
+            })
+        return details
     
     def _analyze_anomaly_details(self, sensor_row: pd.Series, 
                                feature_row: pd.Series, confidence: float) -> Dict:
         """Analyze specific details of detected anomalies"""
-        
-        details = {
-            'timestamp': sensor_row['timestamp'],
-            'confidence': confidence,
-            'affected_sensors': [],
-            'severity': 'medium',
-            'potential_causes': [],
-            'recommended_actions': []
+        return self._anomaly_details_batch(sensor_row.to_frame().T, np.array([0]), np.array([confidence]))[0]
+    
+    def _generate_anomaly_response(self, affected_sensors: List[Dict]) -> Dict:
+        """Generate potential causes and recommended actions for anomalies"""
+        causes, actions = anomaly_responses([info['sensor'] for info in affected_sensors],
+                                            [info['deviation_percent'] for info in affected_sensors])
+        return {
+            'potential_causes': causes.tolist(),
+            'recommended_actions': actions.tolist()
         }
+    
+    # Confidence above which a single sample gets each severity (highest first);
+    # shared by per-sample anomaly details and backfill scoring
+    severity_thresholds = ((2.0, 'critical'), (1.0, 'high'), (0.5, 'medium'))
+    
+    @classmethod
+    def severity_levels(cls, confidence: np.ndarray) -> np.ndarray:
+        """Per-row severity label from severity_thresholds"""
+        confidence = np.asarray(confidence)
+        return np.select([confidence > threshold for threshold, _ in cls.severity_thresholds],
+                         [level for _, level in cls.severity_thresholds], default='low')
+    
+    def _classify_severity(self, confidence_scores: List[float], 
+                          predictions: List[bool]) -> Dict:
+        """Classify overall severity of detected anomalies"""
         
-        # Check which sensors are anomalous
-        for col in ['kiln_temperature', 'system_pressure', 'material_flow_rate', 
-                   'mill_vibration', 'kiln_vibration']:
-            if col in self.normal_ranges and col in sensor_row:
-                value = sensor_row[col]
-                bounds = self.normal_ranges[col]
-                
-                if value < bounds['lower_bound'] or value > bounds['upper_bound']:
-                    deviation_pct = abs(value - bounds['mean']) / bounds['mean'] * 100
-                    details['affected_sensors'].append({
-                        'sensor': col,
-                        'current_value': value,
-                        'expected_range': f"{bounds['lower_bound']:.1f} - {bounds['upper_bound']:.1f}",
-                        'deviation_percent': deviation_pct
-                    })
+        if not any(predictions):
+            return {'level': 'normal', 'count': 0}
+        
+        anomaly_scores = [score for score, pred in zip(confidence_scores, predictions) if pred]
+        max_score = max(anomaly_scores)
+        avg_score = np.mean(anomaly_scores)
         
-        # Determine severity
-        if confidence > 2.0:
-            details['severity'] = 'critical'
-        elif confidence > 1.0:
-            details['severity'] = 'high'
-        elif confidence > 0.5:
-            details['severity'] = 'medium'
+        if max_score > 2.5 or avg_score > 1.5:
+            return {'level': 'critical', 'count': len(anomaly_scores), 'max_confidence': max_score}
+        elif max_score > 1.5 or avg_score > 1.0:
+            return {'level': 'high', 'count': len(anomaly_scores), 'max_confidence': max_score}
+        elif max_score > 0.8 or avg_score > 0.6:
+            return {'level': 'medium', 'count': len(anomaly_scores), 'max_confidence': max_score}
         else:
-            details['severity'] = 'low'
+            return {'level': 'low', 'count': len(anomaly_scores), 'max_confidence': max_score}
+
+# =============================================================================
+# 4. ENERGY CONSUMPTION MODEL & OPTIMIZATION
+# =============================================================================
+
+class EnergyOptimizer:
+    """
+    Energy consumption model trained on sensor history, and a vectorized
+    search over kiln temperature and flow setpoints for the operating point
+    with the lowest predicted energy whose predicted quality still meets the
+    CementQualityController constraints.
+    """
+    
+    # Inputs of the consumption model
+    energy_features = [
+        'kiln_temperature', 'material_flow_rate', 'system_pressure',
+        'material_moisture', 'oxygen_level'
+    ]
+    
+    # Setpoints explored by the optimizer (limits come from the quality controller)
+    controls = ['kiln_temperature', 'material_flow_rate']
+    
+    energy_model_params = {'n_estimators': 150, 'max_depth': 4, 'learning_rate': 0.1, 'random_state': 42}
+    
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.energy_model = None
+        self.is_trained = False
+    
+    def train_energy_model(self, sensor_data: pd.DataFrame) -> Dict:
+        """Fit kWh consumption on normal-operation sensor history"""
+        from sklearn.ensemble import GradientBoostingRegressor
+        from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+        from sklearn.model_selection import train_test_split
+        
+        data = sensor_data
+        if 'is_anomaly' in data:
+            data = data[data['is_anomaly'] == 0]
+        data = data[self.energy_features + ['energy_consumption']].dropna()
+        
+        X = data[self.energy_features].to_numpy(dtype=np.float64)
+        y = data['energy_consumption'].to_numpy(dtype=np.float64)
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42, shuffle=False
+        )
         
-        # Generate potential causes and actions
-        details.update(self._generate_anomaly_response(details['affected_sensors']))
+        self.energy_model = GradientBoostingRegressor(**self.energy_model_params)
+        self.energy_model.fit(X_train, y_train)
         
-        return details
+        # Evaluate model
+        y_pred = self.energy_model.predict(X_test)
+        mse = mean_squared_error(y_test, y_pred)
+        mae = mean_absolute_error(y_test, y_pred)
+        r2 = r2_score(y_test, y_pred)
+        self.logger.info(f"Energy Model - MSE: {mse:.2f}, MAE: {mae:.2f}, R²: {r2:.3f}")
+        self.is_trained = True
+        
+        return {
+            'mse': mse,
+            'mae': mae,
+            'r2': r2,
+            'feature_importance': dict(zip(self.energy_features, self.energy_model.feature_importances_))
+        }
     
-    def _generate_anomaly_response(self, affected_sensors: List[Dict]) -> Dict:
-        """Generate potential causes and recommended actions for anomalies"""
+    def predict_energy(self, states: pd.DataFrame) -> np.ndarray:
+        """Predicted kWh for many process states in one call"""
+        
+        if not self.is_trained:
+            raise ValueError("Energy model must be trained before prediction")
+        
+        X = np.column_stack([
+            pd.to_numeric(states[name], errors='coerce').to_numpy(dtype=np.float64)
+            if name in states else np.zeros(len(states))
+            for name in self.energy_features
+        ])
+        return self.energy_model.predict(X)
+    
+    def energy_change_percent(self, current_state: pd.Series, deltas: Dict[str, float]) -> float:
+        """Predicted % change in energy when the given setpoints move by `deltas`"""
+        states = current_state.to_frame().T
+        states = pd.concat([states, states], ignore_index=True)
+        for col, delta in deltas.items():
+            if col in states:
+                states.loc[1, col] = float(states.loc[1, col]) + delta
+        before, after = self.predict_energy(states)
+        return 100 * (after - before) / before if before else 0.0
+    
+    def optimize_operating_point(self, current_state: pd.Series,
+                                 quality_controller: CementQualityController,
+                                 min_overall_score: float = 75.0,
+                                 per_tonne: bool = True,
+                                 n_candidates: int = 8192,
+                                 seed: int = 0) -> Dict:
+        """
+        Search temperature/flow setpoints for the minimum predicted energy
+        (per tonne of throughput by default, so cutting production does not
+        count as a saving) among candidates whose predicted overall quality
+        score is at least `min_overall_score`. Energy and quality are
+        predicted for all candidates in one batch each.
+        """
+        
+        if not quality_controller.is_trained:
+            raise ValueError("Quality models must be trained before energy optimization")
+        
+        start_time = time.perf_counter()
+        limits = {col: quality_controller.actuator_limits[col] for col in self.controls}
+        controls, candidates, states = quality_controller.setpoint_candidates(
+            current_state, n_candidates, 'random', limits, seed
+        )
         
-        causes = []
-        actions = []
+        energy = self.predict_energy(states)
+        quality = quality_controller.quality_score_arrays(states)['overall_score']
+        throughput = states['material_flow_rate'].to_numpy(dtype=np.float64)
+        objective = energy / np.maximum(throughput, 1e-6) if per_tonne else energy
+        
+        feasible = quality >= min_overall_score
+        result = {
+            'current_energy_kwh': float(energy[0]),
+            'current_kwh_per_tonne': float(energy[0] / max(throughput[0], 1e-6)),
+            'current_quality_score': float(quality[0]),
+            'feasible_candidates': int(feasible.sum()),
+            'candidates_evaluated': len(candidates)
+        }
+        if not feasible.any():
+            result.update({'feasible': False, 'elapsed_ms': 1000 * (time.perf_counter() - start_time)})
+            return result
+        
+        best = int(np.flatnonzero(feasible)[np.argmin(objective[feasible])])
+        result.update({
+            'feasible': True,
+            'optimal_energy_kwh': float(energy[best]),
+            'optimal_kwh_per_tonne': float(energy[best] / max(throughput[best], 1e-6)),
+            'savings_percent': float(100 * (objective[0] - objective[best]) / objective[0]) if objective[0] else 0.0,
+            'predicted_quality_score': float(quality[best]),
+            'setpoints': {
+                col: {
+                    'current': float(candidates[0, j]),
+                    'target': float(candidates[best, j]),
+                    'adjustment': float(candidates[best, j] - candidates[0, j])
+                }
+                for j, col in enumerate(controls)
+            },
+            'elapsed_ms': 1000 * (time.perf_counter() - start_time)
+        })
+        return result
+
+# =============================================================================
+# ANOMALY INCIDENTS
+# =============================================================================
+
+SEVERITY_ORDER = ['low', 'medium', 'high', 'critical']
+
+@dataclass(frozen=True)
+class AnomalyIncident:
+    """A run of anomalous samples no more than the merge gap apart"""
+    incident_id: int
+    start: pd.Timestamp
+    end: pd.Timestamp
+    samples: int
+    peak_confidence: float
+    peak_time: pd.Timestamp
+    severity: str
+    affected_sensors: Tuple[str, ...] = ()
+    
+    def merge(self, other: 'AnomalyIncident') -> 'AnomalyIncident':
+        """This incident extended by another one; keeps this incident's ID"""
+        peak = self if self.peak_confidence >= other.peak_confidence else other
+        return replace(
+            self,
+            start=min(self.start, other.start),
+            end=max(self.end, other.end),
+            samples=self.samples + other.samples,
+            peak_confidence=peak.peak_confidence,
+            peak_time=peak.peak_time,
+            severity=max(self.severity, other.severity, key=SEVERITY_ORDER.index),
+            affected_sensors=tuple(sorted(set(self.affected_sensors) | set(other.affected_sensors)))
+        )
+    
+    def to_dict(self) -> Dict:
+        incident = asdict(self)
+        incident['affected_sensors'] = list(self.affected_sensors)
+        incident['duration_minutes'] = (self.end - self.start).total_seconds() / 60
+        return incident
+
+
+def aggregate_incidents(anomaly_details: List[Dict], max_gap='15min') -> List[AnomalyIncident]:
+    """Group per-sample anomaly details into incidents (IDs numbered from 0 in time order)"""
+    
+    if not anomaly_details:
+        return []
+    
+    times = pd.to_datetime([d['timestamp'] for d in anomaly_details]).to_numpy()
+    order = np.argsort(times, kind='stable')
+    times = times[order]
+    confidence = np.array([d['confidence'] for d in anomaly_details], dtype=np.float64)[order]
+    severity = np.array([SEVERITY_ORDER.index(d['severity']) for d in anomaly_details])[order]
+    
+    # A new incident starts wherever consecutive samples are further apart than the gap
+    breaks = np.flatnonzero(np.diff(times) > pd.Timedelta(max_gap).to_timedelta64()) + 1
+    starts = np.concatenate([[0], breaks])
+    stops = np.concatenate([breaks, [len(times)]])
+    peaks = np.maximum.reduceat(confidence, starts)
+    severities = np.maximum.reduceat(severity, starts)
+    
+    incidents = []
+    for k, (first, stop) in enumerate(zip(starts, stops)):
+        peak = first + int(np.argmax(confidence[first:stop]))
+        sensors = {info['sensor'] for i in order[first:stop] for info in anomaly_details[i]['affected_sensors']}
+        incidents.append(AnomalyIncident(
+            incident_id=k,
+            start=pd.Timestamp(times[first]),
+            end=pd.Timestamp(times[stop - 1]),
+            samples=int(stop - first),
+            peak_confidence=float(peaks[k]),
+            peak_time=pd.Timestamp(times[peak]),
+            severity=SEVERITY_ORDER[severities[k]],
+            affected_sensors=tuple(sorted(sensors))
+        ))
+    return incidents
+
+
+class IncidentIndex:
+    """
+    Interval index over incidents: start times kept sorted alongside the
+    running maximum of end times in start order. An overlap query bounds the
+    candidates with two binary searches and filters them in one vector op.
+    Arrays are rebuilt lazily after updates; the earliest-starting incidents
+    are dropped beyond max_incidents, found through a min-heap of start times.
+    """
+    
+    def __init__(self, max_incidents: int = 10000):
+        self.max_incidents = max_incidents
+        self._incidents: Dict[int, AnomalyIncident] = {}
+        # (start, incident_id); entries whose start no longer matches are stale
+        self._starts: List[Tuple[int, int]] = []
+        self._arrays = None
+    
+    def __len__(self) -> int:
+        return len(self._incidents)
+    
+    def upsert(self, incident: AnomalyIncident):
+        """Add an incident or replace the one with the same ID"""
+        previous = self._incidents.get(incident.incident_id)
+        self._incidents[incident.incident_id] = incident
+        if previous is None or previous.start != incident.start:
+            heapq.heappush(self._starts, (incident.start.value, incident.incident_id))
+        while len(self._incidents) > self.max_incidents:
+            start, incident_id = heapq.heappop(self._starts)
+            oldest = self._incidents.get(incident_id)
+            if oldest is not None and oldest.start.value == start:
+                del self._incidents[incident_id]
+        self._arrays = None
+    
+    def _build(self):
+        if self._arrays is None:
+            ordered = sorted(self._incidents.values(), key=lambda i: i.start)
+            starts = np.array([i.start.value for i in ordered], dtype=np.int64)
+            ends = np.array([i.end.value for i in ordered], dtype=np.int64)
+            self._arrays = (ordered, starts, ends, np.maximum.accumulate(ends) if len(ends) else ends)
+        return self._arrays
+    
+    def overlapping(self, start, end) -> List[AnomalyIncident]:
+        """Incidents that overlap [start, end], in start order"""
+        ordered, starts, ends, max_ends = self._build()
+        start, end = pd.Timestamp(start).value, pd.Timestamp(end).value
+        
+        # Nothing before `lo` can reach `start`; nothing from `hi` on begins before `end`
+        lo = int(np.searchsorted(max_ends, start, side='left'))
+        hi = int(np.searchsorted(starts, end, side='right'))
+        hits = lo + np.flatnonzero(ends[lo:hi] >= start)
+        return [ordered[i] for i in hits]
+    
+    def incidents(self) -> List[AnomalyIncident]:
+        return list(self._build()[0])
+
+
+class IncidentTracker:
+    """
+    Folds anomaly details arriving over time into incidents: samples within
+    max_gap of the open incident extend it, others open a new one. Samples
+    not newer than the open incident's end were already counted and are
+    skipped. Every incident is kept in an IncidentIndex for window queries.
+    """
+    
+    def __init__(self, max_gap='15min', max_incidents: int = 10000):
+        self.max_gap = pd.Timedelta(max_gap)
+        self.index = IncidentIndex(max_incidents)
+        self._open: Optional[AnomalyIncident] = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+    
+    def record(self, anomaly_details: List[Dict]) -> List[Dict]:
+        """Fold new details in; returns the touched incidents with status 'new' or 'ongoing'"""
+        touched = {}
+        with self._lock:
+            if self._open is not None:
+                anomaly_details = [d for d in anomaly_details
+                                   if pd.Timestamp(d['timestamp']) > self._open.end]
+            for incident in aggregate_incidents(anomaly_details, self.max_gap):
+                current = self._open
+                if current is not None and current.start - self.max_gap <= incident.start <= current.end + self.max_gap:
+                    incident = current.merge(incident)
+                    status = touched.get(incident.incident_id, (None, 'ongoing'))[1]
+                else:
+                    incident = replace(incident, incident_id=self._next_id)
+                    self._next_id += 1
+                    status = 'new'
+                self._open = incident
+                self.index.upsert(incident)
+                touched[incident.incident_id] = (incident, status)
+        return [dict(incident.to_dict(), status=status) for incident, status in touched.values()]
+    
+    def overlapping(self, start, end) -> List[Dict]:
+        with self._lock:
+            return [incident.to_dict() for incident in self.index.overlapping(start, end)]
+
+# =============================================================================
+# VERSIONED PLANT STATE & MODEL SNAPSHOTS
+# =============================================================================
+
+@dataclass(frozen=True)
+class PlantModelBundle:
+    """
+    Immutable, versioned set of trained models. Serving code reads a bundle
+    reference once per request; retraining builds a new bundle and publishes
+    it, so published models are never mutated.
+    """
+    logistics_optimizer: LogisticsOptimizer
+    quality_controller: CementQualityController
+    anomaly_detector: AnomalyDetectionSystem
+    energy_optimizer: Optional[EnergyOptimizer] = None
+    version: int = 0
+    # Bumped when online normal-range updates publish a new anomaly detector
+    ranges_version: int = 0
+    
+    @classmethod
+    def from_system(cls, cement_ai: 'CementMindAI') -> 'PlantModelBundle':
+        return cement_ai.models_snapshot()
+    
+    @classmethod
+    def load(cls, file_path: str = "cementmind_models.joblib") -> 'PlantModelBundle':
+        cement_ai = CementMindAI()
+        cement_ai.load_models(file_path)
+        return cement_ai.models_snapshot()
+
+
+@dataclass(frozen=True)
+class PlantDataSnapshot:
+    """
+    Immutable, versioned view of plant history. The frames and the joiner are
+    never modified after publication; ingest builds replacements instead.
+    The time-bucket rollups (CementMindAI.rollups) are not part of the
+    snapshot: they are updated in place and may be newer than it.
+    """
+    version: int = 0
+    sensor_data: Optional[pd.DataFrame] = None
+    material_data: Optional[pd.DataFrame] = None
+    quality_data: Optional[pd.DataFrame] = None
+    quality_joiner: Optional[IncrementalAsOfJoiner] = None
+
+
+class AppendOnlyFrame:
+    """
+    Append-only columnar store behind published snapshot frames. Columns are
+    kept in arrays that grow geometrically; `frame` is a DataFrame viewing the
+    first rows without copying them. Appends only write past the end of every
+    frame handed out so far, so published frames never change, and appending
+    k rows costs O(k) amortized instead of a concat of the whole history.
+    """
+    
+    def __init__(self, frame: pd.DataFrame):
+        self.columns = list(frame.columns)
+        self.dtypes = [frame[col].dtype for col in self.columns]
+        self._arrays = [frame[col].to_numpy(copy=True) for col in self.columns]
+        self._size = len(frame)
+        self.frame = self._view()
+    
+    @staticmethod
+    def supports(frame: pd.DataFrame) -> bool:
+        """Whether every column is a plain numpy dtype (extension dtypes would not round-trip)"""
+        return all(isinstance(dtype, np.dtype) and dtype != object for dtype in frame.dtypes)
+    
+    def accepts(self, rows: pd.DataFrame) -> bool:
+        return list(rows.columns) == self.columns and all(rows[col].dtype == dtype
+                                                          for col, dtype in zip(self.columns, self.dtypes))
+    
+    def _view(self) -> pd.DataFrame:
+        return pd.DataFrame({col: array[:self._size] for col, array in zip(self.columns, self._arrays)},
+                            copy=False)
+    
+    def append(self, rows: pd.DataFrame) -> pd.DataFrame:
+        """Append rows (same columns and dtypes) and return the frame including them"""
+        if not self.accepts(rows):
+            raise ValueError("Appended rows must have the store's columns and dtypes")
+        size = self._size + len(rows)
+        if size > len(self._arrays[0]):
+            capacity = max(size, 2 * len(self._arrays[0]), 1024)
+            grown = []
+            for array in self._arrays:
+                new = np.empty(capacity, dtype=array.dtype)
+                new[:self._size] = array[:self._size]
+                grown.append(new)
+            self._arrays = grown
+        for col, array in zip(self.columns, self._arrays):
+            array[self._size:size] = rows[col].to_numpy()
+        self._size = size
+        self.frame = self._view()
+        return self.frame
+
+# =============================================================================
+# PARALLEL TRAINING ORCHESTRATOR
+# =============================================================================
+
+@dataclass(frozen=True)
+class SharedArrayRef:
+    """Picklable handle to an array placed in shared memory"""
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+def share_array(array: np.ndarray) -> Tuple[shared_memory.SharedMemory, SharedArrayRef]:
+    """Copy an array into a new shared memory block (caller closes and unlinks it)"""
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=shm.buf)[...] = array
+    return shm, SharedArrayRef(shm.name, array.shape, array.dtype.str)
+
+def _fit_shared(estimator, X_ref: SharedArrayRef, y_ref: Optional[SharedArrayRef] = None):
+    """Process-pool task: fit an estimator on matrices attached from shared memory"""
+    handles = [shared_memory.SharedMemory(name=ref.name) for ref in (X_ref, y_ref) if ref is not None]
+    try:
+        arrays = [np.ndarray(ref.shape, np.dtype(ref.dtype), buffer=shm.buf)
+                  for ref, shm in zip([r for r in (X_ref, y_ref) if r is not None], handles)]
+        estimator.fit(*arrays)
+        del arrays
+        return estimator
+    finally:
+        for shm in handles:
+            shm.close()
+
+
+class TrainingOrchestrator:
+    """
+    Trains the independent models of a PlantModelBundle concurrently. Each
+    model fit runs in its own worker process, and the tree ensembles that
+    support it also use several cores inside the fit. Training matrices are
+    placed in shared memory once: the three quality forests, for example,
+    attach to the same X_train instead of each receiving a pickled copy.
+    """
+    
+    def __init__(self, max_workers: Optional[int] = None, n_cores: Optional[int] = None):
+        self.logger = logging.getLogger(__name__)
+        self.max_workers = max_workers
+        self.n_cores = n_cores or os.cpu_count() or 1
+    
+    def train(self, models: 'PlantModelBundle', logistics_df: pd.DataFrame,
+              quality_df: pd.DataFrame, sensor_data: pd.DataFrame) -> Dict:
+        """Fit every model of the bundle in parallel and return the usual training reports"""
+        
+        # Feature matrices are cheap next to the fits; build them here
+        demand_set = models.logistics_optimizer.build_demand_training_set(logistics_df)
+        quality_set = models.quality_controller.build_quality_training_set(quality_df)
+        anomaly_set = models.anomaly_detector.build_anomaly_training_set(sensor_data)
+        
+        tasks = {'demand': (models.logistics_optimizer.make_demand_model(),
+                            demand_set['X_train'], demand_set['y_train'])}
+        for key, model in models.quality_controller.make_quality_models().items():
+            tasks[f'quality:{key}'] = (model, quality_set['X_train'],
+                                       models.quality_controller.training_targets(key, quality_set))
+        tasks['anomaly'] = (models.anomaly_detector.make_isolation_forest(), anomaly_set['X_train'], None)
+        
+        # Split the cores between concurrently running fits
+        workers = min(self.max_workers or len(tasks), len(tasks))
+        for estimator, _, _ in tasks.values():
+            if hasattr(estimator, 'n_jobs'):
+                estimator.set_params(n_jobs=max(1, self.n_cores // workers))
+        
+        blocks = []
+        refs = {}
+        
+        def ref(array):
+            if array is None:
+                return None
+            if id(array) not in refs:
+                shm, refs[id(array)] = share_array(array)
+                blocks.append(shm)
+            return refs[id(array)]
+        
+        try:
+            # Spawned workers avoid forking a parent that already runs thread pools
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = {key: pool.submit(_fit_shared, estimator, ref(X), ref(y))
+                           for key, (estimator, X, y) in tasks.items()}
+                fitted = {key: future.result() for key, future in futures.items()}
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+        
+        quality_models = {key.split(':', 1)[1]: model for key, model in fitted.items()
+                          if key.startswith('quality:')}
+        return {
+            'logistics_performance': models.logistics_optimizer.finish_demand_training(
+                fitted['demand'], demand_set),
+            'quality_performance': models.quality_controller.finish_quality_training(
+                quality_models, quality_set),
+            'anomaly_performance': models.anomaly_detector.finish_anomaly_training(
+                fitted['anomaly'], anomaly_set)
+        }
+
+# =============================================================================
+# HYPERPARAMETER SEARCH
+# =============================================================================
+
+class TimeSeriesFolds:
+    """
+    Expanding-window cross-validation folds over a time-ordered training set.
+    Fold k trains on rows [0, b_k) and validates on [b_k, b_k+1), so no fold
+    ever sees the future. The matrices are dumped once to a memory-mapped
+    file; every candidate and worker process slices the same pages instead
+    of receiving its own copy.
+    """
+    
+    def __init__(self, X: np.ndarray, y: np.ndarray, n_splits: int = 4,
+                 cache_dir: Optional[str] = None):
+        if len(X) < 2 * (n_splits + 1):
+            raise ValueError(f"Need at least {2 * (n_splits + 1)} rows for {n_splits} folds, got {len(X)}")
+        
+        self._owns_dir = cache_dir is None
+        self.cache_dir = cache_dir or tempfile.mkdtemp(prefix='cementmind_cv_')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        
+        import joblib
+        
+        x_path = os.path.join(self.cache_dir, 'X.joblib')
+        y_path = os.path.join(self.cache_dir, 'y.joblib')
+        joblib.dump(np.ascontiguousarray(X), x_path)
+        joblib.dump(np.ascontiguousarray(y), y_path)
+        self.X = joblib.load(x_path, mmap_mode='r')
+        self.y = joblib.load(y_path, mmap_mode='r')
+        
+        # Fold boundaries, computed once: equal validation blocks after a first training block
+        bounds = np.linspace(0, len(X), n_splits + 2).astype(int)
+        self.splits = [(int(bounds[k]), int(bounds[k + 1])) for k in range(1, n_splits + 1)]
+    
+    def __len__(self) -> int:
+        return len(self.splits)
+    
+    def close(self):
+        """Drop the memory maps and delete the cache files"""
+        self.X = self.y = None
+        if self._owns_dir:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+def predict_latency_ms(predict, row: np.ndarray, repeats: int = 25) -> float:
+    """Median wall time of predict(row) in milliseconds"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(row)
+        timings.append(time.perf_counter() - start)
+    return 1000 * float(np.median(timings))
+
+
+def _score_candidate_fold(estimator, X: np.ndarray, y: np.ndarray, train_stop: int,
+                          test_stop: int, latency_repeats: int) -> Dict:
+    """Search task: fit one candidate on one fold, return validation MSE and single-row latency"""
+    from sklearn.metrics import mean_squared_error
+    
+    start = time.perf_counter()
+    estimator.fit(X[:train_stop], y[:train_stop])
+    fit_seconds = time.perf_counter() - start
+    
+    X_val = np.asarray(X[train_stop:test_stop])
+    mse = mean_squared_error(y[train_stop:test_stop], estimator.predict(X_val))
+    
+    # Serving scores one process state at a time
+    latency_ms = predict_latency_ms(estimator.predict, X_val[:1], latency_repeats)
+    
+    return {'mse': mse, 'fit_seconds': fit_seconds, 'latency_ms': latency_ms}
+
+
+class HyperparameterSearch:
+    """
+    Grid search over time-ordered folds with early stopping. All surviving
+    candidates are evaluated on a fold in parallel; after each fold the
+    slower-than-budget candidates are dropped and only the best keep_fraction
+    of the rest move on to the next (larger) fold. A round is not started
+    if the previous one suggests it would overrun the wall-clock budget; the
+    first fold is always evaluated so that every search returns a result.
+    """
+    
+    def __init__(self, estimator, param_grid: Dict[str, List],
+                 time_budget_s: Optional[float] = None,
+                 latency_budget_ms: Optional[float] = None,
+                 max_workers: Optional[int] = None,
+                 keep_fraction: float = 0.5,
+                 latency_repeats: int = 25):
+        self.logger = logging.getLogger(__name__)
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.time_budget_s = time_budget_s
+        self.latency_budget_ms = latency_budget_ms
+        self.max_workers = max_workers or -1
+        self.keep_fraction = keep_fraction
+        self.latency_repeats = latency_repeats
+    
+    def _candidate(self, params: Dict):
+        from sklearn.base import clone
+        
+        estimator = clone(self.estimator).set_params(**params)
+        # Parallelism comes from running candidates side by side
+        if 'n_jobs' in estimator.get_params():
+            estimator.set_params(n_jobs=1)
+        return estimator
+    
+    def run(self, folds: TimeSeriesFolds) -> Dict:
+        """Search the grid on the given folds and return the best candidate that meets the budgets"""
+        import joblib
+        from sklearn.model_selection import ParameterGrid
+        
+        candidates = list(ParameterGrid(self.param_grid))
+        scores = {i: [] for i in range(len(candidates))}
+        latency = {}
+        alive = list(range(len(candidates)))
+        stopped = None
+        
+        start = time.perf_counter()
+        last_round = 0.0
+        with joblib.Parallel(n_jobs=self.max_workers) as parallel:
+            for k, (train_stop, test_stop) in enumerate(folds.splits):
+                elapsed = time.perf_counter() - start
+                if k > 0 and self.time_budget_s is not None and elapsed + last_round > self.time_budget_s:
+                    stopped = 'time_budget'
+                    break
+                
+                round_start = time.perf_counter()
+                results = parallel(
+                    joblib.delayed(_score_candidate_fold)(
+                        self._candidate(candidates[i]), folds.X, folds.y,
+                        train_stop, test_stop, self.latency_repeats
+                    )
+                    for i in alive
+                )
+                last_round = time.perf_counter() - round_start
+                
+                for i, result in zip(alive, results):
+                    scores[i].append(result['mse'])
+                    latency[i] = max(latency.get(i, 0.0), result['latency_ms'])
+                
+                # Candidates that miss the inference budget are out regardless of accuracy
+                if self.latency_budget_ms is not None:
+                    alive = [i for i in alive if latency[i] <= self.latency_budget_ms]
+                
+                # Early stopping: only the better part of the field sees the next fold
+                if k < len(folds) - 1 and len(alive) > 1:
+                    alive.sort(key=lambda i: np.mean(scores[i]))
+                    alive = alive[:max(1, int(np.ceil(len(alive) * self.keep_fraction)))]
+        
+        if not alive:
+            raise ValueError(f"No candidate meets the {self.latency_budget_ms} ms latency budget")
+        
+        best = min(alive, key=lambda i: np.mean(scores[i]))
+        leaderboard = sorted(
+            ({'params': candidates[i], 'mse': float(np.mean(scores[i])),
+              'folds': len(scores[i]), 'latency_ms': latency[i]}
+             for i in latency),
+            key=lambda entry: (-entry['folds'], entry['mse'])
+        )
         
-        for sensor_info in affected_sensors:
-            sensor = sensor_info['sensor']
-            deviation = sensor_info['deviation_percent']
-            
-            if sensor == 'kiln_temperature':
-                if deviation > 15:
-                    causes.append("Kiln burner malfunction or fuel supply issue")
-                    actions.append("Check burner operation and fuel quality")
-                else:
-                    causes.append("Normal temperature variation")
-                    actions.append("Monitor temperature trend")
-            
-            elif sensor == 'system_pressure':
-                if deviation > 20:
-                    causes.append("Blockage in system or fan malfunction")
-                    actions.append("Inspect system for blockages, check fan operation")
-                else:
-                    causes.append("Minor pressure fluctuation")
-                    actions.append("Continue monitoring")
-            
-            elif sensor == 'material_flow_rate':
-                if deviation > 25:
-                    causes.append("Feeder malfunction or material blockage")
-                    actions.append("Inspect material feeders and conveyor systems")
-                else:
-                    causes.append("Normal flow variation")
-                    actions.append("Monitor flow stability")
-            
-            elif 'vibration' in sensor:
-                if deviation > 30:
-                    causes.append("Equipment bearing wear or misalignment")
-                    actions.append("Schedule immediate maintenance inspection")
-                else:
-                    causes.append("Minor vibration increase")
-                    actions.append("Monitor vibration trend")
+        self.logger.info(f"Search picked {candidates[best]} - MSE: {np.mean(scores[best]):.2f}, "
+                         f"latency: {latency[best]:.2f} ms")
         
         return {
-            'potential_causes': causes,
-            'recommended_actions': actions
+            'best_params': candidates[best],
+            'best_mse': float(np.mean(scores[best])),
+            'latency_ms': latency[best],
+            'folds_completed': len(scores[best]),
+            'candidates': len(candidates),
+            'stopped': stopped,
+            'elapsed_seconds': time.perf_counter() - start,
+            'leaderboard': leaderboard
         }
-    
-    def _classify_severity(self, confidence_scores: List[float], 
-                          predictions: List[bool]) -> Dict:
-        """Classify overall severity of detected anomalies"""
-        
-        if not any(predictions):
-            return {'level': 'normal', 'count': 0}
-        
-        anomaly_scores = [score for score, pred in zip(confidence_scores, predictions) if pred]
-        max_score = max(anomaly_scores)
-        avg_score = np.mean(anomaly_scores)
-        
-        if max_score > 2.5 or avg_score > 1.5:
-            return {'level': 'critical', 'count': len(anomaly_scores), 'max_confidence': max_score}
-        elif max_score > 1.5 or avg_score > 1.0:
-            return {'level': 'high', 'count': len(anomaly_scores), 'max_confidence': max_score}
-        elif max_score > 0.8 or avg_score > 0.6:
-            return {'level': 'medium', 'count': len(anomaly_scores), 'max_confidence': max_score}
-        else:
-            return {'level': 'low', 'count': len(anomaly_scores), 'max_confidence': max_score}
 
 # =============================================================================
 # INTEGRATED AI SYSTEM ORCHESTRATOR
@@ -1155,16 +3574,62 @@ class CementMindAI:
     cement plant automation and optimization.
     """
     
+    # Maximum distance between a quality sample and the process state it joins to
+    live_join_tolerance = '1h'
+    
+    # Threads per published model for predict (training uses all cores)
+    serving_n_jobs = 1
+    
+    # Update anomaly normal ranges from ingested readings, in batches of at
+    # least this many rows; updated ranges are published once some bound has
+    # moved by more than this many normal-range stds
+    track_normal_ranges = True
+    normal_range_batch_rows = 72
+    normal_range_publish_shift = 0.1
+    
+    # Steady-state gate: a reading within this many normal-range stds of the last
+    # fully analyzed one (on every sensor) reuses that analysis, for at most this long
+    steady_state_deadband = 0.25
+    max_reuse_interval = pd.Timedelta('15min')
+    
+    # Bucket sizes of the materialized rollups (coarsest first)
+    rollup_resolutions = ('1D', '1h', '15min', '1min')
+    rollup_categorical = {'sensor': (), 'quality': ('quality_grade',)}
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.data_simulator = PlantDataSimulator()
-        self.logistics_optimizer = LogisticsOptimizer()
-        self.quality_controller = CementQualityController()
-        self.anomaly_detector = AnomalyDetectionSystem()
-        
-        self.sensor_data = None
-        self.material_data = None
-        self.quality_data = None
+        self.feature_store = FeatureStore()
+        
+        # Published snapshots. Readers take a reference without locking;
+        # writers build a new snapshot and swap the reference atomically.
+        self._write_lock = threading.Lock()
+        self._data = PlantDataSnapshot()
+        self._models = PlantModelBundle(LogisticsOptimizer(), CementQualityController(),
+                                        AnomalyDetectionSystem())
+        # Online normal-range updates: sensor rows folded in so far, and a
+        # private working copy of the detector of the bundle it derives from
+        self._range_lock = threading.Lock()
+        self._ranges_through = 0
+        self._range_models: Optional[PlantModelBundle] = None
+        self._range_detector: Optional[AnomalyDetectionSystem] = None
+        
+        # Anomaly samples merged into incidents across real-time calls
+        self.incident_tracker = IncidentTracker(AnomalyDetectionSystem.incident_gap)
+        
+        # Last fully analyzed state for the steady-state gate
+        self._last_analysis = None
+        self.analysis_stats = {'full': 0, 'reused': 0}
+        
+        # Tuned hyperparameters applied to every retrained bundle
+        self.hyperparameters: Dict = {}
+        # Train one multi-output quality forest instead of one per target
+        self.quality_multi_output = False
+        
+        # Materialized aggregates per frame ('sensor', 'quality') and resolution
+        self.rollups: Dict[str, Dict[str, TimeBucketRollup]] = {}
+        # Append-only stores behind the published sensor/material/quality frames
+        self._frame_stores: Dict[str, AppendOnlyFrame] = {}
         
         self.system_status = {
             'initialized': False,
@@ -1173,7 +3638,278 @@ class CementMindAI:
             'real_time_ready': False
         }
     
-    def initialize_system(self, generate_data: bool = True):
+    def snapshot(self) -> PlantDataSnapshot:
+        """Current plant data snapshot (safe to use for the rest of a request)"""
+        return self._data
+    
+    def models_snapshot(self) -> PlantModelBundle:
+        """Current model bundle (safe to use for the rest of a request)"""
+        return self._models
+    
+    # Read-only views of the current snapshots, for existing callers
+    sensor_data = property(lambda self: self._data.sensor_data)
+    material_data = property(lambda self: self._data.material_data)
+    quality_data = property(lambda self: self._data.quality_data)
+    quality_joiner = property(lambda self: self._data.quality_joiner)
+    logistics_optimizer = property(lambda self: self._models.logistics_optimizer)
+    quality_controller = property(lambda self: self._models.quality_controller)
+    anomaly_detector = property(lambda self: self._models.anomaly_detector)
+    
+    def _publish_models(self, models: PlantModelBundle) -> PlantModelBundle:
+        """Atomically publish a trained bundle as the next model version"""
+        self._set_serving_n_jobs(models)
+        with self._write_lock:
+            models = replace(models, version=self._models.version + 1)
+            self._models = models
+        return models
+    
+    @classmethod
+    def _set_serving_n_jobs(cls, models: PlantModelBundle):
+        """
+        Set n_jobs of every fitted estimator in a not yet published bundle to
+        serving_n_jobs; training parallelism would otherwise start a thread
+        pool per core on every single-row predict
+        """
+        for component in (models.logistics_optimizer, models.quality_controller,
+                          models.anomaly_detector, models.energy_optimizer):
+            for value in vars(component).values() if component is not None else ():
+                for estimator in (value.values() if isinstance(value, dict) else (value,)):
+                    if hasattr(estimator, 'get_params') and 'n_jobs' in estimator.get_params(deep=False):
+                        estimator.set_params(n_jobs=cls.serving_n_jobs)
+    
+    def _new_model_bundle(self) -> PlantModelBundle:
+        """Untrained components configured with the tuned hyperparameters"""
+        models = PlantModelBundle(LogisticsOptimizer(),
+                                  CementQualityController(multi_output=self.quality_multi_output),
+                                  AnomalyDetectionSystem(), EnergyOptimizer())
+        models.logistics_optimizer.demand_params.update(self.hyperparameters.get('demand', {}))
+        quality = self.hyperparameters.get('quality', {})
+        for key, params in quality.items():
+            models.quality_controller.quality_params[key].update(params)
+        if quality and self.quality_multi_output and CementQualityController.joint_model_key not in quality:
+            self.logger.warning("Quality hyperparameters were tuned per target; the joint forest "
+                                "keeps its defaults until tune_hyperparameters() runs in multi-output mode")
+        return models
+    
+    def _simulated_quality_features(self, seed: int, n_samples: int = 1500) -> np.ndarray:
+        """Unscaled quality features of freshly simulated process states, for distillation"""
+        simulator = PlantDataSimulator(random_seed=1000 + seed)
+        controller = CementQualityController()
+        quality_df = controller.prepare_quality_features(
+            simulator.generate_sensor_data(n_samples=n_samples),
+            simulator.generate_raw_material_data(n_samples=n_samples // 2),
+            simulator.generate_cement_quality_data(n_samples=n_samples // 3)
+        )
+        return controller.quality_matrix(quality_df)[0]
+    
+    def _build_joiner(self, sensor_data: pd.DataFrame, material_data: pd.DataFrame,
+                      quality_data: Optional[pd.DataFrame]) -> IncrementalAsOfJoiner:
+        """Streaming join state for real-time quality features"""
+        joiner = IncrementalAsOfJoiner.from_frames(
+            sensor_data, material_data, tolerance=self.live_join_tolerance
+        )
+        if quality_data is not None:
+            joiner.join_quality_samples(quality_data.tail(joiner.history_size))
+        return joiner
+    
+    def _build_rollups(self, name: str, frame: pd.DataFrame) -> Dict[str, TimeBucketRollup]:
+        """Report rollups of one frame's history, one per resolution"""
+        columns = list(frame.select_dtypes(include=['number', 'bool']).columns)
+        rollups = {}
+        for resolution in self.rollup_resolutions:
+            rollups[resolution] = TimeBucketRollup(resolution, columns, self.rollup_categorical[name])
+            rollups[resolution].update(frame)
+        return rollups
+    
+    def load_data(self, sensor_data: pd.DataFrame, material_data: pd.DataFrame,
+                  quality_data: Optional[pd.DataFrame] = None) -> int:
+        """Replace plant history and publish it as a new snapshot version"""
+        joiner = self._build_joiner(sensor_data, material_data, quality_data)
+        rollups = {name: self._build_rollups(name, frame)
+                   for name, frame in (('sensor', sensor_data), ('quality', quality_data)) if frame is not None}
+        with self._write_lock:
+            self.rollups = rollups
+            self._ranges_through = len(sensor_data)
+            version = self._data.version + 1
+            for frame in (sensor_data, material_data, quality_data):
+                if frame is not None:
+                    FeatureStore.publish_frame(frame, version)
+            self._data = PlantDataSnapshot(version, sensor_data, material_data, quality_data, joiner)
+        return version
+    
+    def ingest(self, sensor_rows: Optional[pd.DataFrame] = None,
+               material_rows: Optional[pd.DataFrame] = None,
+               quality_rows: Optional[pd.DataFrame] = None) -> int:
+        """
+        Append new readings copy-on-write: new frames and a copied joiner are
+        built from the current snapshot and published as the next version.
+        Concurrent readers keep using the snapshot they already hold. Frames
+        grow in AppendOnlyFrame stores, so a tick costs O(new rows), not a
+        concat of the full history. Rollups are updated in place (see
+        PlantDataSnapshot); dashboard_inputs reads them consistently.
+        """
+        with self._write_lock:
+            current = self._data
+            version = current.version + 1
+            
+            def append(name, frame, rows):
+                if rows is None or len(rows) == 0:
+                    return frame
+                store = self._frame_stores.get(name)
+                if store is None or store.frame is not frame:
+                    # First append since load_data (or after a fallback): start a store
+                    base = rows.iloc[:0] if frame is None else frame
+                    store = AppendOnlyFrame(base) if AppendOnlyFrame.supports(base) else None
+                if store is not None and store.accepts(rows):
+                    self._frame_stores[name] = store
+                    merged = store.append(rows)
+                else:
+                    self._frame_stores.pop(name, None)
+                    merged = rows.copy() if frame is None else pd.concat([frame, rows], ignore_index=True)
+                FeatureStore.publish_frame(merged, version)
+                return merged
+            
+            joiner = current.quality_joiner.copy() if current.quality_joiner is not None else None
+            if joiner is not None:
+                if sensor_rows is not None and len(sensor_rows):
+                    joiner.add_sensor_frame(sensor_rows)
+                if material_rows is not None and len(material_rows):
+                    joiner.add_material_frame(material_rows)
+                if quality_rows is not None and len(quality_rows):
+                    joiner.join_quality_samples(quality_rows)
+            
+            for name, rows in (('sensor', sensor_rows), ('quality', quality_rows)):
+                if rows is None or len(rows) == 0:
+                    continue
+                if name not in self.rollups:
+                    self.rollups[name] = self._build_rollups(name, rows)
+                    continue
+                for rollup in self.rollups[name].values():
+                    rollup.update(rows)
+            
+            self._data = PlantDataSnapshot(
+                version,
+                append('sensor', current.sensor_data, sensor_rows),
+                append('material', current.material_data, material_rows),
+                append('quality', current.quality_data, quality_rows),
+                joiner
+            )
+        
+        if self.track_normal_ranges and sensor_rows is not None and len(sensor_rows):
+            self._track_normal_ranges()
+        return version
+    
+    def _track_normal_ranges(self):
+        """
+        Fold ingested sensor readings, once at least normal_range_batch_rows
+        are pending, into the online normal ranges of a private working copy
+        of the published detector. The published detector is never mutated:
+        when the bounds have moved past normal_range_publish_shift, a copy is
+        published in a new bundle (ranges_version + 1), unless a retrain
+        published other models meanwhile.
+        """
+        with self._range_lock:
+            models = self.models_snapshot()
+            detector = models.anomaly_detector
+            if not detector.is_trained or detector.range_tracker is None:
+                return
+            if self._range_models is not models:
+                self._range_models, self._range_detector = models, detector.range_tracking_copy()
+            
+            sensor_data = self.snapshot().sensor_data
+            start, end = self._ranges_through, len(sensor_data)
+            if end - start < self.normal_range_batch_rows:
+                return
+            self._ranges_through = end
+            
+            # Window context from the rows before the batch
+            first = max(0, start - detector.feature_pipeline.lookback)
+            features = detector.feature_pipeline.transform(sensor_data.iloc[first:end].reset_index(drop=True))
+            working = self._range_detector
+            result = working.update_normal_ranges(features[start - first:])
+            
+            if self._ranges_moved(detector.normal_ranges, working.normal_ranges):
+                with self._write_lock:
+                    if self._models is models:
+                        self._models = replace(models, anomaly_detector=working.range_tracking_copy(),
+                                               ranges_version=models.ranges_version + 1)
+                        self._range_models = self._models
+        if result['drift']['drifted']:
+            self.logger.warning(f"Normal-range drift in: {', '.join(result['drift']['drifted_features'])}")
+    
+    def _ranges_moved(self, published: Dict[str, Dict], current: Dict[str, Dict]) -> bool:
+        """Whether any bound moved by more than normal_range_publish_shift published stds"""
+        for col, ranges in current.items():
+            old = published.get(col)
+            if old is None:
+                return True
+            scale = old['std'] if np.isfinite(old['std']) and old['std'] > 0 else 1.0
+            shift = max(abs(ranges['lower_bound'] - old['lower_bound']),
+                        abs(ranges['upper_bound'] - old['upper_bound'])) / scale
+            if not shift <= self.normal_range_publish_shift:
+                return True
+        return False
+    
+    def tune_hyperparameters(self, time_budget_s: float = 300.0,
+                             latency_budget_ms: Optional[float] = None,
+                             n_splits: int = 4, max_workers: Optional[int] = None) -> Dict:
+        """
+        Search the demand and quality model grids on time-ordered folds of the
+        current data snapshot. The wall-clock budget is shared by all searches;
+        the latency budget applies to single-row prediction. Quality forests are
+        tuned per target, or as the one joint forest when quality_multi_output
+        is set. Winning settings are used from the next retrain_models() on.
+        """
+        
+        data = self.snapshot()
+        if data.sensor_data is None:
+            raise ValueError("Data must be loaded before tuning")
+        
+        logistics = LogisticsOptimizer()
+        quality = CementQualityController(multi_output=self.quality_multi_output)
+        X_demand, y_demand = logistics.demand_matrix(logistics.prepare_logistics_features(
+            data.sensor_data, data.material_data, self.feature_store
+        ))
+        X_quality, Y_quality = quality.quality_matrix(quality.prepare_quality_features(
+            data.sensor_data, data.material_data, data.quality_data, self.feature_store
+        ))
+        
+        searches = [('demand', None, logistics.make_demand_model(), logistics.demand_search_space,
+                     X_demand, y_demand)]
+        quality_models = quality.make_quality_models()
+        if quality.multi_output:
+            searches.append(('quality', quality.joint_model_key, quality_models[quality.joint_model_key],
+                             quality.quality_search_space, X_quality, Y_quality))
+        else:
+            for k, target in enumerate(quality.target_columns):
+                searches.append(('quality', target, quality_models[target],
+                                 quality.quality_search_space, X_quality, Y_quality[:, k]))
+        
+        deadline = time.perf_counter() + time_budget_s
+        hyperparameters = {'demand': {}, 'quality': {}}
+        reports = {'demand': None, 'quality': {}}
+        for n, (model, target, estimator, grid, X, y) in enumerate(searches):
+            # Split what is left of the budget evenly over the remaining searches
+            budget = max(0.0, deadline - time.perf_counter()) / (len(searches) - n)
+            search = HyperparameterSearch(estimator, grid, time_budget_s=budget,
+                                          latency_budget_ms=latency_budget_ms,
+                                          max_workers=max_workers)
+            with TimeSeriesFolds(X, y, n_splits=n_splits) as folds:
+                report = search.run(folds)
+            
+            if target is None:
+                hyperparameters[model] = report['best_params']
+                reports[model] = report
+            else:
+                hyperparameters[model][target] = report['best_params']
+                reports[model][target] = report
+        
+        self.hyperparameters = hyperparameters
+        self.logger.info("✓ Hyperparameters tuned")
+        
+        return {'hyperparameters': hyperparameters, 'searches': reports}
+    
+    def initialize_system(self, generate_data: bool = True, parallel_training: bool = False):
         """Initialize the complete AI system with data generation and model training"""
         
         self.logger.info("Initializing CementMind AI System...")
@@ -1182,84 +3918,182 @@ class CementMindAI:
             self.logger.info("Generating comprehensive plant data...")
             
             # Generate synthetic plant data
-            self.sensor_data = self.data_simulator.generate_sensor_data(n_samples=15000)
-            self.material_data = self.data_simulator.generate_raw_material_data(n_samples=7500)
-            self.quality_data = self.data_simulator.generate_cement_quality_data(n_samples=4500)
+            self.load_data(
+                self.data_simulator.generate_sensor_data(n_samples=15000),
+                self.data_simulator.generate_raw_material_data(n_samples=7500),
+                self.data_simulator.generate_cement_quality_data(n_samples=4500)
+            )
             
             self.system_status['data_generated'] = True
             self.logger.info("✓ Plant data generation completed")
         
+        results = self.retrain_models(parallel=parallel_training)
+        
+        self.system_status['models_trained'] = True
+        self.system_status['real_time_ready'] = True
+        
+        self.logger.info("🎉 CementMind AI System fully initialized and ready!")
+        
+        return dict(results, system_status=self.system_status)
+    
+    def retrain_models(self, parallel: bool = False, max_workers: Optional[int] = None,
+                       distill: bool = False, distill_tolerance: float = 0.05) -> Dict:
+        """
+        Train a fresh model bundle on the current data snapshot and publish it.
+        Requests in flight keep scoring with the bundle they started with.
+        With parallel=True the independent fits run concurrently in a process pool;
+        with distill=True a compact quality surrogate is trained before publishing.
+        """
+        
         # Train all AI models
         self.logger.info("Training AI models...")
+        data = self.snapshot()
+        models = self._new_model_bundle()
         
         try:
-            # Train logistics optimization models
-            logistics_df = self.logistics_optimizer.prepare_logistics_features(
-                self.sensor_data, self.material_data
+            logistics_df = models.logistics_optimizer.prepare_logistics_features(
+                data.sensor_data, data.material_data, self.feature_store
             )
-            logistics_results = self.logistics_optimizer.train_demand_predictor(logistics_df)
-            self.logger.info("✓ Logistics optimization models trained")
-            
-            # Train quality control models
-            quality_df = self.quality_controller.prepare_quality_features(
-                self.sensor_data, self.material_data, self.quality_data
+            quality_df = models.quality_controller.prepare_quality_features(
+                data.sensor_data, data.material_data, data.quality_data, self.feature_store
             )
-            quality_results = self.quality_controller.train_quality_models(quality_df)
-            self.logger.info("✓ Quality control models trained")
             
-            # Train anomaly detection models
-            anomaly_results = self.anomaly_detector.train_anomaly_detectors(self.sensor_data)
-            self.logger.info("✓ Anomaly detection models trained")
-            
-            self.system_status['models_trained'] = True
-            self.system_status['real_time_ready'] = True
+            if parallel:
+                reports = TrainingOrchestrator(max_workers).train(
+                    models, logistics_df, quality_df, data.sensor_data
+                )
+                logistics_results = reports['logistics_performance']
+                quality_results = reports['quality_performance']
+                anomaly_results = reports['anomaly_performance']
+                self.logger.info("✓ All models trained in parallel")
+            else:
+                # Train logistics optimization models
+                logistics_results = models.logistics_optimizer.train_demand_predictor(logistics_df)
+                self.logger.info("✓ Logistics optimization models trained")
+                
+                # Train quality control models
+                quality_results = models.quality_controller.train_quality_models(quality_df)
+                self.logger.info("✓ Quality control models trained")
+                
+                # Train anomaly detection models
+                anomaly_results = models.anomaly_detector.train_anomaly_detectors(data.sensor_data)
+                self.logger.info("✓ Anomaly detection models trained")
             
-            self.logger.info("🎉 CementMind AI System fully initialized and ready!")
+            # Energy model (small, trained in-process either way)
+            energy_results = models.energy_optimizer.train_energy_model(data.sensor_data)
+            self.logger.info("✓ Energy model trained")
             
-            return {
-                'logistics_performance': logistics_results,
-                'quality_performance': quality_results,
-                'anomaly_performance': anomaly_results,
-                'system_status': self.system_status
-            }
+            distillation_results = None
+            if distill:
+                distillation_results = models.quality_controller.distill_surrogate(
+                    quality_df, self._simulated_quality_features(data.version),
+                    tolerance=distill_tolerance
+                )
+                self.logger.info("✓ Quality surrogate distilled")
             
         except Exception as e:
             self.logger.error(f"Error during model training: {str(e)}")
             raise
+        
+        models = self._publish_models(models)
+        
+        return {
+            'logistics_performance': logistics_results,
+            'quality_performance': quality_results,
+            'anomaly_performance': anomaly_results,
+            'energy_performance': energy_results,
+            'distillation': distillation_results,
+            'model_version': models.version,
+            'data_version': data.version
+        }
+    
+    def _steady_state_key(self, models: PlantModelBundle, current_sensor: pd.DataFrame,
+                          material_row: pd.DataFrame) -> Dict:
+        """What the steady-state gate compares between ticks"""
+        detector = models.anomaly_detector
+        sensors = [col for col in ANOMALY_SENSOR_COLUMNS if col in current_sensor and col in detector.normal_ranges]
+        return {
+            'model_version': models.version,
+            'timestamp': current_sensor['timestamp'].iloc[0],
+            'material_timestamp': material_row['timestamp'].iloc[0],
+            'sensors': sensors,
+            'values': current_sensor[sensors].to_numpy(dtype=np.float64)[0],
+            'bounds': np.array([[detector.normal_ranges[col]['lower_bound'],
+                                 detector.normal_ranges[col]['upper_bound']] for col in sensors],
+                               dtype=np.float64).reshape(len(sensors), 2),
+            'deadband': self.steady_state_deadband * np.array(
+                [detector.normal_ranges[col]['std'] for col in sensors], dtype=np.float64
+            )
+        }
+    
+    def _is_steady(self, key: Dict) -> bool:
+        """True when nothing has moved since the last full analysis"""
+        last = self._last_analysis
+        if last is None:
+            return False
+        previous = last['key']
+        return (previous['model_version'] == key['model_version'] and
+                previous['material_timestamp'] == key['material_timestamp'] and
+                previous['sensors'] == key['sensors'] and
+                pd.Timedelta(0) <= key['timestamp'] - previous['timestamp'] < self.max_reuse_interval and
+                bool(np.all(np.abs(key['values'] - previous['values']) <= key['deadband'])) and
+                bool(np.all(np.abs(key['bounds'] - previous['bounds']) <= key['deadband'][:, None])))
     
-    def run_real_time_analysis(self, current_timestamp: Optional[str] = None) -> Dict:
-        """Run comprehensive real-time analysis and generate recommendations"""
+    def run_real_time_analysis(self, current_timestamp: Optional[str] = None, force: bool = False) -> Dict:
+        """
+        Run comprehensive real-time analysis and generate recommendations.
+        In steady state (every sensor and its normal-range bounds within the
+        deadband of the last full analysis, same material reading and models, and not older than
+        max_reuse_interval) the last result is returned with 'reused': True.
+        """
         
         if not self.system_status['real_time_ready']:
             raise ValueError("System must be initialized before real-time analysis")
         
+        # Pin one data and one model version for the whole request
+        data = self.snapshot()
+        models = self.models_snapshot()
+        
         # Simulate current plant state (in production, this would be real sensor data)
-        current_sensor = self.sensor_data.iloc[-1:].copy()
-        current_material = self.material_data.iloc[-1:].copy()
+        current_sensor = data.sensor_data.iloc[-1:].copy()
+        current_material = data.material_data.iloc[-1:].copy()
         
         if current_timestamp:
             current_sensor['timestamp'] = pd.to_datetime(current_timestamp)
             current_material['timestamp'] = pd.to_datetime(current_timestamp)
         
+        # Cheap pre-stage: skip the full analysis while the plant is steady. The
+        # material reading is keyed as stored, not with current_timestamp.
+        steady_key = self._steady_state_key(models, current_sensor, data.material_data.iloc[-1:])
+        if not force and self._is_steady(steady_key):
+            self.analysis_stats['reused'] += 1
+            cached = self._last_analysis['results']
+            return dict(cached, timestamp=steady_key['timestamp'], data_version=data.version,
+                        reused=True, analyzed_at=cached['timestamp'])
+        
         results = {
             'timestamp': current_sensor['timestamp'].iloc[0],
             'system_status': 'operational',
             'alerts': [],
             'recommendations': {},
-            'performance_metrics': {}
+            'performance_metrics': {},
+            'data_version': data.version,
+            'model_version': models.version,
+            'reused': False
         }
         
         try:
             # 1. Anomaly Detection
             self.logger.info("Running anomaly detection...")
-            anomaly_results = self.anomaly_detector.detect_anomalies(current_sensor)
+            anomaly_results = models.anomaly_detector.detect_anomalies(current_sensor)
             
             if anomaly_results['anomalies_detected'] > 0:
+                # One entry per incident instead of one per anomalous sample
                 results['alerts'].append({
                     'type': 'anomaly',
                     'severity': anomaly_results['severity_levels']['level'],
                     'count': anomaly_results['anomalies_detected'],
-                    'details': anomaly_results['anomaly_details']
+                    'incidents': self.incident_tracker.record(anomaly_results['anomaly_details'])
                 })
                 
                 if anomaly_results['severity_levels']['level'] in ['critical', 'high']:
@@ -1270,38 +4104,67 @@ class CementMindAI:
             
             # Prepare current state for quality prediction
             combined_state = pd.concat([current_sensor, current_material], axis=1).iloc[0]
-            quality_df = self.quality_controller.prepare_quality_features(
-                current_sensor, current_material, 
-                pd.DataFrame([{'timestamp': combined_state['timestamp']}])  # Dummy quality data
+            probe = pd.DataFrame([{'timestamp': results['timestamp']}])  # Probe, not a lab sample
+            quality_df = models.quality_controller.prepare_live_quality_features(
+                data.quality_joiner, probe, record=False
             )
             
+            # Nothing within live_join_tolerance of the probe: fall back to the
+            # latest readings, and predict nothing if inputs are still missing
+            joined_columns = data.quality_joiner.sensor_buffer.columns + data.quality_joiner.material_buffer.columns
+            stale_inputs = [col for col in joined_columns if col in quality_df and quality_df[col].isna().any()]
+            if stale_inputs:
+                self.logger.warning(f"No reading within {self.live_join_tolerance} of {results['timestamp']} "
+                                    f"for {', '.join(stale_inputs)}; using the latest readings")
+                quality_df = models.quality_controller.prepare_live_quality_features(
+                    data.quality_joiner, probe, record=False,
+                    fallback=combined_state.loc[~combined_state.index.duplicated()]
+                )
+                missing = [col for col in stale_inputs if quality_df[col].isna().any()]
+                if missing:
+                    results['recommendations']['quality_control'] = {'status': 'stale_inputs',
+                                                                     'stale_inputs': missing}
+                    quality_df = quality_df.iloc[:0]
+            
             if len(quality_df) > 0:
-                quality_prediction = self.quality_controller.predict_quality(quality_df.iloc[0])
-                quality_corrections = self.quality_controller.generate_correction_actions(
-                    quality_prediction, combined_state
+                quality_prediction = models.quality_controller.predict_quality(quality_df.iloc[0])
+                quality_corrections = models.quality_controller.generate_correction_actions(
+                    quality_prediction, combined_state, models.energy_optimizer
                 )
                 
                 results['recommendations']['quality_control'] = {
                     'predictions': quality_prediction,
-                    'corrections': quality_corrections
+                    'corrections': quality_corrections,
+                    'stale_inputs': stale_inputs
                 }
                 
+                # Model-checked setpoint changes when quality is off target
+                if quality_prediction['quality_grade'] > 2:
+                    results['recommendations']['quality_control']['optimized_setpoints'] = \
+                        models.quality_controller.optimize_setpoints(quality_df.iloc[0])
+                
+                # Lowest-energy operating point that keeps quality acceptable
+                if models.energy_optimizer is not None and models.energy_optimizer.is_trained:
+                    results['recommendations']['energy'] = models.energy_optimizer.optimize_operating_point(
+                        quality_df.iloc[0], models.quality_controller
+                    )
+                
                 # Add quality alerts
-                if quality_prediction['quality_grades'] > 2:  # Below acceptable quality
+                if quality_prediction['quality_grade'] > 2:  # Below acceptable quality
                     results['alerts'].append({
                         'type': 'quality',
-                        'severity': 'high' if quality_prediction['quality_grades'] > 3 else 'medium',
-                        'message': f"Quality grade {quality_prediction['quality_grades']} predicted",
+                        'severity': 'high' if quality_prediction['quality_grade'] > 3 else 'medium',
+                        'message': f"Quality grade {quality_prediction['quality_grade']} predicted",
                         'details': quality_prediction
                     })
             
             # 3. Logistics Optimization
             self.logger.info("Optimizing logistics...")
-            logistics_df = self.logistics_optimizer.prepare_logistics_features(
-                self.sensor_data.tail(100), self.material_data.tail(50)
+            logistics_df = models.logistics_optimizer.prepare_logistics_features(
+                data.sensor_data.tail(100), data.material_data.tail(50), self.feature_store
             )
             
-            logistics_recommendations = self.logistics_optimizer.generate_logistics_recommendations(
+            logistics_recommendations = models.logistics_optimizer.generate_logistics_recommendations(
                 logistics_df
             )
             
@@ -1343,11 +4206,31 @@ class CementMindAI:
             results['system_status'] = 'error'
             results['error_message'] = str(e)
         
+        self.analysis_stats['full'] += 1
+        if results['system_status'] != 'error':
+            self._last_analysis = {'key': steady_key, 'results': results}
+        
         return results
     
-    def generate_comprehensive_report(self) -> Dict:
-        """Generate comprehensive system performance and analysis report"""
+    def _report_rollup(self, name: str, start, end) -> Optional[TimeBucketRollup]:
+        """Coarsest rollup whose buckets align with the [start, end] bounds"""
+        rollups = self.rollups.get(name)
+        if not rollups:
+            return None
+        for resolution in self.rollup_resolutions:
+            step = pd.Timedelta(resolution).value
+            if all(bound is None or pd.Timestamp(bound).value % step == 0 for bound in (start, end)):
+                return rollups[resolution]
+        return rollups[self.rollup_resolutions[-1]]
+    
+    def generate_comprehensive_report(self, start=None, end=None) -> Dict:
+        """
+        Generate comprehensive system performance and analysis report. Data
+        statistics come from the materialized rollups, optionally limited to
+        the buckets overlapping [start, end].
+        """
         
+        data = self.snapshot()
         report = {
             'timestamp': datetime.now(),
             'system_overview': self.system_status,
@@ -1358,22 +4241,28 @@ class CementMindAI:
         }
         
         if self.system_status['data_generated']:
+            sensor = self._report_rollup('sensor', start, end).query(start, end)
+            quality_rollup = self._report_rollup('quality', start, end)
+            quality = quality_rollup.query(start, end) if quality_rollup is not None else None
+            columns = sensor['columns']
+            
             # Data statistics
             report['data_statistics'] = {
-                'sensor_data_points': len(self.sensor_data),
-                'material_data_points': len(self.material_data),
-                'quality_data_points': len(self.quality_data),
-                'anomaly_rate': self.sensor_data['is_anomaly'].mean(),
-                'data_time_span': f"{(self.sensor_data['timestamp'].max() - self.sensor_data['timestamp'].min()).days} days"
+                'sensor_data_points': sensor['rows'],
+                'material_data_points': len(data.material_data),
+                'quality_data_points': quality['rows'] if quality is not None else 0,
+                'anomaly_rate': columns.get('is_anomaly', {}).get('mean', np.nan),
+                'data_time_span': f"{(sensor['last_timestamp'] - sensor['first_timestamp']).days} days"
+                if sensor['rows'] else "0 days"
             }
             
             # Operational insights
             report['operational_insights'] = {
-                'avg_energy_consumption': self.sensor_data['energy_consumption'].mean(),
-                'temperature_stability': self.sensor_data['kiln_temperature'].std(),
-                'material_flow_consistency': self.sensor_data['material_flow_rate'].std(),
-                'quality_grade_distribution': self.quality_data['quality_grade'].value_counts().to_dict()
-                if hasattr(self, 'quality_data') and self.quality_data is not None else {}
+                'avg_energy_consumption': columns.get('energy_consumption', {}).get('mean', np.nan),
+                'temperature_stability': columns.get('kiln_temperature', {}).get('std', np.nan),
+                'material_flow_consistency': columns.get('material_flow_rate', {}).get('std', np.nan),
+                'quality_grade_distribution': quality['histograms'].get('quality_grade', {})
+                if quality is not None else {}
             }
         
         # Strategic recommendations
@@ -1387,63 +4276,144 @@ class CementMindAI:
         
         return report
     
+    def trend(self, column: str, start=None, end=None, points: int = 500,
+              frame: str = 'sensor') -> pd.DataFrame:
+        """
+        Plot-ready series of `column` over [start, end]: bucket count/mean/min/
+        max from the coarsest rollup with at least `points` buckets in range,
+        reduced to `points` rows with LTTB. The work is bounded by `points`
+        times the ratio between adjacent resolutions, whatever the range.
+        """
+        
+        rollups = self.rollups.get(frame)
+        if not rollups:
+            return pd.DataFrame(columns=['timestamp', 'count', 'mean', 'min', 'max'])
+        
+        for resolution in self.rollup_resolutions:
+            rollup = rollups[resolution]
+            if rollup.bucket_count(start, end) >= points:
+                break
+        series = rollup.series(column, start, end).dropna(subset=['mean']).reset_index(drop=True)
+        if len(series) > points:
+            keep = lttb_indices(series['timestamp'].to_numpy().astype(np.int64), series['mean'].to_numpy(), points)
+            series = series.iloc[keep].reset_index(drop=True)
+        return series
+    
+    def dashboard_inputs(self, panels: List[str]) -> Tuple[int, Dict[str, Optional[Dict]]]:
+        """
+        Extracted inputs of the given dashboard panels and the data version they
+        belong to. Extraction runs under the write lock, so the rollups it reads
+        match the pinned snapshot; extractors only return small summaries.
+        """
+        with self._write_lock:
+            data = self._data
+            return data.version, {name: DASHBOARD_PANELS[name][0](self, data) for name in panels}
+    
+    def incidents_overlapping(self, start, end) -> List[Dict]:
+        """Anomaly incidents that overlap the [start, end] window"""
+        return self.incident_tracker.overlapping(start, end)
+    
+    def backfill_anomalies(self, output_dir: str, sensor_data: Optional[pd.DataFrame] = None,
+                           chunk_rows: int = 250000, max_workers: Optional[int] = None,
+                           progress=None) -> Dict:
+        """Re-score sensor history (default: the current snapshot) with the current anomaly models"""
+        
+        if sensor_data is None:
+            sensor_data = self.snapshot().sensor_data
+        backfill = AnomalyBackfill(self.models_snapshot().anomaly_detector, output_dir,
+                                   chunk_rows=chunk_rows, max_workers=max_workers, progress=progress)
+        return backfill.run(sensor_data)
+    
     def save_models(self, file_path: str = "cementmind_models.joblib"):
         """Save trained models to disk"""
         
+        models = self.models_snapshot()
         models_dict = {
             'logistics_optimizer': {
-                'demand_predictor': self.logistics_optimizer.demand_predictor,
-                'scaler': self.logistics_optimizer.scaler,
-                'is_trained': self.logistics_optimizer.is_trained
+                'demand_predictor': models.logistics_optimizer.demand_predictor,
+                'scaler': models.logistics_optimizer.scaler,
+                'is_trained': models.logistics_optimizer.is_trained
             },
             'quality_controller': {
-                'quality_predictor': self.quality_controller.quality_predictor,
-                'scaler_quality': self.quality_controller.scaler_quality,
-                'feature_names': self.quality_controller.quality_feature_names
-                if hasattr(self.quality_controller, 'quality_feature_names') else None,
-                'is_trained': self.quality_controller.is_trained
+                'quality_predictor': models.quality_controller.quality_predictor,
+                'scaler_quality': models.quality_controller.scaler_quality,
+                'surrogate': models.quality_controller.surrogate,
+                'use_surrogate': models.quality_controller.use_surrogate,
+                'multi_output': models.quality_controller.multi_output,
+                'feature_names': models.quality_controller.quality_feature_names
+                if hasattr(models.quality_controller, 'quality_feature_names') else None,
+                'is_trained': models.quality_controller.is_trained
             },
             'anomaly_detector': {
-                'isolation_forest': self.anomaly_detector.isolation_forest,
-                'scaler_anomaly': self.anomaly_detector.scaler_anomaly,
-                'normal_ranges': self.anomaly_detector.normal_ranges,
-                'feature_names': self.anomaly_detector.feature_names
-                if hasattr(self.anomaly_detector, 'feature_names') else None,
-                'is_trained': self.anomaly_detector.is_trained
+                'isolation_forest': models.anomaly_detector.isolation_forest,
+                'scaler_anomaly': models.anomaly_detector.scaler_anomaly,
+                'normal_ranges': models.anomaly_detector.normal_ranges,
+                'feature_names': models.anomaly_detector.feature_names
+                if hasattr(models.anomaly_detector, 'feature_names') else None,
+                'feature_spec': models.anomaly_detector.feature_spec,
+                'range_tracker': models.anomaly_detector.range_tracker,
+                'is_trained': models.anomaly_detector.is_trained
+            },
+            'hyperparameters': self.hyperparameters,
+            'energy_optimizer': {
+                'energy_model': models.energy_optimizer.energy_model if models.energy_optimizer else None,
+                'is_trained': models.energy_optimizer.is_trained if models.energy_optimizer else False
             },
             'system_status': self.system_status
         }
         
+        import joblib
         joblib.dump(models_dict, file_path)
         self.logger.info(f"✓ Models saved to {file_path}")
     
     def load_models(self, file_path: str = "cementmind_models.joblib"):
         """Load trained models from disk"""
+        import joblib
         
         try:
             models_dict = joblib.load(file_path)
+            models = PlantModelBundle(LogisticsOptimizer(), CementQualityController(),
+                                      AnomalyDetectionSystem(), EnergyOptimizer())
             
             # Restore logistics optimizer
-            self.logistics_optimizer.demand_predictor = models_dict['logistics_optimizer']['demand_predictor']
-            self.logistics_optimizer.scaler = models_dict['logistics_optimizer']['scaler']
-            self.logistics_optimizer.is_trained = models_dict['logistics_optimizer']['is_trained']
+            models.logistics_optimizer.demand_predictor = models_dict['logistics_optimizer']['demand_predictor']
+            models.logistics_optimizer.scaler = models_dict['logistics_optimizer']['scaler']
+            models.logistics_optimizer.is_trained = models_dict['logistics_optimizer']['is_trained']
             
             # Restore quality controller
-            self.quality_controller.quality_predictor = models_dict['quality_controller']['quality_predictor']
-            self.quality_controller.scaler_quality = models_dict['quality_controller']['scaler_quality']
+            models.quality_controller.quality_predictor = models_dict['quality_controller']['quality_predictor']
+            # Older files: a joint forest implies multi-output mode
+            multi_output = models_dict['quality_controller'].get(
+                'multi_output', CementQualityController.joint_model_key in (models.quality_controller.quality_predictor or {})
+            )
+            models.quality_controller.multi_output = multi_output
+            self.quality_multi_output = multi_output
+            models.quality_controller.scaler_quality = models_dict['quality_controller']['scaler_quality']
+            models.quality_controller.surrogate = models_dict['quality_controller'].get('surrogate')
+            models.quality_controller.use_surrogate = models_dict['quality_controller'].get('use_surrogate', False)
             if models_dict['quality_controller']['feature_names']:
-                self.quality_controller.quality_feature_names = models_dict['quality_controller']['feature_names']
-            self.quality_controller.is_trained = models_dict['quality_controller']['is_trained']
+                models.quality_controller.quality_feature_names = models_dict['quality_controller']['feature_names']
+            models.quality_controller.is_trained = models_dict['quality_controller']['is_trained']
             
             # Restore anomaly detector
-            self.anomaly_detector.isolation_forest = models_dict['anomaly_detector']['isolation_forest']
-            self.anomaly_detector.scaler_anomaly = models_dict['anomaly_detector']['scaler_anomaly']
-            self.anomaly_detector.normal_ranges = models_dict['anomaly_detector']['normal_ranges']
-            if models_dict['anomaly_detector']['feature_names']:
-                self.anomaly_detector.feature_names = models_dict['anomaly_detector']['feature_names']
-            self.anomaly_detector.is_trained = models_dict['anomaly_detector']['is_trained']
-            
-            # Restore system status
+            models.anomaly_detector.isolation_forest = models_dict['anomaly_detector']['isolation_forest']
+            models.anomaly_detector.scaler_anomaly = models_dict['anomaly_detector']['scaler_anomaly']
+            models.anomaly_detector.normal_ranges = models_dict['anomaly_detector']['normal_ranges']
+            models.anomaly_detector.range_tracker = models_dict['anomaly_detector'].get('range_tracker')
+            if models_dict['anomaly_detector'].get('feature_spec'):
+                models.anomaly_detector.set_feature_spec(models_dict['anomaly_detector']['feature_spec'])
+            models.anomaly_detector.is_trained = models_dict['anomaly_detector']['is_trained']
+            
+            # Restore energy optimizer (absent in older model files)
+            energy = models_dict.get('energy_optimizer', {})
+            models.energy_optimizer.energy_model = energy.get('energy_model')
+            models.energy_optimizer.is_trained = energy.get('is_trained', False)
+            
+            # Publish the restored models as a new version
+            self._publish_models(models)
+            
+            # Restore system status and tuned settings
+            self.hyperparameters = models_dict.get('hyperparameters', {})
             self.system_status = models_dict['system_status']
             
             self.logger.info(f"✓ Models loaded from {file_path}")
@@ -1452,6 +4422,585 @@ class CementMindAI:
             self.logger.error(f"Error loading models: {str(e)}")
             raise
 
+# =============================================================================
+# MULTI-PLANT SERVING HOST
+# =============================================================================
+
+PLANT_MATERIAL_COLUMNS = [
+    'limestone_percent', 'clay_percent', 'iron_ore_percent', 'gypsum_percent',
+    'cao_content', 'sio2_content', 'al2o3_content', 'fe2o3_content',
+    'truck_arrivals', 'inventory_level', 'supply_chain_delay',
+    'limestone_quality', 'clay_quality'
+]
+
+class PlantState:
+    """
+    Compact per-plant serving state: just enough recent sensor readings to
+    evaluate the anomaly feature windows, plus a small as-of joiner for live
+    quality features. No models and no full history.
+    """
+    
+    def __init__(self, plant_id: str, context_size: int, sensor_columns: List[str],
+                 material_columns: List[str], join_capacity: int = 256,
+                 join_tolerance: Optional[str] = '1h'):
+        self.plant_id = plant_id
+        self.sensor_tail = deque(maxlen=context_size)
+        self.joiner = IncrementalAsOfJoiner(sensor_columns, material_columns,
+                                            capacity=join_capacity, tolerance=join_tolerance)
+        self.last_material = {}
+        self.readings_ingested = 0
+        self.incident_tracker = IncidentTracker(AnomalyDetectionSystem.incident_gap)
+    
+    def sensor_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(list(self.sensor_tail))
+    
+    @property
+    def latest_timestamp(self) -> Optional[pd.Timestamp]:
+        return self.sensor_tail[-1]['timestamp'] if self.sensor_tail else None
+
+
+class MultiPlantHost:
+    """
+    Serves many kilns from one process. All plants share one read-only
+    PlantModelBundle, each plant keeps only a PlantState, and requests are
+    routed by plant ID. Readings from many plants are scored together so each
+    model is invoked once per batch instead of once per plant.
+    """
+    
+    def __init__(self, models: PlantModelBundle, join_capacity: int = 256,
+                 join_tolerance: Optional[str] = '1h'):
+        self.logger = logging.getLogger(__name__)
+        self.models = models
+        self.join_capacity = join_capacity
+        self.join_tolerance = join_tolerance
+        self.plants: Dict[str, PlantState] = {}
+        
+        # Longest trailing window any anomaly feature looks at
+        self.context_size = max(1, models.anomaly_detector.feature_pipeline.lookback)
+    
+    def register_plant(self, plant_id: str, sensor_history: Optional[pd.DataFrame] = None,
+                       material_history: Optional[pd.DataFrame] = None) -> PlantState:
+        """Add a plant, optionally warm-starting its state from recent history"""
+        state = PlantState(plant_id, self.context_size, ANOMALY_SENSOR_COLUMNS,
+                           PLANT_MATERIAL_COLUMNS, self.join_capacity, self.join_tolerance)
+        self.plants[plant_id] = state
+        
+        if sensor_history is not None:
+            recent = sensor_history.sort_values('timestamp').tail(self.join_capacity)
+            state.joiner.add_sensor_frame(recent)
+            state.sensor_tail.extend(recent.tail(self.context_size).to_dict('records'))
+        if material_history is not None:
+            recent = material_history.sort_values('timestamp').tail(self.join_capacity)
+            state.joiner.add_material_frame(recent)
+            state.last_material = recent.iloc[-1].to_dict()
+        return state
+    
+    def _state(self, plant_id: str) -> PlantState:
+        if plant_id not in self.plants:
+            raise KeyError(f"Unknown plant: {plant_id}")
+        return self.plants[plant_id]
+    
+    def ingest(self, plant_id: str, sensor_reading: Optional[Dict] = None,
+               material_reading: Optional[Dict] = None):
+        """Route new readings to the owning plant's state"""
+        state = self._state(plant_id)
+        if sensor_reading is not None:
+            reading = dict(sensor_reading, timestamp=pd.Timestamp(sensor_reading['timestamp']))
+            state.sensor_tail.append(reading)
+            state.joiner.add_sensor_reading(reading)
+            state.readings_ingested += 1
+        if material_reading is not None:
+            reading = dict(material_reading, timestamp=pd.Timestamp(material_reading['timestamp']))
+            state.joiner.add_material_reading(reading)
+            state.last_material = reading
+    
+    def ingest_quality_sample(self, plant_id: str, quality_sample: Dict):
+        """Record a lab sample so live quality features get rolling-window context"""
+        state = self._state(plant_id)
+        state.joiner.join_quality_samples(pd.DataFrame([quality_sample]))
+    
+    def detect_anomalies_batch(self, plant_ids: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """Score the latest reading of every requested plant in one cross-plant batch"""
+        detector = self.models.anomaly_detector
+        plant_ids = [p for p in (plant_ids or list(self.plants)) if self.plants[p].sensor_tail]
+        if not plant_ids:
+            return {}
+        
+        # Features are computed per plant (windows must not span plants),
+        # then stacked so both detectors run once for the whole batch
+        X = np.vstack([
+            detector.feature_pipeline.transform(self.plants[p].sensor_frame())[-1:]
+            for p in plant_ids
+        ])
+        scores = detector.score_feature_matrix(X)
+        
+        results = {}
+        for i, plant_id in enumerate(plant_ids):
+            is_anomaly = bool(scores['is_anomaly'][i])
+            confidence = float(scores['confidence'][i])
+            details = []
+            if is_anomaly:
+                latest = pd.Series(self.plants[plant_id].sensor_tail[-1])
+                details.append(detector._analyze_anomaly_details(latest, None, confidence))
+            results[plant_id] = {
+                'anomalies_detected': int(is_anomaly),
+                'confidence_scores': [confidence],
+                'anomaly_details': details,
+                'severity_levels': detector._classify_severity([confidence], [is_anomaly])
+            }
+        return results
+    
+    def predict_quality_batch(self, plant_ids: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """Predict quality at the latest process state of every requested plant in one batch"""
+        controller = self.models.quality_controller
+        plant_ids = [p for p in (plant_ids or list(self.plants)) if self.plants[p].sensor_tail]
+        if not plant_ids:
+            return {}
+        
+        states = pd.concat([
+            controller.prepare_live_quality_features(
+                self.plants[p].joiner,
+                pd.DataFrame([{'timestamp': self.plants[p].latest_timestamp}]),
+                record=False
+            )
+            for p in plant_ids
+        ], ignore_index=True)
+        predictions = controller.predict_quality_batch(states)
+        
+        results = {}
+        for i, plant_id in enumerate(plant_ids):
+            current_state = pd.Series({**self.plants[plant_id].last_material,
+                                       **states.iloc[i].to_dict()})
+            results[plant_id] = {
+                'predictions': predictions[i],
+                'corrections': controller.generate_correction_actions(predictions[i], current_state)
+            }
+        return results
+    
+    def analyze_plants(self, plant_ids: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """Batched anomaly and quality analysis for many plants"""
+        plant_ids = plant_ids or list(self.plants)
+        anomalies = self.detect_anomalies_batch(plant_ids)
+        quality = self.predict_quality_batch(plant_ids)
+        
+        results = {}
+        for plant_id in plant_ids:
+            state = self.plants[plant_id]
+            anomaly_result = anomalies.get(plant_id)
+            alerts = []
+            if anomaly_result and anomaly_result['anomalies_detected'] > 0:
+                alerts.append({
+                    'type': 'anomaly',
+                    'severity': anomaly_result['severity_levels']['level'],
+                    'count': anomaly_result['anomalies_detected'],
+                    'incidents': state.incident_tracker.record(anomaly_result['anomaly_details'])
+                })
+            results[plant_id] = {
+                'plant_id': plant_id,
+                'timestamp': state.latest_timestamp,
+                'alerts': alerts,
+                'anomalies': anomaly_result,
+                'quality_control': quality.get(plant_id)
+            }
+        return results
+    
+    def incidents_overlapping(self, plant_id: str, start, end) -> List[Dict]:
+        """Anomaly incidents of one plant that overlap the [start, end] window"""
+        return self._state(plant_id).incident_tracker.overlapping(start, end)
+    
+    def analyze(self, plant_id: str) -> Dict:
+        """Analysis for a single plant, routed by ID"""
+        self._state(plant_id)
+        return self.analyze_plants([plant_id])[plant_id]
+
+# =============================================================================
+# HISTORICAL ANOMALY BACKFILL
+# =============================================================================
+
+# Worker-process state: the detector is unpickled once per worker, not per chunk
+_backfill_detector = None
+
+def _init_backfill_worker(detector: AnomalyDetectionSystem):
+    global _backfill_detector
+    _backfill_detector = detector
+
+
+def write_columnar(frame: pd.DataFrame, path: str) -> str:
+    """Write a frame as parquet when pyarrow is available, else csv; returns the file written"""
+    try:
+        import pyarrow  # noqa: F401
+        path, write = path + '.parquet', frame.to_parquet
+    except ImportError:
+        path, write = path + '.csv', lambda p, index: frame.to_csv(p, index=index)
+    
+    # Write under a temporary name so a crash never leaves a partial chunk behind
+    tmp_path = path + '.tmp'
+    write(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _backfill_chunk(chunk: pd.DataFrame, skip_rows: int, first_row: int, path: str) -> Dict:
+    """Backfill task: score one chunk and write its anomaly records"""
+    detector = _backfill_detector
+    X = detector.feature_pipeline.transform(chunk)[skip_rows:]
+    scores = detector.score_feature_matrix(X)
+    
+    flagged = np.flatnonzero(scores['is_anomaly'])
+    confidence = scores['confidence'][flagged]
+    records = pd.DataFrame({
+        'row': first_row + flagged,
+        'timestamp': chunk['timestamp'].to_numpy()[skip_rows:][flagged],
+        'confidence': confidence,
+        'if_score': scores['if_scores'][flagged],
+        'stat_score': scores['stat_scores'][flagged],
+        'severity': AnomalyDetectionSystem.severity_levels(confidence)
+    })
+    
+    return {'rows': len(X), 'anomalies': len(flagged), 'file': write_columnar(records, path)}
+
+
+class AnomalyBackfill:
+    """
+    Re-scores a long sensor history with a trained AnomalyDetectionSystem.
+    The history is cut into chunks that overlap by the feature pipeline's
+    lookback, so rolling windows at chunk edges see the same rows as a single
+    pass would. Chunks are scored in a process pool and each writes its
+    anomaly records to its own columnar file in output_dir. A manifest of
+    finished chunks lets an interrupted run resume where it stopped.
+    """
+    
+    manifest_name = 'manifest.json'
+    
+    def __init__(self, detector: AnomalyDetectionSystem, output_dir: str,
+                 chunk_rows: int = 250000, max_workers: Optional[int] = None,
+                 progress=None):
+        if not detector.is_trained:
+            raise ValueError("Anomaly detectors must be trained before backfill")
+        self.logger = logging.getLogger(__name__)
+        self.detector = detector
+        self.output_dir = output_dir
+        self.chunk_rows = chunk_rows
+        self.max_workers = max_workers
+        # Optional callback(chunks_done, chunks_total, rows_done)
+        self.progress = progress
+    
+    def _manifest_path(self) -> str:
+        return os.path.join(self.output_dir, self.manifest_name)
+    
+    def _load_manifest(self, run: Dict) -> Dict:
+        """Completed chunks of a previous run over the same input, if any"""
+        if not os.path.exists(self._manifest_path()):
+            return {}
+        with open(self._manifest_path()) as f:
+            manifest = json.load(f)
+        if manifest['run'] != run:
+            changed = 'models' if manifest['run'].get('model') != run['model'] else 'data or settings'
+            raise ValueError(f"{self.output_dir} holds a backfill with different {changed}; "
+                             f"use a new output_dir to re-score")
+        return {int(k): v for k, v in manifest['completed'].items() if os.path.exists(v['file'])}
+    
+    def _save_manifest(self, run: Dict, completed: Dict):
+        tmp_path = self._manifest_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'run': run, 'completed': completed}, f, indent=2)
+        os.replace(tmp_path, self._manifest_path())
+    
+    def run(self, sensor_data: pd.DataFrame) -> Dict:
+        """Score the whole history (resuming if possible) and return a run summary"""
+        
+        os.makedirs(self.output_dir, exist_ok=True)
+        overlap = self.detector.feature_pipeline.lookback
+        n_rows = len(sensor_data)
+        starts = list(range(0, n_rows, self.chunk_rows))
+        run = {
+            'rows': n_rows,
+            'first_timestamp': str(sensor_data['timestamp'].iloc[0]) if n_rows else None,
+            'last_timestamp': str(sensor_data['timestamp'].iloc[-1]) if n_rows else None,
+            'chunk_rows': self.chunk_rows,
+            'overlap': overlap,
+            'features': self.detector.feature_names,
+            # Re-scoring after a retrain must not resume the old model's chunks
+            'model': self.detector.model_fingerprint()
+        }
+        completed = self._load_manifest(run)
+        if completed:
+            self.logger.info(f"Resuming backfill: {len(completed)}/{len(starts)} chunks already done")
+        
+        # Workers only need the pipeline's source columns
+        columns = sorted(set(self.detector.feature_pipeline.source_columns) | {'timestamp'})
+        pending = [k for k in range(len(starts)) if k not in completed]
+        rows_done = sum(c['rows'] for c in completed.values())
+        
+        # Only a bounded window of chunks is sliced and queued at a time, so the
+        # parent never holds more than a few chunk copies of the history
+        workers = self.max_workers or os.cpu_count() or 1
+        in_flight = 2 * workers
+        queue = iter(pending)
+        
+        start_time = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_backfill_worker,
+                                 initargs=(self.detector,)) as pool:
+            
+            def submit(k):
+                begin = max(0, starts[k] - overlap)
+                chunk = sensor_data.iloc[begin:starts[k] + self.chunk_rows][columns]
+                path = os.path.join(self.output_dir, f'chunk_{k:05d}')
+                return pool.submit(_backfill_chunk, chunk, starts[k] - begin, starts[k], path)
+            
+            futures = {}
+            for k in itertools.islice(queue, in_flight):
+                futures[submit(k)] = k
+            
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    k = futures.pop(future)
+                    completed[k] = future.result()
+                    rows_done += completed[k]['rows']
+                    self._save_manifest(run, completed)
+                    
+                    if self.progress is not None:
+                        self.progress(len(completed), len(starts), rows_done)
+                    self.logger.info(f"Backfill: {len(completed)}/{len(starts)} chunks, {rows_done:,} rows")
+                    
+                    for k in itertools.islice(queue, 1):
+                        futures[submit(k)] = k
+        
+        return {
+            'rows': rows_done,
+            'chunks': len(starts),
+            'chunks_resumed': len(starts) - len(pending),
+            'anomalies': sum(c['anomalies'] for c in completed.values()),
+            'files': [completed[k]['file'] for k in sorted(completed)],
+            'elapsed_seconds': time.perf_counter() - start_time
+        }
+    
+    def read_results(self) -> pd.DataFrame:
+        """All anomaly records of the finished chunks, in time order"""
+        with open(self._manifest_path()) as f:
+            completed = json.load(f)['completed']
+        frames = [pd.read_parquet(c['file']) if c['file'].endswith('.parquet')
+                  else pd.read_csv(c['file'], parse_dates=['timestamp'])
+                  for _, c in sorted(completed.items(), key=lambda item: int(item[0]))]
+        if not frames:
+            return pd.DataFrame(columns=['row', 'timestamp', 'confidence', 'if_score', 'stat_score', 'severity'])
+        return pd.concat(frames, ignore_index=True)
+
+# =============================================================================
+# DASHBOARD PANELS & HEADLESS RENDERING
+# =============================================================================
+
+# Each dashboard panel is a pair: extract its (small) inputs from the plant
+# rollups and a pinned data snapshot, then draw them on a matplotlib axes. The
+# interactive dashboard and the headless renderer share both halves; extractors
+# run through CementMindAI.dashboard_inputs so rollups match the snapshot.
+
+def _energy_trend_data(cement_ai: 'CementMindAI', data: PlantDataSnapshot) -> Optional[Dict]:
+    return {'trend': cement_ai.trend('energy_consumption', points=1000)}
+
+def _draw_energy_trend(ax, data: Dict):
+    energy = data['trend']
+    ax.fill_between(energy['timestamp'], energy['min'], energy['max'], alpha=0.3)
+    ax.plot(energy['timestamp'], energy['mean'])
+    ax.set_title('Energy Consumption Trend')
+    ax.set_ylabel('kWh')
+    ax.tick_params(axis='x', rotation=45)
+
+def _temperature_pressure_data(cement_ai: 'CementMindAI', data: PlantDataSnapshot) -> Optional[Dict]:
+    hourly = cement_ai.rollups['sensor']['1h']
+    return {column: hourly.series(column)['mean'].to_numpy()
+            for column in ('kiln_temperature', 'system_pressure', 'is_anomaly')}
+
+def _draw_temperature_pressure(ax, data: Dict):
+    ax.scatter(data['kiln_temperature'], data['system_pressure'],
+               c=data['is_anomaly'], cmap='viridis', alpha=0.6)
+    ax.set_title('Hourly Temperature vs Pressure (Anomaly Rate in Yellow)')
+    ax.set_xlabel('Kiln Temperature (°C)')
+    ax.set_ylabel('System Pressure (bar)')
+
+def _quality_grade_data(cement_ai: 'CementMindAI', data: PlantDataSnapshot) -> Optional[Dict]:
+    rollups = cement_ai.rollups.get('quality')
+    if not rollups:
+        return None
+    histogram = rollups[cement_ai.rollup_resolutions[0]].query()['histograms']['quality_grade']
+    return {'grades': sorted(histogram.items())}
+
+def _draw_quality_grades(ax, data: Dict):
+    grades, counts = zip(*data['grades']) if data['grades'] else ((), ())
+    ax.bar(grades, counts)
+    ax.set_title('Quality Grade Distribution')
+    ax.set_xlabel('Quality Grade (1=Excellent, 4=Poor)')
+    ax.set_ylabel('Count')
+
+def _material_flow_data(cement_ai: 'CementMindAI', data: PlantDataSnapshot) -> Optional[Dict]:
+    return {'flow': data.sensor_data['material_flow_rate'].iloc[-2000:].to_numpy()}
+
+def _draw_material_flow(ax, data: Dict):
+    flow_data = data['flow']
+    ax.hist(flow_data, bins=50, alpha=0.7, color='skyblue')
+    ax.axvline(flow_data.mean(), color='red', linestyle='--', label=f'Mean: {flow_data.mean():.1f}')
+    ax.set_title('Material Flow Rate Distribution')
+    ax.set_xlabel('Flow Rate (tons/hour)')
+    ax.set_ylabel('Frequency')
+    ax.legend()
+
+def _anomaly_timeline_data(cement_ai: 'CementMindAI', data: PlantDataSnapshot) -> Optional[Dict]:
+    return {'trend': cement_ai.trend('is_anomaly', points=500)}
+
+def _draw_anomaly_timeline(ax, data: Dict):
+    anomalies = data['trend']
+    ax.vlines(anomalies['timestamp'], 0, anomalies['mean'] * anomalies['count'], color='red', alpha=0.7)
+    ax.set_title('Anomaly Detection Timeline')
+    ax.set_ylabel('Anomalies per Bucket')
+    ax.tick_params(axis='x', rotation=45)
+
+def _material_composition_data(cement_ai: 'CementMindAI', data: PlantDataSnapshot) -> Optional[Dict]:
+    if data.material_data is None:
+        return None
+    material_cols = ['limestone_percent', 'clay_percent', 'iron_ore_percent', 'gypsum_percent']
+    return {'labels': material_cols, 'values': data.material_data[material_cols].iloc[-1].to_numpy()}
+
+def _draw_material_composition(ax, data: Dict):
+    ax.pie(data['values'], labels=data['labels'], autopct='%1.1f%%')
+    ax.set_title('Current Raw Material Composition')
+
+# Panel name -> (extract inputs, draw), in dashboard grid order
+DASHBOARD_PANELS = {
+    'energy_trend': (_energy_trend_data, _draw_energy_trend),
+    'temperature_pressure': (_temperature_pressure_data, _draw_temperature_pressure),
+    'quality_grades': (_quality_grade_data, _draw_quality_grades),
+    'material_flow': (_material_flow_data, _draw_material_flow),
+    'anomaly_timeline': (_anomaly_timeline_data, _draw_anomaly_timeline),
+    'material_composition': (_material_composition_data, _draw_material_composition)
+}
+
+
+def render_panel(name: str, data: Optional[Dict], fmt: str = 'png', dpi: int = 100,
+                 figsize: Tuple[float, float] = (6, 4.5)) -> bytes:
+    """
+    Draw one dashboard panel on a standalone figure and return the encoded
+    image. Uses the object-oriented matplotlib API with an Agg canvas, so it
+    needs no display and never touches pyplot's global state.
+    """
+    import io
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    if data is None:
+        ax.set_axis_off()
+        ax.text(0.5, 0.5, 'No data', ha='center', va='center')
+    else:
+        DASHBOARD_PANELS[name][1](ax, data)
+    fig.tight_layout()
+    
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=dpi)
+    return buffer.getvalue()
+
+
+class DashboardRenderer:
+    """
+    Headless dashboard service: renders each panel to PNG/SVG on its own and
+    caches the images under the plant data version. Panels are re-rendered
+    only after the data changes; inputs are extracted in-process from the
+    rollups and drawn in a persistent process pool. With `output_dir` set,
+    images are also published there for a web frontend to serve.
+    """
+    
+    formats = ('png', 'svg')
+    
+    def __init__(self, cement_ai: 'CementMindAI', output_dir: Optional[str] = None,
+                 dpi: int = 100, figsize: Tuple[float, float] = (6, 4.5),
+                 max_workers: Optional[int] = None):
+        self.logger = logging.getLogger(__name__)
+        self.cement_ai = cement_ai
+        self.output_dir = output_dir
+        self.dpi = dpi
+        self.figsize = figsize
+        self.max_workers = max_workers or min(len(DASHBOARD_PANELS), os.cpu_count() or 1)
+        
+        # (panel, format) -> image bytes, all for data version `version`
+        self.cache: Dict[Tuple[str, str], bytes] = {}
+        self.version = None
+        self.stats = {'rendered': 0, 'cached': 0}
+        self._pool = None
+        self._lock = threading.Lock()
+        
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+    
+    def render(self, panels: Optional[List[str]] = None, fmt: str = 'png') -> Dict[str, bytes]:
+        """Images of the requested panels (default: all) for the current data version"""
+        
+        names = list(DASHBOARD_PANELS) if panels is None else list(panels)
+        unknown = [name for name in names if name not in DASHBOARD_PANELS]
+        if unknown:
+            raise ValueError(f"Unknown dashboard panels: {unknown}")
+        if fmt not in self.formats:
+            raise ValueError(f"Unsupported image format '{fmt}', expected one of {self.formats}")
+        
+        with self._lock:
+            # Extracted inputs carry the version they were pinned at; if data
+            # moved on since the cache check, start over at the new version
+            while True:
+                version = self.cement_ai.snapshot().version
+                if version != self.version:
+                    self.cache, self.version = {}, version
+                missing = [name for name in names if (name, fmt) not in self.cache]
+                if not missing:
+                    break
+                version, inputs = self.cement_ai.dashboard_inputs(missing)
+                if version == self.version:
+                    break
+            
+            self.stats['cached'] += len(names) - len(missing)
+            if missing:
+                self._render_missing(missing, fmt, inputs)
+            return {name: self.cache[name, fmt] for name in names}
+    
+    def panel(self, name: str, fmt: str = 'png') -> bytes:
+        """One panel image for the current data version"""
+        return self.render([name], fmt)[name]
+    
+    def _render_missing(self, names: List[str], fmt: str, inputs: Dict[str, Optional[Dict]]):
+        start_time = time.perf_counter()
+        if self.max_workers <= 1 or len(names) == 1:
+            images = {name: render_panel(name, inputs[name], fmt, self.dpi, self.figsize) for name in names}
+        else:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            futures = {self._pool.submit(render_panel, name, inputs[name], fmt, self.dpi, self.figsize): name
+                       for name in names}
+            images = {futures[future]: future.result() for future in as_completed(futures)}
+        
+        for name, image in images.items():
+            self.cache[name, fmt] = image
+            if self.output_dir:
+                self._publish(name, fmt, image)
+        self.stats['rendered'] += len(images)
+        self.logger.info(f"Rendered {len(images)} dashboard panels for data version {self.version} "
+                         f"in {time.perf_counter() - start_time:.2f}s")
+    
+    def _publish(self, name: str, fmt: str, image: bytes):
+        """Write a panel image under its stable name, replacing the previous version atomically"""
+        path = os.path.join(self.output_dir, f'{name}.{fmt}')
+        with open(path + '.tmp', 'wb') as f:
+            f.write(image)
+        os.replace(path + '.tmp', path)
+    
+    def close(self):
+        """Shut down the rendering pool"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
 # =============================================================================
 # DEMONSTRATION AND TESTING MODULE
 # =============================================================================
@@ -1641,52 +5190,10 @@ def visualize_system_performance(cement_ai: CementMindAI):
         fig, axes = plt.subplots(2, 3, figsize=(18, 12))
         fig.suptitle('CementMind AI - System Performance Dashboard', fontsize=16, fontweight='bold')
         
-        # 1. Energy Consumption Trend
-        axes[0, 0].plot(cement_ai.sensor_data['timestamp'].iloc[-1000:], 
-                       cement_ai.sensor_data['energy_consumption'].iloc[-1000:])
-        axes[0, 0].set_title('Energy Consumption Trend')
-        axes[0, 0].set_ylabel('kWh')
-        axes[0, 0].tick_params(axis='x', rotation=45)
-        
-        # 2. Temperature vs Pressure Correlation
-        axes[0, 1].scatter(cement_ai.sensor_data['kiln_temperature'], 
-                          cement_ai.sensor_data['system_pressure'],
-                          c=cement_ai.sensor_data['is_anomaly'], cmap='viridis', alpha=0.6)
-        axes[0, 1].set_title('Temperature vs Pressure (Anomalies in Yellow)')
-        axes[0, 1].set_xlabel('Kiln Temperature (°C)')
-        axes[0, 1].set_ylabel('System Pressure (bar)')
-        
-        # 3. Quality Grade Distribution
-        if cement_ai.quality_data is not None:
-            grade_counts = cement_ai.quality_data['quality_grade'].value_counts().sort_index()
-            axes[0, 2].bar(grade_counts.index, grade_counts.values)
-            axes[0, 2].set_title('Quality Grade Distribution')
-            axes[0, 2].set_xlabel('Quality Grade (1=Excellent, 4=Poor)')
-            axes[0, 2].set_ylabel('Count')
-        
-        # 4. Material Flow Rate Stability
-        flow_data = cement_ai.sensor_data['material_flow_rate'].iloc[-2000:]
-        axes[1, 0].hist(flow_data, bins=50, alpha=0.7, color='skyblue')
-        axes[1, 0].axvline(flow_data.mean(), color='red', linestyle='--', label=f'Mean: {flow_data.mean():.1f}')
-        axes[1, 0].set_title('Material Flow Rate Distribution')
-        axes[1, 0].set_xlabel('Flow Rate (tons/hour)')
-        axes[1, 0].set_ylabel('Frequency')
-        axes[1, 0].legend()
-        
-        # 5. Anomaly Detection Over Time
-        anomaly_data = cement_ai.sensor_data[['timestamp', 'is_anomaly']].iloc[-2000:]
-        anomaly_times = anomaly_data[anomaly_data['is_anomaly'] == 1]['timestamp']
-        axes[1, 1].scatter(anomaly_times, [1]*len(anomaly_times), color='red', alpha=0.7, s=50)
-        axes[1, 1].set_title('Anomaly Detection Timeline')
-        axes[1, 1].set_ylabel('Anomaly Detected')
-        axes[1, 1].tick_params(axis='x', rotation=45)
-        
-        # 6. Raw Material Composition
-        if cement_ai.material_data is not None:
-            material_cols = ['limestone_percent', 'clay_percent', 'iron_ore_percent', 'gypsum_percent']
-            latest_composition = cement_ai.material_data[material_cols].iloc[-1]
-            axes[1, 2].pie(latest_composition.values, labels=material_cols, autopct='%1.1f%%')
-            axes[1, 2].set_title('Current Raw Material Composition')
+        _, inputs = cement_ai.dashboard_inputs(list(DASHBOARD_PANELS))
+        for ax, (name, (_, draw)) in zip(axes.flat, DASHBOARD_PANELS.items()):
+            if inputs[name] is not None:
+                draw(ax, inputs[name])
         
         plt.tight_layout()
         plt.show()
@@ -1734,9 +5241,11 @@ def create_api_integration_example():
     api_code = '''
 # FastAPI Integration Example for CementMind AI
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, List, Optional
 import uvicorn
+from vertex_gemini_sample import get_client, asse_events
 
 app = FastAPI(title="CementMind AI API", version="1.0.0")
 
@@ -1770,6 +5279,16 @@ async def analyze_plant_data(sensor_data: SensorReading) -> Dict:
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/v1/analyze/summary/stream")
+async def stream_incident_summary() -> StreamingResponse:
+    """Server-push incident summary; first words arrive as soon as the model emits them"""
+    result = cement_ai.run_real_time_analysis()
+    prompt = f"Summarize these cement plant alerts for the shift operator: {result['alerts']}"
+    # Starlette closes the generator when the client disconnects, which
+    # cancels the upstream model stream
+    return StreamingResponse(asse_events(get_client().astream(prompt)),
+                             media_type="text/event-stream")
+
 @app.get("/api/v1/quality/predict")
 async def predict_quality(
     kiln_temp: float,
@@ -1795,11 +5314,71 @@ if __name__ == "__main__":
     print("API Integration Example:")
     print(api_code)
 
+def check_import_budget(budget_seconds: float = 1.0, module: str = 'app') -> Dict:
+    """
+    Import `module` in a fresh interpreter with `-X importtime` and report its
+    cumulative import time, its slowest direct imports and any LAZY_IMPORTS it
+    loaded eagerly. Within budget means faster than `budget_seconds` and no
+    eager lazy imports.
+    """
+    import subprocess
+    import sys
+    
+    code = f"import sys, {module}; print(','.join(m for m in {LAZY_IMPORTS!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True,
+                            text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    
+    # Lines are "import time: self | cumulative | name", nested names indented by two
+    # spaces per level and printed before their parent
+    seconds, children, direct = None, [], []
+    for line in result.stderr.splitlines():
+        fields = line[len('import time:'):].split('|')
+        if not line.startswith('import time:') or len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        depth = (len(fields[2]) - len(fields[2].lstrip()) - 1) // 2
+        name = fields[2].strip()
+        if depth == 1:
+            children.append((name, int(fields[1]) / 1e6))
+        elif depth == 0:
+            if name == module:
+                seconds, direct = int(fields[1]) / 1e6, children
+            children = []
+    
+    eager = [name for name in result.stdout.strip().split(',') if name]
+    return {
+        'module': module,
+        'seconds': seconds,
+        'budget_seconds': budget_seconds,
+        'eager_imports': eager,
+        'slowest_imports': sorted(direct, key=lambda item: item[1], reverse=True)[:5],
+        'within_budget': seconds is not None and seconds <= budget_seconds and not eager
+    }
+
 # =============================================================================
 # MAIN EXECUTION
 # =============================================================================
 
 if __name__ == "__main__":
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser(description='CementMind AI demonstration')
+    parser.add_argument('--import-budget', type=float, metavar='SECONDS',
+                        help='check the import time of this module against a budget and exit')
+    args = parser.parse_args()
+    
+    if args.import_budget is not None:
+        profile = check_import_budget(args.import_budget)
+        print(f"import {profile['module']}: {profile['seconds']:.3f}s (budget {profile['budget_seconds']:.3f}s)")
+        for name, seconds in profile['slowest_imports']:
+            print(f"  {name:<30} {seconds:.3f}s")
+        if profile['eager_imports']:
+            print(f"  eagerly imported: {', '.join(profile['eager_imports'])}")
+        sys.exit(0 if profile['within_budget'] else 1)
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    warnings.filterwarnings('ignore')
+    
     # Run the comprehensive demonstration
     cement_ai_system, demo_results, system_report = run_comprehensive_demo()
     
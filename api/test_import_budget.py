@@ -0,0 +1,28 @@
+"""
+Import-time budget for api/app.py: importing the module (e.g. to serve a
+trained model) must stay cheap and must not load the ML, plotting or
+persistence libraries listed in app.LAZY_IMPORTS.
+
+Run with `python -m pytest api/test_import_budget.py`. The budget can be
+raised on slow CI machines with IMPORT_BUDGET_SECONDS.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app
+
+IMPORT_BUDGET_SECONDS = float(os.environ.get("IMPORT_BUDGET_SECONDS", "2.0"))
+
+
+def test_import_within_budget():
+    profile = app.check_import_budget(IMPORT_BUDGET_SECONDS)
+
+    assert profile["seconds"] is not None, "import time of app was not reported"
+    assert not profile["eager_imports"], f"imported eagerly: {profile['eager_imports']}"
+    assert profile["within_budget"], (
+        f"import app took {profile['seconds']:.3f}s (budget {IMPORT_BUDGET_SECONDS:.3f}s); "
+        f"slowest imports: {profile['slowest_imports']}"
+    )
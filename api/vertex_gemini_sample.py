@@ -7,35 +7,442 @@ Prereqs:
 
 Env:
 - GOOGLE_CLOUD_PROJECT, GOOGLE_CLOUD_REGION (e.g., us-central1)
+- GEMINI_CACHE_PATH (optional): enables the persistent response cache
+
+`generate_text` keeps its original signature but goes through a shared
+`GeminiClient`: Vertex AI is initialized once per (project, location, model),
+transient failures are retried with jittered backoff, and many prompts can be
+narrated concurrently with `generate_batch` / `agenerate_batch`. Transports
+are pluggable, so `HttpTransport` can point the client at a local stub server.
+A `ResponseCache` in front of the transport serves repeated prompts from disk.
+`stream_text` / `GeminiClient.astream` yield chunks as they arrive, and
+`sse_events` / `asse_events` frame them for a server-sent-events response.
 """
 
+import asyncio
+import hashlib
+import json
 import os
-from typing import Optional
+import random
+import re
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-import vertexai
-from vertexai.generative_models import GenerativeModel
+DEFAULT_MODEL = "gemini-1.5-flash-002"
 
 
-def generate_text(prompt: str, system: Optional[str] = None, model_name: str = "gemini-1.5-flash-002") -> str:
-    project = os.environ.get("GOOGLE_CLOUD_PROJECT") or os.environ.get("GCP_PROJECT_ID")
-    location = os.environ.get("GOOGLE_CLOUD_REGION", "us-central1")
-    if not project:
-        raise RuntimeError("Missing GOOGLE_CLOUD_PROJECT")
+class TransientError(Exception):
+    """Retryable failure (rate limit, timeout, 5xx)"""
 
-    vertexai.init(project=project, location=location)
-    model = GenerativeModel(model_name)
 
+def build_contents(prompt: str, system: Optional[str] = None) -> List[Dict]:
     contents = []
     if system:
         contents.append({"role": "system", "parts": [{"text": system}]})
     contents.append({"role": "user", "parts": [{"text": prompt}]})
+    return contents
+
+
+class VertexTransport:
+    """Vertex AI transport. Models are created once per (project, location, model) and reused."""
+
+    _models: Dict[Tuple[str, str, str], object] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, project: Optional[str] = None, location: Optional[str] = None):
+        self.project = project or os.environ.get("GOOGLE_CLOUD_PROJECT") or os.environ.get("GCP_PROJECT_ID")
+        self.location = location or os.environ.get("GOOGLE_CLOUD_REGION", "us-central1")
+        if not self.project:
+            raise RuntimeError("Missing GOOGLE_CLOUD_PROJECT")
+
+    def _model(self, model_name: str):
+        key = (self.project, self.location, model_name)
+        with self._lock:
+            if key not in self._models:
+                # Imported lazily so other transports work without the Vertex SDK
+                import vertexai
+                from vertexai.generative_models import GenerativeModel
+
+                vertexai.init(project=self.project, location=self.location)
+                self._models[key] = GenerativeModel(model_name)
+            return self._models[key]
+
+    @staticmethod
+    def _transient_errors() -> Tuple[type, ...]:
+        from google.api_core import exceptions as gexc
+
+        return (gexc.TooManyRequests, gexc.ResourceExhausted, gexc.ServiceUnavailable,
+                gexc.DeadlineExceeded, gexc.InternalServerError)
+
+    def generate(self, model_name: str, contents: List[Dict]) -> str:
+        try:
+            resp = self._model(model_name).generate_content({"contents": contents})
+        except self._transient_errors() as e:
+            raise TransientError(str(e)) from e
+        return resp.candidates[0].content.parts[0].text if resp.candidates else ""
+
+    def stream(self, model_name: str, contents: List[Dict]) -> Iterator[str]:
+        transient = self._transient_errors()
+        responses = None
+        try:
+            responses = self._model(model_name).generate_content({"contents": contents}, stream=True)
+            # The response iterator is lazy: RPC errors surface while iterating,
+            # so the first chunk (what GeminiClient retries on) is covered too
+            for resp in responses:
+                if resp.candidates and resp.candidates[0].content.parts:
+                    yield resp.candidates[0].content.parts[0].text
+        except transient as e:
+            raise TransientError(str(e)) from e
+        finally:
+            # Dropping the response stream cancels the upstream RPC
+            close = getattr(responses, "close", None)
+            if close:
+                close()
+
+
+class HttpTransport:
+    """
+    Minimal JSON-over-HTTP transport, e.g. for a local stub server.
+
+    POST {base_url}/generate with {"model": ..., "contents": [...]} and expect
+    {"text": "..."} back. POST {base_url}/stream with the same body and expect
+    server-sent events `data: {"text": "..."}` ending with `data: [DONE]`.
+    429 and 5xx responses are treated as transient.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _open(self, path: str, model_name: str, contents: List[Dict]):
+        body = json.dumps({"model": model_name, "contents": contents}).encode()
+        request = urllib.request.Request(f"{self.base_url}{path}", data=body,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 429 or e.code >= 500:
+                raise TransientError(f"HTTP {e.code}") from e
+            raise
+        except (urllib.error.URLError, TimeoutError) as e:
+            raise TransientError(str(e)) from e
+
+    def generate(self, model_name: str, contents: List[Dict]) -> str:
+        with self._open("/generate", model_name, contents) as resp:
+            return json.loads(resp.read())["text"]
+
+    def stream(self, model_name: str, contents: List[Dict]) -> Iterator[str]:
+        resp = self._open("/stream", model_name, contents)
+        try:
+            for line in resp:
+                line = line.decode().strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                yield json.loads(data)["text"]
+        finally:
+            # Closing the socket is how the stub (or a proxy) sees the cancellation
+            resp.close()
+
+
+class ResponseCache:
+    """
+    Disk-backed (sqlite3) cache of generated text, keyed by a hash of the
+    model, system prompt and prompt after whitespace normalization.
+    Size-bounded with least-recently-used eviction, per-entry TTL, and
+    hit/miss counters.
+
+    In template mode numbers are stripped from the prompt before hashing, so
+    prompts that differ only in readings share one entry. The cached narrative
+    is stored as a skeleton with the prompt's numbers as placeholders and
+    refilled with the numbers of each new prompt.
+    """
+
+    _NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+    _PLACEHOLDER = re.compile(r"\{\{n(\d+)\}\}")
+
+    def __init__(self, path: str = "gemini_cache.sqlite3", max_entries: int = 10000,
+                 ttl_seconds: Optional[float] = 7 * 24 * 3600, template_mode: bool = False):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.template_mode = template_mode
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._conn.commit()
+
+    @staticmethod
+    def normalize(text: Optional[str]) -> str:
+        return " ".join((text or "").split())
+
+    def _key(self, model_name: str, system: Optional[str], prompt: str) -> str:
+        prompt = self.normalize(prompt)
+        if self.template_mode:
+            prompt = self._NUMBER.sub("{#}", prompt)
+        raw = json.dumps(["t" if self.template_mode else "e", model_name, self.normalize(system), prompt])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, model_name: str, system: Optional[str], prompt: str) -> Optional[str]:
+        key = self._key(model_name, system, prompt)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT text, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            if self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.stats["hits"] += 1
+
+        text = row[0]
+        if self.template_mode:
+            numbers = self._NUMBER.findall(self.normalize(prompt))
+            text = self._PLACEHOLDER.sub(
+                lambda m: numbers[int(m.group(1))] if int(m.group(1)) < len(numbers) else m.group(0), text
+            )
+        return text
+
+    def put(self, model_name: str, system: Optional[str], prompt: str, text: str):
+        key = self._key(model_name, system, prompt)
+        if self.template_mode:
+            # Numbers echoed from the prompt become placeholders in the skeleton
+            positions = {}
+            for i, number in enumerate(self._NUMBER.findall(self.normalize(prompt))):
+                positions.setdefault(number, i)
+            text = self._NUMBER.sub(
+                lambda m: "{{n%d}}" % positions[m.group(0)] if m.group(0) in positions else m.group(0), text
+            )
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, text, now, now))
+            excess = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed ASC LIMIT ?)", (excess,)
+                )
+                self.stats["evictions"] += excess
+            self._conn.commit()
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, entries=entries,
+                        hit_rate=self.stats["hits"] / lookups if lookups else 0.0)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+
+class GeminiClient:
+    """Reusable Gemini client with retries and concurrency-limited batch generation."""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, transport=None,
+                 max_retries: int = 4, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 max_concurrency: int = 8, cache: Optional[ResponseCache] = None):
+        self.model_name = model_name
+        self.cache = cache
+        self.transport = transport if transport is not None else VertexTransport()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
 
-    resp = model.generate_content({"contents": contents})
-    return resp.candidates[0].content.parts[0].text if resp.candidates else ""
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: spreads retries of a burst of prompts instead of syncing them
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def generate(self, prompt: str, system: Optional[str] = None) -> str:
+        if self.cache is not None:
+            cached = self.cache.get(self.model_name, system, prompt)
+            if cached is not None:
+                return cached
+
+        contents = build_contents(prompt, system)
+        for attempt in range(self.max_retries + 1):
+            try:
+                text = self.transport.generate(self.model_name, contents)
+                break
+            except TransientError:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+
+        if self.cache is not None and text:
+            self.cache.put(self.model_name, system, prompt, text)
+        return text
+
+    def stream(self, prompt: str, system: Optional[str] = None,
+               cancel_event: Optional[threading.Event] = None) -> Iterator[str]:
+        """
+        Yield text chunks as the model produces them.
+
+        Only opening the stream is retried; once chunks have been yielded a
+        failure propagates, since replaying would duplicate text. Generation
+        stops, and the upstream request is closed, when `cancel_event` is set
+        or the consumer closes the generator (e.g. the client disconnected).
+        Completed streams are written to the response cache.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(self.model_name, system, prompt)
+            if cached is not None:
+                yield cached
+                return
+
+        contents = build_contents(prompt, system)
+        for attempt in range(self.max_retries + 1):
+            chunks = self.transport.stream(self.model_name, contents)
+            try:
+                first = next(chunks, None)
+                break
+            except TransientError:
+                chunks.close()
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+
+        parts = []
+        try:
+            pending = [] if first is None else [first]
+            for chunk in _chain(pending, chunks):
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                parts.append(chunk)
+                yield chunk
+        finally:
+            chunks.close()
+
+        if self.cache is not None and parts:
+            self.cache.put(self.model_name, system, prompt, "".join(parts))
+
+    async def astream(self, prompt: str, system: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Async wrapper around `stream` for ASGI handlers. The blocking stream
+        runs in a worker thread; if the consuming task is cancelled or the
+        iterator is closed, the worker is told to stop and closes upstream.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancel = threading.Event()
+        done = object()
+
+        def emit(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                cancel.set()  # Event loop already gone
+
+        def produce():
+            try:
+                for chunk in self.stream(prompt, system, cancel_event=cancel):
+                    emit(chunk)
+            except Exception as e:
+                emit(e)
+            emit(done)
+
+        loop.run_in_executor(None, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancel.set()
+
+    async def agenerate(self, prompt: str, system: Optional[str] = None) -> str:
+        return await asyncio.to_thread(self.generate, prompt, system)
+
+    async def agenerate_batch(self, prompts: Sequence[str], system: Optional[str] = None,
+                              max_concurrency: Optional[int] = None) -> List[str]:
+        """Generate many prompts concurrently, at most `max_concurrency` in flight; keeps input order"""
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+
+        async def run(prompt):
+            async with semaphore:
+                return await self.agenerate(prompt, system)
+
+        return await asyncio.gather(*(run(p) for p in prompts))
+
+    def generate_batch(self, prompts: Sequence[str], system: Optional[str] = None,
+                       max_concurrency: Optional[int] = None) -> List[str]:
+        """Blocking wrapper around agenerate_batch for synchronous callers"""
+        return asyncio.run(self.agenerate_batch(prompts, system, max_concurrency))
+
+
+def _chain(head: List[str], tail: Iterator[str]) -> Iterator[str]:
+    yield from head
+    yield from tail
+
+
+def sse_events(chunks: Iterable[str]) -> Iterator[str]:
+    """Frame text chunks as server-sent events, ending with a `done` event"""
+    for chunk in chunks:
+        yield f"data: {json.dumps({'text': chunk})}\n\n"
+    yield "event: done\ndata: {}\n\n"
+
+
+async def asse_events(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Async variant of `sse_events` for StreamingResponse-style server push"""
+    try:
+        async for chunk in chunks:
+            yield f"data: {json.dumps({'text': chunk})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+    finally:
+        # Propagate a client disconnect to the model stream
+        await chunks.aclose()
+
+
+_clients: Dict[Tuple[Optional[str], str, str], GeminiClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(model_name: str = DEFAULT_MODEL) -> GeminiClient:
+    """Shared Vertex-backed client for the current project/location and model"""
+    project = os.environ.get("GOOGLE_CLOUD_PROJECT") or os.environ.get("GCP_PROJECT_ID")
+    location = os.environ.get("GOOGLE_CLOUD_REGION", "us-central1")
+    key = (project, location, model_name)
+    with _clients_lock:
+        if key not in _clients:
+            cache_path = os.environ.get("GEMINI_CACHE_PATH")
+            cache = ResponseCache(cache_path) if cache_path else None
+            _clients[key] = GeminiClient(model_name, VertexTransport(project, location), cache=cache)
+        return _clients[key]
+
+
+def generate_text(prompt: str, system: Optional[str] = None, model_name: str = DEFAULT_MODEL) -> str:
+    return get_client(model_name).generate(prompt, system)
+
+
+def stream_text(prompt: str, system: Optional[str] = None, model_name: str = DEFAULT_MODEL,
+                cancel_event: Optional[threading.Event] = None) -> Iterator[str]:
+    """Streaming variant of generate_text: yields chunks as they arrive"""
+    return get_client(model_name).stream(prompt, system, cancel_event)
 
 
 if __name__ == "__main__":
     text = generate_text("Give me three bullet points on cement sustainability.")
     print(text)
-
-